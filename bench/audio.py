@@ -0,0 +1,59 @@
+"""
+Benchmark the per-block cost of audio analysis, and the audio-to-LED latency
+budget it leaves at each block size.
+
+    python -m bench.audio [samplerate] [fps]
+"""
+import sys
+import time
+from typing import Dict, List
+
+import numpy as np
+
+from lux.audio.analysis import Analyser
+
+BLOCKSIZES = [ 256, 512, 1024, 2048 ]
+
+
+def bench_analyse(samplerate: int, blocksize: int, bands: int = 16, blocks: int = 2000) -> float:
+    """
+    Returns
+    ------
+    mean seconds to analyse one block of noise with a tone in it
+    """
+    analyser = Analyser(samplerate, blocksize, bands)
+    t = np.arange(blocksize * 16) / samplerate
+    signal = (0.5 * np.sin(2 * np.pi * 440 * t)
+            + 0.1 * np.random.default_rng(0).standard_normal(t.size)).astype(np.float32)
+    chunks = signal.reshape(16, blocksize)
+
+    for i in range(50):
+        analyser.analyse(chunks[i % 16])
+
+    begin = time.perf_counter()
+    for i in range(blocks):
+        analyser.analyse(chunks[i % 16])
+    return (time.perf_counter() - begin) / blocks
+
+
+def suite(samplerate: int = 44100) -> List[Dict]:
+    results = []
+    for blocksize in BLOCKSIZES:
+        cost = bench_analyse(samplerate, blocksize)
+        results.append({ 'name': f"audio.analyse[{blocksize}]", 'mean_us': 1e6 * cost,
+            'p50_us': 1e6 * cost, 'p99_us': 1e6 * cost, 'block_us': 1e6 * blocksize / samplerate })
+    return results
+
+
+if __name__ == '__main__':
+    samplerate = int(sys.argv[1]) if len(sys.argv) > 1 else 44100
+    fps = float(sys.argv[2]) if len(sys.argv) > 2 else 60.0
+
+    print(f"{'block':>6} {'block ms':>9} {'analyse us':>11} {'worst latency ms':>17}")
+    for blocksize in BLOCKSIZES:
+        cost = bench_analyse(samplerate, blocksize)
+        block_ms = 1000 * blocksize / samplerate
+        # a sample waits up to one block to be captured, then for analysis,
+        # then up to one frame until the renderer picks the record up
+        worst = block_ms + 1000 * cost + 1000 / fps
+        print(f"{blocksize:>6} {block_ms:>9.2f} {1e6 * cost:>11.1f} {worst:>17.2f}")
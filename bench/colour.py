@@ -0,0 +1,34 @@
+"""
+Benchmark the colour conversions in lux.tools.colour
+
+    python -m bench.colour
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from lux.tools import colour
+
+from bench.harness import bench, report
+
+
+def suite(min_time: float = 0.2, count: int = 1000) -> List[Dict]:
+    hsv = { 'hue': 23, 'saturation': 237, 'value': 245 }
+    rng = np.random.default_rng(0)
+    rgbs = rng.integers(0, 256, (count, 3)).astype(np.uint8)
+    hsvs = colour.rgb_to_hsv_array(rgbs)
+    hexs = colour.rgb_to_hex_array(rgbs)
+    return [
+        bench('colour.hex_to_rgb', lambda: colour.hex_to_rgb('#f5c011'), min_time),
+        bench('colour.rgb_to_hex', lambda: colour.rgb_to_hex((245, 192, 17)), min_time),
+        bench('colour.hex_to_hsv', lambda: colour.hex_to_hsv('#f5c011'), min_time),
+        bench('colour.hsv_to_hex', lambda: colour.hsv_to_hex(hsv), min_time),
+        bench(f"colour.rgb_to_hsv_array[{count}]", lambda: colour.rgb_to_hsv_array(rgbs), min_time),
+        bench(f"colour.hsv_to_rgb_array[{count}]", lambda: colour.hsv_to_rgb_array(hsvs), min_time),
+        bench(f"colour.hex_to_rgb_array[{count}]", lambda: colour.hex_to_rgb_array(hexs), min_time),
+        bench(f"colour.rgb_to_hex_array[{count}]", lambda: colour.rgb_to_hex_array(rgbs), min_time),
+    ]
+
+
+if __name__ == '__main__':
+    report(suite())
@@ -0,0 +1,48 @@
+"""
+Benchmark encoding a frame into the wire format of each LED driver, on
+strips of different lengths, writing to a stand-in SPI device, and
+committing a frame that did not change, which is skipped.
+
+    python -m bench.drivers
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from lux.leds.apa102_segment import APA102Segment
+from lux.leds.spi import CaptureSPI
+from lux.leds.ws2801_segment import WS2801Segment
+from lux.leds.ws2812_segment import WS2812Segment
+
+from bench.harness import bench, report
+
+COUNTS = [ 10, 100, 1000 ]
+
+DRIVERS = {
+    'ws2801':      lambda count, spi: WS2801Segment((0, count), False, spi),
+    'ws2801_grb':  lambda count, spi: WS2801Segment((0, count), False, spi, order = 'GRB'),
+    'apa102':      lambda count, spi: APA102Segment((0, count), False, spi),
+    'ws2812_3bit': lambda count, spi: WS2812Segment((0, count), False, spi, bits = 3),
+    'ws2812_4bit': lambda count, spi: WS2812Segment((0, count), False, spi, bits = 4),
+}
+
+
+def suite(min_time: float = 0.2) -> List[Dict]:
+    results = []
+    rng = np.random.default_rng(0)
+    for count in COUNTS:
+        frame = rng.integers(0, 256, (count, 3)).astype(np.uint8)
+        for name, make in DRIVERS.items():
+            segment = make(count, CaptureSPI(keep = False))
+            segment.frame[:] = frame
+            results.append(bench(f"drivers.{name}.encode[{count}]",
+                    lambda: segment.encode(segment.strip), min_time,
+                    leds = count, wire_bytes = segment.wire.nbytes))
+            segment.commit_pixels()
+            results.append(bench(f"drivers.{name}.commit_static[{count}]",
+                    segment.commit_pixels, min_time, leds = count))
+    return results
+
+
+if __name__ == '__main__':
+    report(suite())
@@ -0,0 +1,140 @@
+"""
+Benchmark every effect in lux.leds.effects, and the full composed render
+loop, on simulated strips of different lengths.
+
+    python -m bench.effects
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from lux.audio.pipeline import AudioPipeline
+from lux.audio.source import AudioSource
+from lux.leds import effects
+from lux.leds.compositor import Compositor
+from lux.leds.postprocess import PostProcessor
+from lux.leds.renderer import Renderer
+from lux.leds.sim_segment import SimSegment
+from lux.video.ambilight import AmbilightSampler
+
+from bench.harness import bench, report
+
+COUNTS = [ 10, 100, 1000 ]
+COLOUR = (255, 128, 0)
+
+
+class SilentSource(AudioSource):
+    """
+    Audio source the benchmarks never read, the pipeline is fed directly
+    """
+
+    def read(self) -> Optional[np.ndarray]:
+        return np.zeros(self.blocksize, dtype = np.float32)
+
+
+def sources() -> Dict:
+    """
+    Inputs for the effects that need them, already holding data
+    """
+    audio = AudioPipeline(SilentSource(44100, 512))
+    audio.ring.push(np.linspace(0, 1, audio.bands + 1, dtype = np.float32))
+
+    ambilight = AmbilightSampler()
+    x = np.linspace(0, 255, 640, dtype = np.uint8)
+    ambilight.update(np.stack([np.tile(x, (480, 1))] * 3, axis = 2))
+
+    return { 'audio': audio, 'ambilight': ambilight }
+
+
+def bench_frames(count: int, min_time: float) -> List[Dict]:
+    """
+    Render and commit one frame of each frame effect
+    """
+    results = []
+    inputs = sources()
+    for name, effect in effects.EFFECTS.items():
+        segment = SimSegment((0, count), False)
+        state = effects.make_state(count, col = COLOUR, **inputs)
+        clock = { 't': 0.0 }
+
+        def frame():
+            clock['t'] += 1 / 30
+            segment.set_frame(effect(clock['t'], state))
+            segment.commit_pixels()
+
+        results.append(bench(f"effects.{name}_frame[{count}]", frame, min_time,
+                leds = count, frames = 1))
+    return results
+
+
+def bench_blocking(count: int, min_time: float) -> List[Dict]:
+    """
+    Run each blocking effect once without sleeping
+    """
+    segment = SimSegment((0, count), False)
+    segment.fill(COLOUR)
+    calls = {
+        'solid':          (lambda: effects.solid(segment, COLOUR), 1),
+        'fadein_colour':  (lambda: effects.fadein_colour(segment, 0, COLOUR), 101),
+        'fadeout':        (lambda: effects.fadeout(segment, 0), 100),
+        'breathe':        (lambda: effects.breathe(segment, 0, 0, COLOUR), 200),
+        'rainbow':        (lambda: effects.rainbow(segment, 0), 256),
+        'rainbow_repeat': (lambda: effects.rainbow_repeat(segment, 0, 2), 512),
+    }
+    return [ bench(f"effects.{name}[{count}]", fn, min_time, leds = count, frames = frames)
+            for name, (fn, frames) in calls.items() ]
+
+
+def bench_compositor(count: int, min_time: float) -> Dict:
+    """
+    Compose three segments with different effects, correct and commit them
+    """
+    output = SimSegment((0, count), False)
+    compositor = Compositor(output, 30, PostProcessor(count, release = 0.3))
+    third = count // 3
+    compositor.add((0, third), True, effects.rainbow_frame, effects.make_state(third))
+    compositor.add((third, 2 * third), False, effects.breathe_frame,
+            effects.make_state(third, col = COLOUR))
+    compositor.add((2 * third, count), False, effects.solid_frame,
+            effects.make_state(count - 2 * third, col = COLOUR))
+    clock = { 't': 0.0 }
+
+    def frame():
+        clock['t'] += 1 / 30
+        compositor.render(clock['t'])
+
+    return bench(f"compositor.render[{count}]", frame, min_time, leds = count, frames = 1)
+
+
+def bench_transition(count: int, min_time: float) -> Dict:
+    """
+    Render and commit one frame of a rainbow crossfading into solid, which
+    renders both effects and blends them
+    """
+    segment = SimSegment((0, count), False)
+    renderer = Renderer(segment, effects.rainbow_frame, effects.make_state(count))
+    clock = { 't': 0.0 }
+
+    def frame():
+        # restart the transition whenever it is over, so every frame blends
+        if renderer.previous is None:
+            renderer.switch(effects.solid_frame, effects.make_state(count, col = COLOUR),
+                    clock['t'], 1e9)
+        clock['t'] += 1 / 30
+        renderer.render(clock['t'])
+
+    return bench(f"renderer.transition[{count}]", frame, min_time, leds = count, frames = 1)
+
+
+def suite(min_time: float = 0.2) -> List[Dict]:
+    results = []
+    for count in COUNTS:
+        results += bench_frames(count, min_time)
+        results += bench_blocking(count, min_time)
+        results.append(bench_compositor(count, min_time))
+        results.append(bench_transition(count, min_time))
+    return results
+
+
+if __name__ == '__main__':
+    report(suite())
@@ -0,0 +1,150 @@
+"""
+Minimal timing harness shared by the benchmark suites, in the spirit of
+pytest-benchmark: every benchmark is a zero-argument callable timed over many
+rounds, summarised as latency percentiles, and saved as JSON so that runs of
+different versions can be compared.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+
+def measure(fn: Callable[[], None], min_time: float = 0.2, max_rounds: int = 100000) -> Dict[str, float]:
+    """
+    Time `fn` repeatedly for at least `min_time` seconds
+
+    Returns
+    ------
+    dict with the number of rounds, calls per second and the mean and
+    50th/90th/99th percentile and worst time per call in microseconds
+    """
+    for _ in range(3):
+        fn()
+
+    times = []
+    begin = time.perf_counter_ns()
+    while len(times) < max_rounds and time.perf_counter_ns() - begin < min_time * 1e9:
+        t = time.perf_counter_ns()
+        fn()
+        times.append(time.perf_counter_ns() - t)
+
+    us = np.array(times) / 1000
+    return {
+        'rounds':  len(times),
+        'ops':     float(1e6 / us.mean()),
+        'mean_us': float(us.mean()),
+        'p50_us':  float(np.percentile(us, 50)),
+        'p90_us':  float(np.percentile(us, 90)),
+        'p99_us':  float(np.percentile(us, 99)),
+        'max_us':  float(us.max()),
+    }
+
+
+def allocated(fn: Callable[[], None], rounds: int = 20) -> float:
+    """
+    Returns
+    ------
+    mean peak number of bytes allocated while `fn` runs, beyond what was
+    allocated before it was called
+    """
+    fn()
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(rounds):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+    finally:
+        tracemalloc.stop()
+    return float(np.mean(peaks))
+
+
+def bench(name: str, fn: Callable[[], None], min_time: float = 0.2, **extra) -> Dict:
+    """
+    Time `fn` and measure its allocations
+
+    Returns
+    ------
+    dict with the `name`, timings from `measure`, `alloc_bytes` per call,
+    and any `extra` fields
+    """
+    result = { 'name': name, **measure(fn, min_time), 'alloc_bytes': allocated(fn) }
+    result.update(extra)
+    return result
+
+
+def environment() -> Dict[str, Any]:
+    """
+    Describe the machine and version of the code being benchmarked
+    """
+    try:
+        version = subprocess.run(['git', 'describe', '--always', '--dirty'],
+                capture_output = True, text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        version = 'unknown'
+    return {
+        'version':  version,
+        'time':     time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python':   platform.python_version(),
+        'numpy':    np.__version__,
+        'machine':  platform.machine(),
+        'cpus':     os.cpu_count(),
+        'platform': platform.platform(),
+    }
+
+
+def save(results: List[Dict], path: str) -> None:
+    """
+    Save results with a description of the environment as JSON
+    """
+    with open(path, 'w') as fh:
+        json.dump({ 'environment': environment(), 'benchmarks': results }, fh, indent = 2)
+
+
+def compare(path: str, results: List[Dict], threshold: float = 0.1) -> List[str]:
+    """
+    Compare results against a previous run saved with `save`
+
+    Params
+    ------
+    path
+        JSON file of the previous run
+    threshold
+        relative slowdown of the mean time beyond which a benchmark counts
+        as a regression
+
+    Returns
+    ------
+    one line for every benchmark that regressed
+    """
+    with open(path) as fh:
+        old = { r['name']: r for r in json.load(fh)['benchmarks'] }
+
+    regressions = []
+    for r in results:
+        if r['name'] in old and 'mean_us' in r:
+            before, after = old[r['name']]['mean_us'], r['mean_us']
+            if after > before * (1 + threshold):
+                regressions.append(f"{r['name']}: {before:.1f} us -> {after:.1f} us "
+                        f"({100 * (after / before - 1):+.0f}%)")
+    return regressions
+
+
+def report(results: List[Dict]) -> None:
+    """
+    Print results as a table
+    """
+    print(f"{'benchmark':<44} {'mean us':>10} {'p50 us':>10} {'p99 us':>10} {'alloc B':>9}")
+    for r in results:
+        if 'mean_us' in r:
+            print(f"{r['name']:<44} {r['mean_us']:>10.1f} {r['p50_us']:>10.1f} "
+                    f"{r['p99_us']:>10.1f} {r.get('alloc_bytes', 0):>9.0f}")
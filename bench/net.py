@@ -0,0 +1,60 @@
+"""
+Benchmark streaming frames from an operator node to receivers over UDP, on
+loopback: the time to send a frame of strips of different lengths, and how
+late a receiver shows the frames after the time stamped on them.
+
+    python -m bench.net
+"""
+import time
+from types import SimpleNamespace
+from typing import Dict, List
+
+import numpy as np
+
+from lux.leds.net_segment import NetSegment
+from lux.leds.receiver_segment import ReceiverSegment
+from lux.leds.segment import Segment
+from lux.tools.metrics import Histogram
+
+from bench.harness import bench, report
+
+COUNTS = [ 100, 1000, 4000 ]
+PORT = 14048
+
+
+def receivers(count: int) -> List[SimpleNamespace]:
+    return [ SimpleNamespace(host = '127.0.0.1',
+            range = SimpleNamespace(min = 0, max = count)) ]
+
+
+def suite(min_time: float = 0.2, fps: float = 60.0) -> List[Dict]:
+    results = []
+    rng = np.random.default_rng(0)
+    for count in COUNTS:
+        receiver = ReceiverSegment(Segment((0, count), False), PORT)
+        receiver.listen()
+        sender = NetSegment((0, count), False, receivers(count), PORT, delay = 0.01)
+        sender.frame[:] = rng.integers(0, 256, (count, 3)).astype(np.uint8)
+        results.append(bench(f"net.send[{count}]", sender.commit_pixels, min_time,
+                leds = count, packets = len(sender.receivers[0][1])))
+
+        # paced, so the receiver presents every frame
+        receiver.lateness = Histogram()
+        begin = time.monotonic()
+        while time.monotonic() - begin < min_time * 5:
+            sender.commit_pixels()
+            time.sleep(1 / fps)
+        time.sleep(0.05)
+        receiver.close()
+        sender.close()
+
+        lateness = receiver.lateness.summary()
+        results.append({ 'name': f"net.present[{count}]", 'leds': count,
+                'mean_us': lateness['mean'] * 1e6, 'p50_us': lateness['p50'] * 1e6,
+                'p90_us': lateness['p90'] * 1e6, 'p99_us': lateness['p99'] * 1e6,
+                'presented': receiver.presented })
+    return results
+
+
+if __name__ == '__main__':
+    report(suite())
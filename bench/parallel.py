@@ -0,0 +1,89 @@
+"""
+Benchmark rendering the segments of a large installation in worker
+processes against the render thread alone, for 1 to 4 workers.
+
+Every segment crossfades between two effects on every frame, and the
+ambilight segments sample a fresh camera frame, so rendering is CPU bound.
+Colour correction and the commit run once in the render process whatever
+the number of workers, so they are left out to show the scaling of the
+rendering itself. With `n` workers the segments are split `n + 1` ways, as
+the render process renders a share too, so the speedup can only approach
+`n + 1` given that many free cores; the CPU count is saved with the results.
+
+On a single core host, where the workers can only take turns with the
+render process, the speedups over the render thread were 1.00x, 0.70x and
+0.62x for 1, 2 and 4 workers: the cost of a message each way per worker a
+frame and of the context switches. No multi-core figures have been
+recorded yet.
+
+    python -m bench.parallel
+"""
+from typing import Dict, List
+
+from lux.leds import effects
+from lux.leds.compositor import Compositor
+from lux.leds.parallel import ParallelCompositor
+from lux.leds.segment import Segment
+
+from bench.effects import COLOUR, sources
+from bench.harness import bench, report
+
+SEGMENTS = 16
+COUNT = 2000
+WORKERS = [ 0, 1, 2, 4 ]
+
+
+def compositor(workers: int) -> Compositor:
+    """
+    A strip of SEGMENTS segments of COUNT LEDs, each crossfading from a
+    rainbow into breathe, or into ambilight every fourth segment
+    """
+    inputs = sources()
+    output = Segment((0, SEGMENTS * COUNT), False)
+    if workers:
+        c = ParallelCompositor(output, 30, None, workers, **inputs)
+    else:
+        c = Compositor(output, 30)
+    for i in range(SEGMENTS):
+        renderer = c.add((i * COUNT, (i + 1) * COUNT), i % 2 == 1, effects.rainbow_frame,
+                effects.make_state(COUNT, **inputs))
+        name = 'ambilight' if i % 4 == 3 else 'breathe'
+        effect, state = c.make(name, COUNT, COLOUR, **inputs)
+        # a transition longer than the benchmark, so every frame blends
+        renderer.switch(effect, state, 0.0, 1e9)
+    return c
+
+
+def bench_workers(workers: int, min_time: float) -> Dict:
+    """
+    Render one frame of every segment with `workers` processes, 0 for the
+    render thread
+    """
+    c = compositor(workers)
+    clock = { 't': 0.0 }
+
+    def frame():
+        clock['t'] += 1 / 30
+        c.compose(clock['t'])
+
+    try:
+        return bench(f"parallel.compose[{SEGMENTS}x{COUNT}, {workers} workers]", frame,
+                min_time, leds = SEGMENTS * COUNT, workers = workers, frames = 1)
+    finally:
+        if workers:
+            c.close()
+
+
+def suite(min_time: float = 0.2) -> List[Dict]:
+    results = [ bench_workers(workers, min_time) for workers in WORKERS ]
+    serial = results[0]['mean_us']
+    for r in results:
+        r['speedup'] = serial / r['mean_us']
+    return results
+
+
+if __name__ == '__main__':
+    results = suite()
+    report(results)
+    for r in results:
+        print(f"{r['workers']} workers: {r['speedup']:.2f}x")
@@ -0,0 +1,81 @@
+"""
+Benchmark the pixel preview: bytes and time to encode each frame of an
+effect as key frames and deltas for one client, against JPEG encoding a
+camera-sized frame for the /video_feed MJPEG stream.
+
+    python -m bench.pixels
+"""
+from typing import Dict, List
+
+import numpy as np
+
+from lux.leds import effects
+from lux.web.pixels import PixelStream
+
+from bench.effects import COLOUR, sources
+from bench.harness import bench, report
+from bench.video_feed import frames
+
+COUNTS = [ 100, 1000 ]
+EFFECTS = [ 'solid', 'breathe', 'rainbow', 'sparkle' ]
+
+
+def sparkle(count: int):
+    """
+    A scene where a few LEDs change each frame
+    """
+    rng = np.random.default_rng(0)
+    frame = np.zeros((count, 3), dtype = np.uint8)
+    def effect(t, state):
+        frame[rng.integers(0, count, max(count // 50, 1))] = rng.integers(0, 256, 3)
+        return frame
+    return effect
+
+
+def bench_preview(name: str, count: int, min_time: float) -> Dict:
+    """
+    Render frames of effect `name` at 30 fps and encode each for a client
+    """
+    effect = sparkle(count) if name == 'sparkle' else effects.EFFECTS[name]
+    state = effects.make_state(count, col = COLOUR, **sources())
+    stream = PixelStream(count)
+    client = stream.client(1e9)
+    clock = { 't': 0.0, 'bytes': 0, 'frames': 0 }
+
+    def frame():
+        clock['t'] += 1 / 30
+        stream.publish(effect(clock['t'], state))
+        message = client.next()
+        clock['bytes'] += len(message) if message is not None else 0
+        clock['frames'] += 1
+
+    result = bench(f"pixels.{name}[{count}]", frame, min_time, leds = count)
+    result['bytes_per_frame'] = clock['bytes'] / clock['frames']
+    return result
+
+
+def bench_jpeg(min_time: float) -> Dict:
+    import cv2
+    image = frames(n = 1)[0]
+    params = [ int(cv2.IMWRITE_JPEG_QUALITY), 80 ]
+    size = { 'bytes': 0 }
+
+    def encode():
+        size['bytes'] = len(cv2.imencode(".jpg", image, params)[1])
+
+    result = bench("pixels.jpeg[640x480]", encode, min_time)
+    result['bytes_per_frame'] = size['bytes']
+    return result
+
+
+def suite(min_time: float = 0.2) -> List[Dict]:
+    results = [ bench_preview(name, count, min_time) for count in COUNTS for name in EFFECTS ]
+    results.append(bench_jpeg(min_time))
+    return results
+
+
+if __name__ == '__main__':
+    results = suite()
+    report(results)
+    for r in results:
+        print(f"{r['name']:<44} {r['bytes_per_frame']:9.0f} bytes per frame")
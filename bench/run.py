@@ -0,0 +1,43 @@
+"""
+Run every benchmark suite, save the results as JSON and optionally compare
+them with a previous run to catch regressions.
+
+    python -m bench.run [-o results.json] [--compare previous.json]
+"""
+import argparse
+import sys
+
+from bench import audio, colour, drivers, effects, net, parallel, pixels, video_feed
+from bench.harness import compare, report, save
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Run the benchmark suites')
+    parser.add_argument('-o', '--output', default = 'bench_results.json')
+    parser.add_argument('--compare', default = None,
+        help = 'JSON of a previous run to check for regressions against')
+    parser.add_argument('--threshold', type = float, default = 0.1,
+        help = 'relative slowdown counted as a regression')
+    parser.add_argument('--quick', action = 'store_true', help = 'shorter timing rounds')
+    args = parser.parse_args()
+
+    min_time = 0.05 if args.quick else 0.2
+    results = []
+    results += effects.suite(min_time)
+    results += colour.suite(min_time)
+    results += drivers.suite(min_time)
+    results += net.suite(min_time)
+    results += parallel.suite(min_time)
+    results += pixels.suite(min_time)
+    results += audio.suite()
+    results += video_feed.suite(1.0 if args.quick else 2.0)
+
+    report(results)
+    save(results, args.output)
+    print(f"Saved results to {args.output}")
+
+    if args.compare:
+        regressions = compare(args.compare, results, args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if regressions else 0)
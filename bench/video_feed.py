@@ -0,0 +1,167 @@
+"""
+Benchmark the /video_feed MJPEG path with several concurrent clients: a
+producer publishes camera-sized frames, and each client consumes the shared
+stream the way a Flask response would, on its own thread, or the way the
+asyncio server does, as a coroutine on one event loop.
+
+    python -m bench.video_feed
+"""
+import asyncio
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+
+import numpy as np
+
+from lux.web.broadcaster import MJPEGBroadcaster
+
+from bench.harness import report
+
+CLIENTS = [ 1, 4, 16 ]
+ASYNC_CLIENTS = [ 16, 64 ]
+
+
+def frames(width: int = 640, height: int = 480, n: int = 8) -> List[np.ndarray]:
+    """
+    Moving gradients, cheaper to encode than noise and closer to real frames
+    """
+    x = np.arange(width)[None, :] + np.arange(height)[:, None]
+    return [ np.stack([(x + 32 * i) % 256, (x // 2) % 256, (x * 2 + 8 * i) % 256],
+        axis = 2).astype(np.uint8) for i in range(n) ]
+
+
+def bench_clients(k: int, seconds: float, fps: float = 30.0, trace: bool = False) -> Dict:
+    """
+    Stream for `seconds` to `k` clients
+
+    Returns
+    ------
+    dict with frames encoded per second, frames received per second per
+    client, publish-to-client latency percentiles in microseconds and, if
+    `trace`, bytes allocated per encoded frame
+    """
+    broadcaster = MJPEGBroadcaster(fps)
+    images = frames()
+    latencies = [ [] for _ in range(k) ]
+    received = [ 0 ] * k
+
+    def client(i):
+        for _ in broadcaster.stream():
+            latencies[i].append(time.monotonic() - broadcaster.payload_at)
+            received[i] += 1
+
+    if trace:
+        tracemalloc.start()
+    broadcaster.start()
+    threads = [ threading.Thread(target = client, args = (i,)) for i in range(k) ]
+    for t in threads:
+        t.start()
+
+    begin = time.monotonic()
+    i = 0
+    while time.monotonic() - begin < seconds:
+        broadcaster.publish(images[i % len(images)])
+        i += 1
+        time.sleep(1 / fps)
+
+    broadcaster.stop()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - begin
+
+    result = {}
+    if trace:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result['alloc_bytes'] = peak / max(broadcaster.encoded, 1)
+        return result
+
+    us = np.concatenate([ np.array(l) for l in latencies ]) * 1e6
+    result.update({
+        'name':         f"video_feed[{k} clients]",
+        'clients':      k,
+        'encoded_fps':  broadcaster.encoded / elapsed,
+        'client_fps':   float(np.mean(received)) / elapsed,
+        'bytes_per_sec': broadcaster.total_bytes / elapsed,
+        'mean_us':      float(us.mean()),
+        'p50_us':       float(np.percentile(us, 50)),
+        'p90_us':       float(np.percentile(us, 90)),
+        'p99_us':       float(np.percentile(us, 99)),
+        'max_us':       float(us.max()),
+    })
+    return result
+
+
+def bench_async_clients(k: int, seconds: float, fps: float = 30.0) -> Dict:
+    """
+    Stream for `seconds` to `k` clients on one event loop
+
+    Returns
+    ------
+    dict with frames encoded per second, frames received per second per
+    client, the most threads running at once, and publish-to-client latency
+    percentiles in microseconds
+    """
+    async def run():
+        broadcaster = MJPEGBroadcaster(fps)
+        images = frames()
+        latencies = [ [] for _ in range(k) ]
+        received = [ 0 ] * k
+
+        async def client(i):
+            async for _ in broadcaster.astream():
+                latencies[i].append(time.monotonic() - broadcaster.payload_at)
+                received[i] += 1
+
+        broadcaster.astart()
+        clients = [ asyncio.create_task(client(i)) for i in range(k) ]
+        threads = 0
+        begin = time.monotonic()
+        i = 0
+        while time.monotonic() - begin < seconds:
+            broadcaster.publish(images[i % len(images)])
+            i += 1
+            threads = max(threads, threading.active_count())
+            await asyncio.sleep(1 / fps)
+
+        broadcaster.stop()
+        await asyncio.gather(*clients)
+        elapsed = time.monotonic() - begin
+        return broadcaster, latencies, received, threads, elapsed
+
+    broadcaster, latencies, received, threads, elapsed = asyncio.run(run())
+    us = np.concatenate([ np.array(l) for l in latencies ]) * 1e6
+    return {
+        'name':          f"video_feed_async[{k} clients]",
+        'clients':       k,
+        'threads':       threads,
+        'encoded_fps':   broadcaster.encoded / elapsed,
+        'client_fps':    float(np.mean(received)) / elapsed,
+        'bytes_per_sec': broadcaster.total_bytes / elapsed,
+        'mean_us':       float(us.mean()),
+        'p50_us':        float(np.percentile(us, 50)),
+        'p90_us':        float(np.percentile(us, 90)),
+        'p99_us':        float(np.percentile(us, 99)),
+        'max_us':        float(us.max()),
+    }
+
+
+def suite(seconds: float = 2.0) -> List[Dict]:
+    results = []
+    for k in CLIENTS:
+        result = bench_clients(k, seconds)
+        result.update(bench_clients(k, seconds / 2, trace = True))
+        results.append(result)
+    for k in ASYNC_CLIENTS:
+        results.append(bench_async_clients(k, seconds))
+    return results
+
+
+if __name__ == '__main__':
+    results = suite()
+    report(results)
+    for r in results:
+        print(f"{r['name']:<44} encoded {r['encoded_fps']:.1f} fps, "
+                f"each client {r['client_fps']:.1f} fps, {r['bytes_per_sec'] / 1e3:.0f} kB/s" +
+                (f", {r['threads']} threads" if 'threads' in r else ''))
@@ -0,0 +1,111 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class Analyser():
+    """
+    Block-wise spectrum and level analysis of mono audio. Every buffer is
+    allocated once, so analysing a block costs one windowed rFFT and a few
+    vectorised reductions.
+
+    Levels are in dB relative to a full-scale sine, mapped linearly from
+    `floor` dB to 0 dB onto [0, 1], and smoothed so that they rise instantly
+    and fall by `decay` per block.
+    """
+
+    def __init__(self,
+            samplerate: int = 44100,
+            blocksize: int = 512,
+            bands: int = 16,
+            fmin: float = 40.0,
+            fmax: float = 16000.0,
+            decay: float = 0.85,
+            floor: float = -60.0
+        ) -> None:
+        """
+        Params
+        ------
+        samplerate
+            samples per second
+        blocksize
+            samples per analysed block
+        bands
+            number of log-spaced frequency bands between fmin and fmax
+        decay
+            factor the smoothed levels fall by per block when the input is
+            quieter than them
+        floor
+            level in dB mapped to 0
+        """
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.bands = bands
+        self.decay = decay
+        self.floor = floor
+
+        self.window = np.hanning(blocksize).astype(np.float32)
+        # a full-scale sine through the window peaks at sum(window) / 2
+        self.norm = (self.window.sum() / 2) ** 2
+
+        # log-spaced band edges as rFFT bin indices; every band gets at least
+        # one bin, so at low resolution the lowest bands are single bins
+        freqs = np.fft.rfftfreq(blocksize, 1 / samplerate)
+        edges = np.searchsorted(freqs, np.geomspace(fmin, min(fmax, samplerate / 2), bands + 1))
+        for i in range(1, len(edges)):
+            edges[i] = max(edges[i], edges[i - 1] + 1)
+        if edges[-1] > len(freqs):
+            raise ValueError(f'Block of {blocksize} samples too short for {bands} bands')
+        self.starts = edges[:-1]
+        self.stop = edges[-1]
+        self.widths = np.diff(edges).astype(np.float32)
+
+        self.windowed = np.zeros(blocksize, dtype = np.float32)
+        self.power = np.zeros(self.stop, dtype = np.float32)
+        self.levels = np.zeros(bands, dtype = np.float32)
+        self.vu = 0.0
+
+
+    def _normalise(self, power: np.ndarray) -> np.ndarray:
+        """
+        Map mean power relative to full scale from [floor, 0] dB onto [0, 1],
+        in place
+        """
+        np.maximum(power, 1e-12, out = power)
+        np.log10(power, out = power)
+        power *= 10 / -self.floor
+        power += 1
+        np.clip(power, 0, 1, out = power)
+        return power
+
+
+    def analyse(self, block: np.ndarray) -> Tuple[np.ndarray, float]:
+        """
+        Analyse one block of samples
+
+        Params
+        ------
+        block
+            `blocksize` float samples in [-1, 1]
+
+        Returns
+        ------
+        smoothed band levels, a view of an internal buffer, and smoothed VU
+        level, both in [0, 1]
+        """
+        np.multiply(block, self.window, out = self.windowed)
+        spectrum = np.fft.rfft(self.windowed)[:self.stop]
+        np.square(spectrum.real, out = self.power)
+        self.power += np.square(spectrum.imag)
+
+        bands = np.add.reduceat(self.power, self.starts)
+        bands /= self.widths * self.norm
+        bands = self._normalise(bands)
+        np.maximum(bands, self.levels * self.decay, out = self.levels)
+
+        # RMS of a full-scale sine is 1/sqrt(2), which should read as 0 dB
+        rms = np.array([2 * np.mean(np.square(block))], dtype = np.float32)
+        vu = float(self._normalise(rms)[0])
+        self.vu = max(vu, self.vu * self.decay)
+
+        return self.levels, self.vu
@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.audio.analysis import Analyser
+from lux.audio.source import AudioSource
+from lux.tools.ringbuffer import RingBuffer
+
+log = logging.getLogger(__name__)
+
+
+class AudioPipeline():
+    """
+    Capture and analyse audio in its own thread, publishing the latest
+    analysis to the renderers through a lock-free ring buffer.
+
+    Records are float32 arrays of `bands + 1` values: the VU level followed
+    by the band levels, all in [0, 1].
+    """
+
+    def __init__(self, source: AudioSource, bands: int = 16, decay: float = 0.85) -> None:
+        """
+        Params
+        ------
+        source
+            where audio blocks are read from
+        bands
+            number of frequency bands
+        decay
+            per-block decay of the smoothed levels
+        """
+        self.source = source
+        self.analyser = Analyser(source.samplerate, source.blocksize, bands, decay = decay)
+        self.bands = bands
+        self.ring = RingBuffer((bands + 1,))
+        self.record = np.zeros(bands + 1, dtype = np.float32)
+
+        # seconds the last block spent in analysis
+        self.analysis_time = 0.0
+        self.blocks = 0
+
+        self.running = False
+        self.thread = threading.Thread(target = self.run, daemon = True)
+
+
+    def run(self) -> None:
+        """
+        Read and analyse blocks until stopped or the source is exhausted
+        """
+        while self.running:
+            if not self.step():
+                log.info('Audio source exhausted')
+                break
+
+        self.running = False
+
+
+    def step(self) -> bool:
+        """
+        Read and analyse one block on the calling thread, e.g. to render
+        offline in step with a file
+
+        Returns
+        ------
+        False if the source is exhausted
+        """
+        block = self.source.read()
+        if block is None:
+            return False
+
+        begin = time.perf_counter()
+        levels, vu = self.analyser.analyse(block)
+        self.record[0] = vu
+        self.record[1:] = levels
+        self.ring.push(self.record)
+        self.analysis_time = time.perf_counter() - begin
+        self.blocks += 1
+        return True
+
+
+    def latest(self, out: np.ndarray) -> Optional[int]:
+        """
+        Copy the latest record into `out`, see `RingBuffer.latest`
+        """
+        return self.ring.latest(out)
+
+
+    def start(self) -> None:
+        """
+        Start the analysis thread, unless it is already running
+        """
+        if not self.thread.is_alive():
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.running = True
+            self.thread.start()
+            log.info('Started audio analysis, %d bands, %d samples per block',
+                    self.bands, self.source.blocksize)
+
+
+    def stop(self) -> None:
+        """
+        Stop the analysis thread
+        """
+        self.running = False
+        if self.thread.is_alive():
+            self.thread.join(timeout = 1)
+
+
+    def close(self) -> None:
+        """
+        Stop the analysis thread and release the source
+        """
+        self.stop()
+        self.source.close()
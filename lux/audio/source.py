@@ -0,0 +1,183 @@
+from abc import ABC, abstractmethod
+import logging
+import sys
+import time
+import wave
+from typing import Optional
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+log = logging.getLogger(__name__)
+
+
+class AudioSource(ABC):
+    """
+    Blocking source of mono float32 audio blocks in [-1, 1]. Sources
+    implement `read`
+    """
+
+    def __init__(self, samplerate: int, blocksize: int) -> None:
+        """
+        Params
+        ------
+        samplerate
+            samples per second
+        blocksize
+            samples per block returned by `read`
+        """
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+
+
+    @abstractmethod
+    def read(self) -> Optional[np.ndarray]:
+        """
+        Returns
+        ------
+        the next block of `blocksize` samples, or None when the source is
+        exhausted
+        """
+
+
+    def close(self) -> None:
+        pass
+
+
+def _to_mono(pcm: np.ndarray, channels: int) -> np.ndarray:
+    """
+    Convert interleaved int16 samples to mono float32 in [-1, 1]
+    """
+    block = pcm.astype(np.float32) / 32768
+    if channels > 1:
+        block = block.reshape(-1, channels).mean(axis = 1)
+    return block
+
+
+class DeviceSource(AudioSource):
+    """
+    Capture from an ALSA/PortAudio input device using `sounddevice`
+    """
+
+    def __init__(self,
+            samplerate: int = 44100, blocksize: int = 512, device = None
+        ) -> None:
+        """
+        Params
+        ------
+        device
+            sounddevice device name or index, the default input if None
+        """
+        super().__init__(samplerate, blocksize)
+
+        import sounddevice as sd
+        self.stream = sd.InputStream(samplerate = samplerate, blocksize = blocksize,
+                device = device, channels = 1, dtype = 'float32', latency = 'low')
+        self.stream.start()
+        log.info('Capturing audio from device %s at %d Hz', device, samplerate)
+
+
+    def read(self) -> Optional[np.ndarray]:
+        block, overflowed = self.stream.read(self.blocksize)
+        if overflowed:
+            log.warning('Audio input overflow, analysis is falling behind')
+        return block[:, 0]
+
+
+    def close(self) -> None:
+        self.stream.stop()
+        self.stream.close()
+
+
+class WavSource(AudioSource):
+    """
+    Read a 16-bit WAV file, for testing without a sound card
+    """
+
+    def __init__(self,
+            path: str, blocksize: int = 512, realtime: bool = True, loop: bool = False
+        ) -> None:
+        """
+        Params
+        ------
+        path
+            path to a 16-bit PCM WAV file
+        realtime
+            if True, `read` blocks so that blocks come at the rate they would
+            from a sound card
+        loop
+            if True, start over at the end of the file
+        """
+        self.wav = wave.open(path, 'rb')
+        if self.wav.getsampwidth() != 2:
+            raise ValueError(f'Only 16-bit WAV files are supported: {path}')
+        super().__init__(self.wav.getframerate(), blocksize)
+
+        self.channels = self.wav.getnchannels()
+        self.realtime = realtime
+        self.loop = loop
+        self.deadline = None
+
+
+    def read(self) -> Optional[np.ndarray]:
+        data = self.wav.readframes(self.blocksize)
+        if len(data) < self.blocksize * self.channels * 2:
+            if not self.loop:
+                return None
+            self.wav.rewind()
+            data = self.wav.readframes(self.blocksize)
+
+        if self.realtime:
+            now = time.monotonic()
+            if self.deadline is None:
+                self.deadline = now
+            self.deadline += self.blocksize / self.samplerate
+            if self.deadline > now:
+                time.sleep(self.deadline - now)
+
+        return _to_mono(np.frombuffer(data, dtype = '<i2'), self.channels)
+
+
+    def close(self) -> None:
+        self.wav.close()
+
+
+class StdinSource(AudioSource):
+    """
+    Read raw signed 16-bit little-endian PCM from stdin, for example piped
+    from `arecord -f S16_LE -r 44100 -c 1 -t raw`
+    """
+
+    def __init__(self,
+            samplerate: int = 44100, blocksize: int = 512, channels: int = 1
+        ) -> None:
+        super().__init__(samplerate, blocksize)
+        self.channels = channels
+        self.stream = sys.stdin.buffer
+
+
+    def read(self) -> Optional[np.ndarray]:
+        size = self.blocksize * self.channels * 2
+        data = self.stream.read(size)
+        if len(data) < size:
+            return None
+        return _to_mono(np.frombuffer(data, dtype = '<i2'), self.channels)
+
+
+def open_source(source, samplerate: int = 44100, blocksize: int = 512) -> AudioSource:
+    """
+    Open an audio source from its config value
+
+    Params
+    ------
+    source
+        '-' for PCM on stdin, a path ending in .wav for a WAV file, otherwise
+        a sound device name or index (None or '' for the default input)
+    """
+    if source == '-':
+        return StdinSource(samplerate, blocksize)
+    if isinstance(source, str) and source.endswith('.wav'):
+        return WavSource(source, blocksize, loop = True)
+    return DeviceSource(samplerate, blocksize, source if source != '' else None)
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+import logging
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract SPI segment class
+from lux.leds.spi import Buffer, SPIDevice
+from lux.leds.spi_segment import SPISegment
+
+log = logging.getLogger(__name__)
+
+"""
+Class implementing the behaviour of a segment of the LED strip using APA102
+or SK9822 leds. Each LED takes a 4 byte frame, 0b111 followed by a 5-bit
+global brightness and the 3 colour bytes, between a start frame of 32 zero
+bits and an end frame. The end frame is a 32-bit reset frame for the SK9822,
+then half a clock per LED to push the data through to the end of the strip;
+zeros are used so that LEDs past the end of the segment are not lit
+"""
+class APA102Segment(SPISegment):
+    ORDER = 'BGR'
+    SPEED_HZ = 8000000
+
+    def __init__(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            device: Union[str, SPIDevice] = '/dev/spidev0.0',
+            speed_hz: Optional[int] = None,
+            order: Optional[str] = None,
+            keepalive: float = 1.0,
+            brightness: int = 31,
+        ) -> None:
+        """
+        Initialise the SPI device driving the strip, see `SPISegment`
+
+        Params
+        ------
+        brightness
+            5-bit global brightness of every LED, 0-31. Lower values dim
+            the LEDs by PWM without losing colour resolution
+        """
+        self.brightness = brightness
+        super().__init__(segment, reverse, device, speed_hz, order, keepalive)
+        log.info('Initialisation of APA102 LEDs complete')
+
+
+    def allocate(self, count: int) -> np.ndarray:
+        end = 4 + (count + 15) // 16
+        wire = np.zeros(4 + 4 * count + end, dtype = np.uint8)
+        # views of the LED frames in the wire buffer, the header byte of
+        # each and its colour bytes
+        self.leds = wire[4:4 + 4 * count].reshape(count, 4)
+        self.leds[:, 0] = 0xE0 | (self.brightness & 0x1F)
+        return wire
+
+
+    def set_brightness(self, brightness: int) -> None:
+        """
+        Set the 5-bit global brightness of every LED, 0-31
+        """
+        self.brightness = brightness
+        self.leds[:, 0] = 0xE0 | (brightness & 0x1F)
+
+
+    def encode(self, rgb: np.ndarray) -> Buffer:
+        # a strided copy per channel, as a take into the non-contiguous colour
+        # bytes would go through a temporary
+        leds = self.leds[:len(rgb)]
+        for i, c in enumerate(self.order):
+            leds[:, 1 + i] = rgb[:, c]
+        return self.wire
@@ -0,0 +1,229 @@
+#!/usr/bin/python3
+
+import logging
+import time
+from types import SimpleNamespace
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.leds import effects
+from lux.leds.pattern import PatternWriter
+from lux.leds.postprocess import PostProcessor
+from lux.leds.renderer import Renderer
+from lux.leds.segment import Segment
+from lux.tools.logger import FrameLog
+from lux.tools.metrics import registry
+from lux.tools.scheduler import FrameScheduler
+from lux.tools.schema import SegmentParams
+
+log = logging.getLogger(__name__)
+
+
+class Compositor():
+    """
+    Render every segment of a strip into its slice of one shared frame buffer,
+    then write the whole strip out with a single commit per frame.
+
+    Segments render into a canvas of their own rather than into the output,
+    and each frame is colour corrected from the canvas into the output. So
+    LEDs no segment covers are not corrected again every frame, and previews
+    show the colours the effects chose rather than the corrected ones
+    """
+
+    def __init__(self,
+            output: Segment,
+            fps: float = 30.0,
+            postprocess: Optional[PostProcessor] = None
+        ) -> None:
+        """
+        Params
+        ------
+        output
+            segment covering the physical strip, which owns the shared frame
+            buffer and the hardware commit
+        fps
+            target frames per second
+        postprocess
+            correction applied to the whole strip between rendering and
+            committing each frame
+        """
+        self.output = output
+        # the uncorrected frame the segments are rendered into
+        self.canvas = Segment((output.start, output.stop), False)
+        self.postprocess = postprocess
+        self.renderers: List[Renderer] = []
+        self.scheduler = FrameScheduler(fps)
+        self.frames = 0
+        self.framelog = FrameLog(log, 'compositor')
+        # if recording, every committed frame is appended to a pattern file
+        self.recorder: Optional[PatternWriter] = None
+        # if set, called with every frame committed, e.g. for a live preview
+        self.preview: Optional[Callable[[np.ndarray], None]] = None
+        self.render_time = registry.histogram('lux_render_seconds',
+                'Time to render every segment of a frame')
+        self.correction_time = registry.histogram('lux_correction_seconds',
+                'Time to colour correct, smooth and power limit a frame')
+        self.commit_time = registry.histogram('lux_commit_seconds',
+                'Time to commit a frame to the LEDs')
+
+
+    @property
+    def segments(self) -> List[Segment]:
+        return [ r.segment for r in self.renderers ]
+
+
+    def add(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            effect: effects.Effect,
+            state: Optional[SimpleNamespace] = None
+        ) -> Renderer:
+        """
+        Add a segment of the output strip rendering `effect`
+
+        Params
+        ------
+        segment
+            smallest and largest index of LEDs (largest not included)
+        reverse
+            True if the effect should be applied in reverse order
+        effect
+            function `(t, state) -> (N, 3) frame`, see `lux.leds.effects`
+        state
+            effect state, a fresh one from `effects.make_state` if not given
+
+        Returns
+        ------
+        the renderer of the new segment, whose state can be updated live
+        """
+        renderer = Renderer(Segment(segment, reverse, parent = self.canvas),
+                effect, state, self.scheduler.fps)
+        self.renderers.append(renderer)
+        return renderer
+
+
+    def add_from_config(self,
+            segments: Sequence[SegmentParams],
+            col: Tuple[int, int, int],
+            **sources
+        ) -> None:
+        """
+        Add every segment of a compiled config, see `lux.tools.schema.compile`
+
+        Params
+        ------
+        segments
+            range, direction and effect name from `effects.EFFECTS` of each
+            segment
+        col
+            colour given to solid segments and to segments whose effect is
+            not available, which fall back to solid
+        sources
+            inputs of the effects in `effects.EFFECT_SOURCES`, such as the
+            `audio` pipeline or the `ambilight` sampler; effects whose source
+            is missing or None are not available
+        """
+        for s in segments:
+            effect, state = self.make(s.effect, s.count, col, **sources)
+            self.add((s.start, s.stop), s.reverse, effect, state)
+
+
+    def make(self,
+            name: str,
+            count: int,
+            col: Tuple[int, int, int],
+            **sources
+        ) -> Tuple[effects.Effect, SimpleNamespace]:
+        """
+        Look up the effect `name` and build its state for `count` LEDs,
+        falling back to solid in colour `col` if it is not available
+
+        Params
+        ------
+        sources
+            inputs of the effects, as in `add_from_config`
+        """
+        name = name.lower()
+        source = effects.EFFECT_SOURCES.get(name)
+        if name not in effects.EFFECTS or (source and sources.get(source) is None):
+            log.warning('Effect %s not available, falls back to solid', name)
+            name = "solid"
+        return effects.EFFECTS[name], effects.make_state(count, col = col, **sources)
+
+
+    def compose(self, t: float) -> None:
+        """
+        Render every segment at `t` seconds into its slice of the strip
+        """
+        for renderer in self.renderers:
+            renderer.render(t, commit = False)
+
+
+    def render(self, t: float) -> None:
+        """
+        Render every segment at `t` seconds into its slice of the canvas, then
+        correct it into the output and commit the strip once
+        """
+        begin = time.monotonic_ns()
+        self.compose(t)
+        rendered = time.monotonic_ns()
+        self.render_time.observe(rendered - begin)
+        if self.postprocess is not None:
+            self.postprocess.process(self.canvas.frame, out = self.output.frame)
+            corrected = time.monotonic_ns()
+            self.correction_time.observe(corrected - rendered)
+            rendered = corrected
+        else:
+            np.copyto(self.output.frame, self.canvas.frame)
+        self.output.commit_pixels()
+        # patterns hold the corrected frames, to be played back unchanged
+        if self.recorder is not None:
+            self.recorder.write(self.output.frame)
+        if self.preview is not None:
+            self.preview(self.canvas.frame)
+        committed = time.monotonic_ns()
+        self.commit_time.observe(committed - rendered)
+        self.framelog.add(begin, rendered, committed)
+        self.frames += 1
+
+
+    def record(self, path: str) -> None:
+        """
+        Start appending every frame committed to the strip to the pattern
+        file at `path`, for playback with `PlaybackSegment`
+        """
+        self.stop_recording()
+        self.recorder = PatternWriter(path, self.output.count, self.scheduler.fps)
+        log.info('Recording to %s', path)
+
+
+    def stop_recording(self) -> None:
+        if self.recorder is not None:
+            self.recorder.close()
+            log.info('Recorded %d frames to %s', self.recorder.frames, self.recorder.path)
+            self.recorder = None
+
+
+    def run(self,
+            running: Optional[Callable[[], bool]] = None,
+            duration: Optional[float] = None
+        ) -> None:
+        """
+        Render frames at the scheduler's frame rate, blocking
+
+        Params
+        ------
+        running
+            rendering stops as soon as this returns False
+        duration
+            if given, seconds of effects to render
+        """
+        for t in self.scheduler.ticks(running, duration):
+            self.render(t)
+
+        log.info('Composed %d frames of %d segments, dropped %d',
+                self.frames, len(self.renderers), self.scheduler.dropped)
@@ -0,0 +1,111 @@
+import struct
+import time
+from typing import Iterator, Optional, Tuple
+
+"""
+Packets of the Distributed Display Protocol (DDP), in which one renderer
+streams frames to the strips of other Pis.
+
+Each packet carries a header and up to 1440 bytes, 480 RGB pixels, of the
+frame at a byte offset, so a strip takes one or a few datagrams a frame. The
+last packet of a frame has the push flag set, telling the receiver the frame
+is complete. Packets carry a 4-bit sequence number, the same for every
+packet of a frame, and a timecode: the wall-clock time the frame is to be
+shown at, so that receivers whose clocks are synchronised, e.g. by NTP, all
+change on the same frame whatever the network delay.
+
+    byte  0     flags: version 1, timecode, push
+          1     sequence number, 1-15
+          2     data type, 8-bit RGB
+          3     destination, the default output
+          4-7   byte offset of the data in the frame
+          8-9   length of the data
+          10-13 timecode, 1/65536 s
+"""
+
+DDP_PORT = 4048
+
+FLAG_VERSION  = 0x40
+FLAG_TIMECODE = 0x10
+FLAG_PUSH     = 0x01
+TYPE_RGB8     = 0x0B
+DEST_DEFAULT  = 0x01
+
+HEADER = struct.Struct('>BBBBIHI')
+# data per packet, whole pixels within an ethernet MTU
+MAX_DATA = 1440
+
+# timecodes count 1/65536 s in 32 bits, wrapping every ~18 hours
+TICKS = 65536
+WRAP = 1 << 32
+
+
+def timecode(t: float) -> int:
+    """
+    Returns
+    ------
+    the timecode of wall-clock time `t`, seconds since the epoch
+    """
+    return int(t * TICKS) % WRAP
+
+
+def from_timecode(code: int, now: Optional[float] = None) -> float:
+    """
+    Returns
+    ------
+    the wall-clock time of `code` closest to `now`, so timecodes up to ~9
+    hours either side of it are recovered despite the wrap
+    """
+    if now is None:
+        now = time.time()
+    diff = (code - timecode(now)) % WRAP
+    if diff >= WRAP // 2:
+        diff -= WRAP
+    return now + diff / TICKS
+
+
+def chunks(length: int, size: int = MAX_DATA) -> Iterator[Tuple[int, int]]:
+    """
+    Returns
+    ------
+    the offset and length of each packet of a frame of `length` bytes
+    """
+    for offset in range(0, length, size):
+        yield offset, min(size, length - offset)
+
+
+def pack_header(buffer: bytearray,
+        sequence: int,
+        offset: int,
+        length: int,
+        code: int,
+        push: bool
+    ) -> None:
+    """
+    Write a packet header at the start of `buffer`
+    """
+    flags = FLAG_VERSION | FLAG_TIMECODE | (FLAG_PUSH if push else 0)
+    HEADER.pack_into(buffer, 0, flags, sequence, TYPE_RGB8, DEST_DEFAULT, offset, length, code)
+
+
+def unpack_header(buffer: bytes) -> Tuple[int, int, int, int, Optional[int], bool]:
+    """
+    Returns
+    ------
+    the sequence number, data offset and length, header size, timecode (None
+    if the packet has none) and push flag of a packet
+
+    Raises
+    ------
+    ValueError if this is not a DDP version 1 packet
+    """
+    if len(buffer) < 10 or buffer[0] & 0xC0 != FLAG_VERSION:
+        raise ValueError('Not a DDP packet')
+    flags, sequence = buffer[0], buffer[1] & 0x0F
+    offset, length = struct.unpack_from('>IH', buffer, 4)
+    if flags & FLAG_TIMECODE:
+        if len(buffer) < HEADER.size:
+            raise ValueError('Truncated DDP packet')
+        return sequence, offset, length, HEADER.size, struct.unpack_from('>I', buffer, 10)[0], \
+                bool(flags & FLAG_PUSH)
+    return sequence, offset, length, 10, None, bool(flags & FLAG_PUSH)
@@ -0,0 +1,53 @@
+#!/usr/bin/python3
+
+import importlib
+from types import SimpleNamespace
+from typing import Dict, Tuple
+
+from lux.leds.segment import Segment
+
+"""
+Output drivers for each kind of LED strip, selected by `leds` in the config.
+Driver modules are only imported when selected, so hardware dependencies of
+one strip are not needed to run another
+"""
+
+# module and class of each driver, by the name used in the config
+DRIVERS: Dict[str, Tuple[str, str]] = {
+    'WS2801':  ('lux.leds.ws2801_segment', 'WS2801Segment'),
+    'APA102':  ('lux.leds.apa102_segment', 'APA102Segment'),
+    'SK9822':  ('lux.leds.apa102_segment', 'APA102Segment'),
+    'WS2812':  ('lux.leds.ws2812_segment', 'WS2812Segment'),
+    'WS2812B': ('lux.leds.ws2812_segment', 'WS2812Segment'),
+    'SK6812':  ('lux.leds.ws2812_segment', 'WS2812Segment'),
+}
+
+
+def open_driver(name: str, length: int, spi: SimpleNamespace) -> Segment:
+    """
+    Open the output driver of a strip of `length` LEDs
+
+    Params
+    ------
+    name
+        strip type, a key of DRIVERS
+    spi
+        the `spi` config: `device`, `speed_hz` and `order`, 0 and '' for the
+        driver's defaults, the 5-bit `brightness` of APA102 strips and the
+        SPI `bits` per data bit of WS2812 strips, and the `keepalive`
+        seconds after which an unchanged frame is sent again
+
+    Returns
+    ------
+    output segment covering the whole strip
+    """
+    module, cls = DRIVERS[name.upper()]
+    driver = getattr(importlib.import_module(module), cls)
+
+    params = {}
+    if cls == 'APA102Segment':
+        params['brightness'] = spi.brightness
+    elif cls == 'WS2812Segment':
+        params['bits'] = spi.bits
+    return driver((0, length), False, spi.device, spi.speed_hz or None,
+            spi.order or None, spi.keepalive, **params)
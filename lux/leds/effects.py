@@ -4,13 +4,19 @@ import importlib
 import logging
 import random
 import time
-from typing import Callable, List, Tuple
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
 
 # initialise logging to file
 import lux.tools.logger
 
 # import abstract segment class
 from lux.leds.segment import Segment
+from lux.tools.scheduler import FrameScheduler
+
+log = logging.getLogger(__name__)
 
 awb_modes = [
     "off",
@@ -31,20 +37,283 @@ effect_names = [
     "rainbow",
     "fft",
     "vu",
+    "ambilight",
     "police",
 ]
 
+"""
+Effects are pure functions of time `(t, state) -> frame`, where `t` is the
+number of seconds since the effect started, `state` is the namespace built by
+`make_state` for one segment, and `frame` is an (N, 3) uint8 array in effect
+order that can be handed to `Segment.set_frame`. The returned array is the
+state's own output buffer, so it is only valid until the next call.
+"""
+Effect = Callable[[float, SimpleNamespace], np.ndarray]
+
+
+def _colour_wheel() -> np.ndarray:
+    """
+    Precompute the 256 colours of the rainbow wheel, going red to green to
+    blue and back to red
+
+    Returns
+    ------
+    (256, 3) uint8 array where row `pos` is the colour at position `pos`
+    """
+    pos = np.arange(256)
+    wheel = np.zeros((256, 3), dtype = np.int32)
+
+    p = pos[:85]
+    wheel[:85] = np.stack([p * 3, 255 - p * 3, np.zeros_like(p)], axis = 1)
+    p = pos[85:170] - 85
+    wheel[85:170] = np.stack([255 - p * 3, np.zeros_like(p), p * 3], axis = 1)
+    p = pos[170:] - 170
+    wheel[170:] = np.stack([np.zeros_like(p), p * 3, 255 - p * 3], axis = 1)
+
+    return wheel.astype(np.uint8)
+
+WHEEL = _colour_wheel()
+
+# green through yellow to red, for level meters
+VU_GRADIENT = np.stack([np.minimum(np.arange(256) * 2, 255),
+    np.minimum((255 - np.arange(256)) * 2, 255), np.zeros(256)], axis = 1).astype(np.uint8)
+
+
+def make_state(count: int, **params) -> SimpleNamespace:
+    """
+    Build the state an effect renders from, with buffers preallocated so that
+    rendering a frame does not allocate
+
+    Params
+    ------
+    count
+        number of LEDs in the segment
+    params
+        effect parameters, such as:
+
+        col : Tuple[int, int, int]
+            target colour of solid, fades and breathe
+        base : np.ndarray
+            (N, 3) frame fadeout starts from, defaults to `col` everywhere
+        duration : float
+            seconds a fade lasts
+        delay : float
+            seconds breathe holds at full and no brightness
+        speed : float
+            rainbow wheel positions per second
+        audio : lux.audio.pipeline.AudioPipeline
+            analysis the fft and vu effects read their levels from
+        ambilight : lux.video.ambilight.AmbilightSampler
+            sampler the ambilight effect reads colours from
+
+    Returns
+    ------
+    namespace holding the params and the buffers
+    """
+    state = SimpleNamespace(col = (0, 0, 0), duration = 1.0, delay = 0.0,
+            speed = 100.0, base = None, audio = None, ambilight = None)
+    for k, v in params.items():
+        setattr(state, k, v)
+
+    state.count = count
+    state.frame = np.zeros((count, 3), dtype = np.uint8)
+    state.scratch = np.zeros((count, 3), dtype = np.float32)
+    state.offsets = np.arange(count) * 256 // max(count, 1)
+    state.pos = np.zeros(count, dtype = np.int64)
+    if state.base is None:
+        state.base = np.empty((count, 3), dtype = np.float32)
+        state.base[:] = state.col
+    else:
+        state.base = np.asarray(state.base, dtype = np.float32)
+
+    # audio effects: the latest analysis record, one level per LED, the
+    # band each LED shows and the colour of each LED at full level
+    bands = state.audio.bands if state.audio is not None else 1
+    state.record = np.zeros(bands + 1, dtype = np.float32)
+    state.led_levels = np.zeros(count, dtype = np.float32)
+    state.band_index = 1 + np.arange(count) * bands // max(count, 1)
+    state.spectrum_colours = WHEEL[np.arange(count) * 170 // max(count, 1)].astype(np.float32)
+    state.ramp = np.arange(count, dtype = np.float32)
+    state.vu_colours = VU_GRADIENT[np.arange(count) * 255 // max(count - 1, 1)].astype(np.float32)
+
+    return state
+
+
+def solid_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    All LEDs in the segment are `state.col`
+    """
+    state.frame[:] = state.col
+    return state.frame
+
+
+def rainbow_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs show consecutive colours of the wheel, moving `state.speed`
+    positions per second
+    """
+    np.add(state.offsets, int(t * state.speed), out = state.pos)
+    np.remainder(state.pos, 256, out = state.pos)
+    np.take(WHEEL, state.pos, axis = 0, out = state.frame)
+    return state.frame
+
+
+def _scaled(state: SimpleNamespace, scale: float) -> np.ndarray:
+    """
+    Write `state.base` scaled by `scale` in [0, 1] into the output frame
+    """
+    np.multiply(state.base, scale, out = state.scratch)
+    np.copyto(state.frame, state.scratch, casting = 'unsafe')
+    return state.frame
+
+
+def crossfade(old: np.ndarray,
+        new: np.ndarray,
+        alpha: float,
+        scratch: np.ndarray,
+        out: np.ndarray
+    ) -> np.ndarray:
+    """
+    Blend two (N, 3) frames `alpha` in [0, 1] of the way from `old` to `new`
+    into `out`, through the float32 `scratch` buffer so nothing is allocated
+    """
+    np.subtract(new, old, out = scratch, dtype = np.float32)
+    scratch *= alpha
+    scratch += old
+    np.rint(scratch, out = scratch)
+    np.copyto(out, scratch, casting = 'unsafe')
+    return out
+
+
+def fadein_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs fade in from black to `state.base` over `state.duration` seconds
+    """
+    return _scaled(state, min(t / state.duration, 1.0))
+
+
+def fadeout_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs fade out from `state.base` to black over `state.duration` seconds
+    """
+    return _scaled(state, 1.0 - min(t / state.duration, 1.0))
+
+
+def breathe_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs fade in to `state.base` for `state.duration` seconds, hold for
+    `state.delay` seconds, fade out for `state.duration` seconds and stay
+    off for `state.delay` seconds, then repeat
+    """
+    t = t % (2 * (state.duration + state.delay))
+    if t < state.duration:
+        scale = t / state.duration
+    elif t < state.duration + state.delay:
+        scale = 1.0
+    elif t < 2 * state.duration + state.delay:
+        scale = 1.0 - (t - state.duration - state.delay) / state.duration
+    else:
+        scale = 0.0
+    return _scaled(state, scale)
+
+
+def _levelled(state: SimpleNamespace, colours: np.ndarray) -> np.ndarray:
+    """
+    Write `colours` scaled per LED by `state.led_levels` into the output frame
+    """
+    np.multiply(colours, state.led_levels[:, None], out = state.scratch)
+    np.copyto(state.frame, state.scratch, casting = 'unsafe')
+    return state.frame
+
+
+def fft_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs show the frequency bands of `state.audio` spread along the segment,
+    from low frequencies in red to high in blue, each as bright as its band
+    is loud
+    """
+    if state.audio is None or state.audio.latest(state.record) is None:
+        state.frame[:] = 0
+        return state.frame
+
+    np.take(state.record, state.band_index, out = state.led_levels)
+    return _levelled(state, state.spectrum_colours)
+
+
+def vu_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs light up from the start of the segment in proportion to the VU
+    level of `state.audio`, from green to red
+    """
+    if state.audio is None or state.audio.latest(state.record) is None:
+        state.frame[:] = 0
+        return state.frame
+
+    # the last lit LED is partly lit by the fractional part of the level
+    np.subtract(state.record[0] * state.count, state.ramp, out = state.led_levels)
+    np.clip(state.led_levels, 0, 1, out = state.led_levels)
+    return _levelled(state, state.vu_colours)
+
+
+def ambilight_frame(t: float, state: SimpleNamespace) -> np.ndarray:
+    """
+    LEDs show the colours at the border of the latest camera frame sampled
+    by `state.ambilight`
+    """
+    if state.ambilight is None or state.ambilight.colours(state.count, state.frame) is None:
+        state.frame[:] = 0
+    return state.frame
+
+
+EFFECTS: Dict[str, Effect] = {
+    "solid":   solid_frame,
+    "rainbow": rainbow_frame,
+    "fadein":  fadein_frame,
+    "fadeout": fadeout_frame,
+    "breathe": breathe_frame,
+    "fft":     fft_frame,
+    "vu":      vu_frame,
+    "ambilight": ambilight_frame,
+}
+
+# effects that need an input source, by the state param it is passed in
+EFFECT_SOURCES: Dict[str, str] = {
+    "fft":       "audio",
+    "vu":        "audio",
+    "ambilight": "ambilight",
+}
+
+
+def play(segment: Segment, effect: Effect, state: SimpleNamespace,
+        frames: int, dt: float
+    ) -> None:
+    """
+    Blocking helper rendering `frames` frames of `effect` onto `segment`,
+    `dt` seconds apart on a frame scheduler, which drops frames rather than
+    stretching the effect if committing is slow. If `dt` is 0 frames are
+    rendered back to back, one second of effect time apart
+    """
+    if not dt:
+        for j in range(frames):
+            segment.set_frame(effect(j, state))
+            segment.commit_pixels()
+        return
+
+    for t in FrameScheduler(1 / dt).ticks(duration = frames * dt):
+        segment.set_frame(effect(t, state))
+        segment.commit_pixels()
+
+
 def solid(segment,
 		color: Tuple[int, int, int]
 	) -> float:
     """
     Turn on all LEDS in the range in the headset
     """
-    for i in segment.RANGE:
-        segment.set_pixel(i, color)
+    segment.set_frame(solid_frame(0, make_state(segment.count, col = color)))
     segment.commit_pixels()
 
-    logging.info(f"Set effect SOLID with RGB color {color}")
+    log.info('Set effect SOLID with RGB color %s', color)
 
 
 def fadein_colour(segment,
@@ -52,21 +321,17 @@ def fadein_colour(segment,
     ) -> None:
     """
     All leds in segment should fade in to the `col` param or, if that is
-    not specified, to the `col` set in the constructor in `dt` second
-    increments
+    not specified, to the colours currently set on the segment in `dt`
+    second increments
     """
-    logging.info(f"Fade into colour {col} for duration {dt * 256}")
+    log.info('Fade into colour %s for duration %s', col, dt * 100)
 
+    if any(col):
+        state = make_state(segment.count, col = col, duration = (dt or 1) * 100)
+    else:
+        state = make_state(segment.count, base = segment.get_frame(), duration = (dt or 1) * 100)
     segment.all_off()
-    if not (col[0] and col[1] and col[2]):
-        col = segment.col
-    r, g, b = col
-    for j in range(100):
-        for i in segment.RANGE:
-            segment.set_pixel(i, (int(r * j/100), int(g * j/100), int(b * j/100)))
-        segment.commit_pixels()
-        if dt:
-            time.sleep(dt)
+    play(segment, fadein_frame, state, 100, dt)
 
 
 def fadeout(segment, dt: float = 0.01) -> None:
@@ -74,18 +339,10 @@ def fadeout(segment, dt: float = 0.01) -> None:
     All leds in segment should fade out from the current colour to black,
     going from full brightness to none in `dt` second increments
     """
-    logging.info(f"Fade to black for duration {dt * 256}")
+    log.info('Fade to black for duration %s', dt * 100)
 
-    for j in range(100):
-        for i in segment.RANGE:
-            r, g, b = segment.get_pixel(i)
-            r = int(r * (100 - j) / 100)
-            g = int(g * (100 - j) / 100)
-            b = int(b * (100 - j) / 100)
-            segment.set_pixel(i, (r, g, b))
-        segment.commit_pixels()
-        if dt:
-            time.sleep(dt)
+    state = make_state(segment.count, base = segment.get_frame(), duration = (dt or 1) * 100)
+    play(segment, fadeout_frame, state, 100, dt)
 
 
 def breathe(segment,
@@ -93,17 +350,19 @@ def breathe(segment,
     ) -> None:
     """
     All leds in segment should fade in to colour specified in `col` param,
-    or the `col` set in the constructor if that is not set, in `dt`
-    second increents. Then, after `delay` seconds, fade out in `dt` second
+    or the colours currently set on the segment if that is not set, in `dt`
+    second increments. Then, after `delay` seconds, fade out in `dt` second
     increments
     """
-    logging.info(f"Begin breathing effect with {delay} delay")
+    log.info('Begin breathing effect with %s delay', delay)
 
-    segment.crown_off()
-    segment.crown_fadein_colour(dt, col)
-    time.sleep(delay)
-    segment.crown_fadeout(dt)
-    time.sleep(delay)
+    if any(col):
+        state = make_state(segment.count, col = col, duration = (dt or 1) * 100, delay = delay)
+    else:
+        state = make_state(segment.count, base = segment.get_frame(),
+                duration = (dt or 1) * 100, delay = delay)
+    frames = int(2 * (state.duration + delay) / (dt or 1))
+    play(segment, breathe_frame, state, frames, dt)
 
 
 def rainbow(segment, dt: float = 0.01) -> None:
@@ -111,23 +370,10 @@ def rainbow(segment, dt: float = 0.01) -> None:
     All leds in segment cycle for `dt` seconds through the 256 possible
     colours, starting from consecutive colours
     """
-    logging.info("Cycling through rainbow colours")
-
-    for j in range(256):
-        for i in segment.RANGE:
-            col = (0, 0, 0)
-            pos = ((i * 256 // segment.COUNT) + j) % 256
-            if pos < 85:
-                col = (pos * 3, 255 - pos * 3, 0)
-            elif pos < 170:
-                pos -= 85
-                col = (255 - pos * 3, 0, pos * 3)
-            else:
-                pos -= 170
-                col = (0, pos * 3, 255 - pos * 3)
-            segment.set_pixel(i, col)
-        segment.commit_pixels()
-        time.sleep(dt)
+    log.debug('Cycling through rainbow colours')
+
+    state = make_state(segment.count, speed = 1 / (dt or 1))
+    play(segment, rainbow_frame, state, 256, dt)
 
 
 def rainbow_repeat(segment,
@@ -137,10 +383,10 @@ def rainbow_repeat(segment,
     All leds in segment cycle for `dt` seconds through the 256 possible
     colours for a total time of `duration` seconds
     """
-    logging.info("Begin rainbow cycle effect")
-
-    n = int(duration / dt)
+    log.info('Begin rainbow cycle effect')
 
-    for _ in range(n):
-        rainbow()
+    # number of full cycles, each going once round the 256 colour wheel
+    n = int(duration / (dt or 1))
 
+    state = make_state(segment.count, speed = 1 / (dt or 1))
+    play(segment, rainbow_frame, state, n * len(WHEEL), dt)
@@ -0,0 +1,114 @@
+#!/usr/bin/python3
+
+import logging
+import socket
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract segment class
+from lux.leds.segment import Segment
+from lux.leds import ddp
+
+log = logging.getLogger(__name__)
+
+"""
+Class implementing the output of an operator node, which renders the frames
+of the strips of several Pis and streams each its part of every frame over
+UDP as DDP packets, see `lux.leds.ddp`. Frames are stamped to be shown
+`delay` seconds after they are sent, long enough for every packet to arrive,
+so all strips change together. Packets are preallocated per receiver and
+only their header and pixel bytes are rewritten on each commit
+"""
+class NetSegment(Segment):
+    def __init__(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            receivers: List[SimpleNamespace],
+            port: int = ddp.DDP_PORT,
+            delay: float = 0.05,
+        ) -> None:
+        """
+        Params
+        ------
+        segment
+            smallest and largest index of LEDs (largest not included) in the
+            segment
+        reverse
+            True if the effect should be applied in reverse order
+        receivers
+            the `host` of each receiving Pi and the `range` of LEDs, `min`
+            and `max`, of this strip it shows
+        port
+            UDP port the receivers listen on
+        delay
+            seconds between sending a frame and showing it
+        """
+        super().__init__(segment, reverse)
+        self.delay = delay
+        self.sequence = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+        # for each receiver its address, and a packet per chunk of its part
+        # of the frame with a view of the packet's pixel bytes
+        self.receivers = []
+        for r in receivers:
+            lo, hi = r.range.min - self.start, r.range.max - self.start
+            if lo < 0 or hi > self.count or lo >= hi:
+                raise ValueError(f'Receiver {r.host} range {(r.range.min, r.range.max)} '
+                        f'outside of the strip {(self.start, self.stop)}')
+            address = socket.getaddrinfo(r.host, port, socket.AF_INET, socket.SOCK_DGRAM)[0][4]
+            pixels = self.frame[lo:hi].reshape(-1)
+            packets = []
+            for offset, length in ddp.chunks(pixels.nbytes):
+                packet = bytearray(ddp.HEADER.size + length)
+                data = np.frombuffer(packet, dtype = np.uint8, offset = ddp.HEADER.size)
+                packets.append((packet, data, pixels[offset:offset + length], offset))
+            self.receivers.append((address, packets))
+            log.info('Streaming LEDs %d-%d to %s:%d', r.range.min, r.range.max, r.host, port)
+
+        self.frames = 0
+        self.packets = 0
+        self.errors = 0
+        log.info('Initialisation of networked LEDs complete')
+
+
+    def commit_pixels(self) -> None:
+        """
+        Send each receiver its part of the frame, to be shown `delay` seconds
+        from now
+        """
+        self.sequence = self.sequence % 15 + 1
+        code = ddp.timecode(time.time() + self.delay)
+        for address, packets in self.receivers:
+            last = len(packets) - 1
+            for i, (packet, data, pixels, offset) in enumerate(packets):
+                ddp.pack_header(packet, self.sequence, offset, len(data), code, i == last)
+                data[:] = pixels
+                try:
+                    self.sock.sendto(packet, address)
+                    self.packets += 1
+                except OSError as e:
+                    # a receiver being down must not stop the others
+                    self.errors += 1
+                    log.debug('Sending to %s failed: %s', address, e)
+        self.frames += 1
+        super().commit_pixels()
+
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns
+        ------
+        dict with the frames and packets sent, and the sends that failed
+        """
+        return { 'frames': self.frames, 'packets': self.packets, 'errors': self.errors }
+
+
+    def close(self) -> None:
+        self.sock.close()
@@ -0,0 +1,600 @@
+#!/usr/bin/python3
+
+import atexit
+import logging
+import multiprocessing
+from multiprocessing import connection, shared_memory
+import time
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.leds import effects
+from lux.leds.compositor import Compositor
+from lux.leds.postprocess import PostProcessor
+from lux.leds.renderer import Renderer
+from lux.leds.segment import Segment
+
+log = logging.getLogger(__name__)
+
+"""
+Rendering the segments of a strip in worker processes, for installations
+whose effects keep one core busy under the GIL.
+
+Segments are shared out by LED count between the workers and the render
+process, which renders a share itself rather than wait idle. Every worker
+renders its segments into their slices of one strip held in shared memory,
+so frames are never pickled. The render process talks to each worker over
+a pipe of its own: it copies the latest inputs to shared memory and sends
+every worker the frame time, renders its own share into the canvas, then
+waits until all of the workers have answered, copies their slices of the
+strip into the canvas and colour corrects and commits it once, as
+`Compositor` does. That is one message each way per worker a frame, with no
+barrier to wait on.
+
+Commands switching or updating a segment are pickled to its worker down the
+same pipe, so a worker applies all of them before the frame they were posted
+for. Audio levels and the integral image of the ambilight are copied to
+shared memory before each frame, and read by stand-ins of the pipeline and
+sampler in the workers.
+
+The render process waits on the pipes and on the process sentinels
+together, so a worker that raises, is killed or hangs is noticed within
+`FRAME_TIMEOUT` rather than blocking the frame. The workers are then
+stopped, the frame is rendered in the render process from a copy it keeps
+of every segment's renderer, and the workers are started again on the next
+frame, from the effect each segment was last switched to.
+"""
+
+# seconds the render process waits for the workers to render a frame, and
+# to start up and render the first
+FRAME_TIMEOUT = 5.0
+START_TIMEOUT = 60.0
+
+# seconds workers are given to exit when stopped, before being terminated
+STOP_TIMEOUT = 1.0
+
+# slots of the control block
+AUDIO, AMBILIGHT = range(2)
+
+# params of an effect state kept when it is sent to a worker, the buffers
+# are rebuilt there by `effects.make_state`
+STATE_PARAMS = ('col', 'duration', 'delay', 'speed', 'base', 'audio', 'ambilight')
+
+
+class SharedStrip():
+    """
+    The block of shared memory of a parallel compositor: a control block
+    with the sequence numbers of the inputs, then the ambilight integral
+    image, the audio record and the (N, 3) strip
+    """
+
+    def __init__(self,
+            length: int,
+            bands: int = 0,
+            ambilight: Optional[Tuple[int, int]] = None,
+            name: Optional[str] = None
+        ) -> None:
+        """
+        Params
+        ------
+        length
+            LEDs in the strip
+        bands
+            frequency bands of the audio pipeline, 0 without audio
+        ambilight
+            width and height frames are downscaled to by the ambilight
+            sampler, None without ambilight
+        name
+            name of the block to attach to, a new one is created if None
+        """
+        self.layout = (length, bands, ambilight)
+        width, height = ambilight or (0, 0)
+        # widest types first, so every array is aligned
+        shapes = [
+            ('control',  (2,), np.float64),
+            ('integral', (height + 1, width + 1, 3) if ambilight else (0,), np.int32),
+            ('record',   (bands + 1,) if bands else (0,), np.float32),
+            ('frame',    (length, 3), np.uint8),
+        ]
+        size = sum(int(np.prod(shape)) * np.dtype(dtype).itemsize for _, shape, dtype in shapes)
+        self.shm = shared_memory.SharedMemory(name = name, create = name is None, size = size)
+        self.name = self.shm.name
+
+        offset = 0
+        for attr, shape, dtype in shapes:
+            array = np.ndarray(shape, dtype = dtype, buffer = self.shm.buf, offset = offset)
+            setattr(self, attr, array)
+            offset += array.nbytes
+        if name is None:
+            self.control[:] = 0
+
+
+    def close(self) -> None:
+        # numpy views must go before the block can be closed
+        self.control = self.integral = self.record = self.frame = None
+        self.shm.close()
+
+
+    def unlink(self) -> None:
+        self.close()
+        self.shm.unlink()
+
+
+class SharedAudio():
+    """
+    Stand-in for an `AudioPipeline` in a worker, whose latest record is the
+    one copied to shared memory before the frame
+    """
+
+    def __init__(self, strip: SharedStrip) -> None:
+        self.strip = strip
+        self.bands = len(strip.record) - 1
+
+
+    def latest(self, out: np.ndarray) -> Optional[int]:
+        seq = int(self.strip.control[AUDIO])
+        if not seq:
+            return None
+        np.copyto(out, self.strip.record)
+        return seq
+
+
+def portable(state: SimpleNamespace) -> Dict[str, Any]:
+    """
+    Returns
+    ------
+    the params of an effect state to send to a worker, with the inputs, which
+    live in the render process, replaced by whether there is one
+    """
+    params = { k: getattr(state, k) for k in STATE_PARAMS if hasattr(state, k) }
+    for source in ('audio', 'ambilight'):
+        params[source] = params.get(source) is not None
+    return params
+
+
+def rebuild(count: int, params: Dict[str, Any], sources: Dict[str, Any]) -> SimpleNamespace:
+    """
+    Build the effect state of `count` LEDs sent as `params` in a worker,
+    reading from the worker's stand-ins of the inputs in `sources`
+    """
+    params = dict(params)
+    for source in ('audio', 'ambilight'):
+        params[source] = sources.get(source) if params.get(source) else None
+    return effects.make_state(count, **params)
+
+
+def work(
+        name: str,
+        layout: Tuple,
+        segments: List[Tuple[int, int, int, bool, effects.Effect, Dict, float]],
+        conn: connection.Connection,
+        ambilight: Optional[Tuple[float, Tuple[str, ...]]] = None
+    ) -> None:
+    """
+    Render `segments`, each given as its index, range, direction, effect,
+    state params and start time, into the shared strip `name` for every
+    frame time received on `conn`, answering once done, until sent None.
+    Runs in a worker process
+    """
+    length, bands, size = layout
+    strip = SharedStrip(length, bands, size, name = name)
+    output = Segment((0, length), False)
+    output.frame = strip.frame
+
+    sources: Dict[str, Any] = {}
+    if bands:
+        sources['audio'] = SharedAudio(strip)
+    sampler = None
+    if size is not None:
+        from lux.video.ambilight import AmbilightSampler
+        depth, sides = ambilight
+        sampler = AmbilightSampler(size[0], size[1], depth, sides)
+        sampler.integral = strip.integral
+        sources['ambilight'] = sampler
+
+    renderers: Dict[int, Renderer] = {}
+    for index, start, stop, reverse, effect, params, started in segments:
+        renderer = Renderer(Segment((start, stop), reverse, parent = output),
+                effect, rebuild(stop - start, params, sources))
+        renderer.started = started
+        renderers[index] = renderer
+
+    try:
+        while True:
+            message = conn.recv()
+            if message is None:
+                break
+            command, *args = message
+            if command == 'frame':
+                if sampler is not None:
+                    sampler.frames = int(strip.control[AMBILIGHT])
+                for renderer in renderers.values():
+                    renderer.render(args[0], commit = False)
+                conn.send(True)
+            elif command == 'switch':
+                index, effect, params, t, transition = args
+                renderer = renderers[index]
+                renderer.switch(effect, rebuild(renderer.segment.count, params, sources),
+                        t, transition)
+            else:
+                index, params = args
+                for k, v in params.items():
+                    setattr(renderers[index].state, k, v)
+    except (EOFError, OSError):
+        log.warning('Render worker %s stopped, the render process is gone',
+                multiprocessing.current_process().name)
+    finally:
+        # views of the shared strip must go before it can be closed
+        renderers.clear()
+        sources.clear()
+        sampler = output = None
+        strip.close()
+        conn.close()
+
+
+class WorkerError(Exception):
+    """
+    A render worker died or did not answer in time
+    """
+
+
+class RemoteState():
+    """
+    The state of a segment rendered by a worker; parameters set on it are
+    sent to the worker, e.g. by `EffectRunner.update`, and set on the copy
+    of the state in the render process
+    """
+
+    def __init__(self, renderer: 'RemoteRenderer') -> None:
+        object.__setattr__(self, 'renderer', renderer)
+
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.renderer.local.state, name)
+
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        renderer = self.renderer
+        setattr(renderer.local.state, name, value)
+        if name in STATE_PARAMS:
+            renderer.params = portable(renderer.local.state)
+        renderer.compositor.send(renderer, ('update', renderer.index, { name: value }))
+
+
+class RemoteRenderer():
+    """
+    Stand-in in the render process for the renderer of a segment in a
+    worker, taking the same commands as `Renderer`. Commands are applied to
+    a local renderer too, which renders the segment if it is in the share of
+    the render process, or when the workers fail
+    """
+
+    def __init__(self,
+            compositor: 'ParallelCompositor',
+            index: int,
+            segment: Segment,
+            effect: effects.Effect,
+            state: SimpleNamespace
+        ) -> None:
+        self.compositor = compositor
+        self.index = index
+        self.segment = segment
+        self.local = Renderer(segment, effect, state, compositor.scheduler.fps)
+        self.params = portable(state)
+        # effect, state params and start time the worker starts from,
+        # switches posted before it started are sent to it as commands
+        self.initial = (effect, self.params, 0.0)
+        # index of the worker rendering the segment, -1 for the render process
+        self.worker = -1
+        self.state = RemoteState(self)
+
+
+    @property
+    def effect(self) -> effects.Effect:
+        return self.local.effect
+
+
+    def render(self, t: float, commit: bool = True) -> None:
+        """
+        Render the segment in the render process, see `Renderer.render`
+        """
+        self.local.render(t, commit)
+
+
+    def switch(self,
+            effect: effects.Effect,
+            state: SimpleNamespace,
+            t: float,
+            transition: float = 0.0
+        ) -> None:
+        """
+        Switch the segment to `effect` in its worker, see `Renderer.switch`
+        """
+        self.local.switch(effect, state, t, transition)
+        self.params = portable(state)
+        self.compositor.send(self,
+                ('switch', self.index, effect, self.params, t, transition))
+
+
+class ParallelCompositor(Compositor):
+    """
+    Compositor rendering its segments in `workers` processes, see the notes
+    of this module. Segments are added as to `Compositor`; the workers are
+    started when the first frame is rendered
+    """
+
+    def __init__(self,
+            output: Segment,
+            fps: float = 30.0,
+            postprocess: Optional[PostProcessor] = None,
+            workers: int = 2,
+            audio: Optional[Any] = None,
+            ambilight: Optional[Any] = None
+        ) -> None:
+        """
+        Params
+        ------
+        output, fps, postprocess
+            see `Compositor`
+        workers
+            number of worker processes, each rendering a share of the
+            segments as the render process does; at most one share per
+            segment is made
+        audio
+            audio pipeline the fft and vu effects read, if any
+        ambilight
+            ambilight sampler the ambilight effect reads, if any
+        """
+        super().__init__(output, fps, postprocess)
+        self.workers = workers
+        self.audio = audio
+        self.ambilight = ambilight
+        self.strip: Optional[SharedStrip] = None
+        self.processes: List[multiprocessing.Process] = []
+        self.conns: List[connection.Connection] = []
+        self.started = False
+        # the renderers of the share of the render process, and the slices
+        # of the strip rendered by the workers
+        self.share: List[RemoteRenderer] = []
+        self.slices: List[slice] = []
+        # commands posted while the workers were stopped
+        self.pending: List[Tuple[RemoteRenderer, Tuple]] = []
+        self.ambilight_frames = 0
+
+
+    def add(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            effect: effects.Effect,
+            state: Optional[SimpleNamespace] = None
+        ) -> RemoteRenderer:
+        """
+        Add a segment as `Compositor.add` does, before the first frame
+        """
+        if self.started:
+            raise RuntimeError('Segments cannot be added once the workers are started')
+        if state is None:
+            state = effects.make_state(segment[1] - segment[0])
+        renderer = RemoteRenderer(self, len(self.renderers),
+                Segment(segment, reverse, parent = self.canvas), effect, state)
+        self.renderers.append(renderer)
+        return renderer
+
+
+    def send(self, renderer: RemoteRenderer, command: Tuple) -> None:
+        """
+        Send `command` to the worker of `renderer`, to apply before its next
+        frame. Segments rendered by the render process already have it
+        applied to their local renderer
+        """
+        if not self.started:
+            self.pending.append((renderer, command))
+            return
+        if renderer.worker < 0:
+            return
+        try:
+            self.conns[renderer.worker].send(command)
+        except OSError as e:
+            # the next frame finds the worker gone, and restarts it from the
+            # local renderer, which has the command applied
+            log.warning('Could not send %s to render worker %d: %s', command[0],
+                    renderer.worker, e)
+
+
+    def assign(self) -> List[List[RemoteRenderer]]:
+        """
+        Share the segments out between the render process and the workers,
+        the longest first to the share with the fewest LEDs so far. The
+        first share is kept as `share`, for the render process
+
+        Returns
+        ------
+        the renderers of each worker, with none empty
+        """
+        shares: List[List[RemoteRenderer]] = [ [] for _ in range(min(self.workers + 1, len(self.renderers))) ]
+        load = [ 0 ] * len(shares)
+        for renderer in sorted(self.renderers, key = lambda r: -r.segment.count):
+            i = load.index(min(load))
+            shares[i].append(renderer)
+            renderer.worker = i - 1
+            load[i] += renderer.segment.count
+        self.share = shares[0] if shares else []
+        return shares[1:]
+
+
+    def start(self) -> None:
+        """
+        Create the shared strip and start the workers
+        """
+        self.started = True
+        shares = self.assign()
+        bands = self.audio.bands if self.audio is not None else 0
+        a = self.ambilight
+        size = (a.width, a.height) if a is not None else None
+        self.strip = SharedStrip(self.output.count, bands, size)
+        self.ambilight_frames = 0
+
+        # workers are spawned rather than forked, as the render process runs
+        # the logging, audio and web threads
+        context = multiprocessing.get_context('spawn')
+        base = self.canvas.start
+        self.slices = [ slice(r.segment.start - base, r.segment.stop - base)
+                for renderers in shares for r in renderers ]
+        for worker, renderers in enumerate(shares):
+            segments = [ (r.index, r.segment.start - base, r.segment.stop - base,
+                    r.segment.reverse, *r.initial) for r in renderers ]
+            conn, child = context.Pipe()
+            process = context.Process(target = work, daemon = True,
+                    name = f'render-{worker}', args = (self.strip.name, self.strip.layout,
+                    segments, child, (a.depth, a.sides) if a is not None else None))
+            process.start()
+            # only the worker holds its end, so the pipe breaks if it dies
+            child.close()
+            self.conns.append(conn)
+            self.processes.append(process)
+        atexit.register(self.close)
+        log.info('Rendering %d segments of %d LEDs in the render process and %d workers',
+                len(self.renderers), self.output.count, len(shares))
+
+        pending, self.pending = self.pending, []
+        for renderer, command in pending:
+            self.send(renderer, command)
+
+
+    def publish_inputs(self) -> None:
+        """
+        Copy the latest audio record, and the ambilight integral image if a
+        new frame was sampled, to shared memory
+        """
+        control = self.strip.control
+        if self.audio is not None:
+            control[AUDIO] = self.audio.latest(self.strip.record) or 0
+        a = self.ambilight
+        if a is not None and a.frames != self.ambilight_frames:
+            np.copyto(self.strip.integral, a.integral)
+            self.ambilight_frames = a.frames
+            control[AMBILIGHT] = a.frames
+
+
+    def frame(self, t: float, timeout: float) -> None:
+        """
+        Have every worker render its segments at `t` seconds into the shared
+        strip while the render process renders its share into the canvas,
+        waiting until all of them are done
+
+        Raises
+        ------
+        WorkerError
+            if a worker dies, or they are not done within `timeout` seconds
+        """
+        for conn in self.conns:
+            conn.send(('frame', t))
+        deadline = time.monotonic() + timeout
+        try:
+            for renderer in self.share:
+                renderer.render(t, commit = False)
+        finally:
+            # read the answers even if an effect raised, so the next frame
+            # does not take them for its own
+            self.collect(deadline, timeout)
+
+
+    def collect(self, deadline: float, timeout: float) -> None:
+        """
+        Wait until `deadline` for every worker to answer that its frame is
+        done
+
+        Raises
+        ------
+        WorkerError
+            if a worker dies or does not answer in time
+        """
+        busy = dict(zip(self.conns, self.processes))
+        while busy:
+            ready = connection.wait(list(busy) + [ p.sentinel for p in busy.values() ],
+                    max(deadline - time.monotonic(), 0))
+            if not ready:
+                raise WorkerError(f'{len(busy)} workers did not answer in {timeout:.1f}s')
+            for conn, process in list(busy.items()):
+                # a worker may answer and then exit, so read its pipe first
+                if conn in ready:
+                    conn.recv()
+                    del busy[conn]
+                elif process.sentinel in ready:
+                    raise WorkerError(f'{process.name} exited with code {process.exitcode}')
+
+
+    def compose(self, t: float) -> None:
+        """
+        Have the workers and the render process render every segment at `t`
+        seconds, and copy the slices of the workers into the canvas. If they
+        fail, they are stopped
+        and the frame is rendered in this process instead
+        """
+        timeout = FRAME_TIMEOUT
+        try:
+            if not self.started:
+                self.start()
+                timeout = START_TIMEOUT
+            self.publish_inputs()
+            self.frame(t, timeout)
+        except (WorkerError, EOFError, OSError) as e:
+            # the workers are started again on the next frame, with the
+            # effect each segment was last switched to
+            log.error('Render workers failed frame at %.2fs, rendering it here and '
+                    'restarting them: %s', t, e)
+            self.close()
+            Compositor.compose(self, t)
+            return
+        for s in self.slices:
+            self.canvas.frame[s] = self.strip.frame[s]
+
+
+    def close(self) -> None:
+        """
+        Stop the workers, terminating any that do not exit in time, and
+        release the shared strip
+        """
+        if not self.started:
+            return
+        self.started = False
+        atexit.unregister(self.close)
+        for conn in self.conns:
+            try:
+                conn.send(None)
+            except OSError:
+                pass
+        deadline = time.monotonic() + STOP_TIMEOUT
+        for process in self.processes:
+            process.join(max(deadline - time.monotonic(), 0))
+            if process.is_alive():
+                log.warning('Terminating render worker %s', process.name)
+                process.terminate()
+                process.join(STOP_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+                process.join(STOP_TIMEOUT)
+        for conn in self.conns:
+            conn.close()
+        self.processes, self.conns, self.pending = [], [], []
+        self.share, self.slices = [], []
+        # workers started again start from the effect last switched to, or
+        # from the one it is fading from, switching to it on the first frame
+        for renderer in self.renderers:
+            local = renderer.local
+            p = local.previous
+            if p is None:
+                renderer.initial = (local.effect, renderer.params, local.started)
+                continue
+            renderer.initial = (p.effect, portable(p.state), p.started)
+            self.pending.append((renderer, ('switch', renderer.index, local.effect,
+                    renderer.params, local.started, local.transition)))
+        if self.strip is not None:
+            self.strip.unlink()
+            self.strip = None
+        log.info('Stopped render workers')
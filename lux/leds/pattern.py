@@ -0,0 +1,163 @@
+#!/usr/bin/python3
+
+"""
+Compact binary format for recorded LED frames.
+
+A 32-byte little-endian header:
+
+    magic     4s   b'LUXP'
+    version   H    1
+    channels  H    bytes per LED, 3
+    count     I    LEDs per frame
+    fps       f    frames per second the pattern was recorded at
+    order     4s   channel order of the frame bytes, e.g. b'RGB'
+    padding   12x
+
+followed by raw uint8 frames of `count * channels` bytes each, back to back.
+
+Patterns are recorded from what is committed to the strip, after colour
+correction, so `PlaybackSegment` can send them to the LEDs unchanged.
+"""
+
+import struct
+from types import SimpleNamespace
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+from lux.tools.schema import Config
+
+MAGIC = b'LUXP'
+VERSION = 1
+HEADER = struct.Struct('<4sHHIf4s12x')
+
+
+def read_header(fh: BinaryIO) -> SimpleNamespace:
+    """
+    Read and check the header at the start of a pattern file
+
+    Returns
+    ------
+    namespace with `count`, `channels`, `fps`, `order` and the `frame_size`
+    in bytes
+    """
+    data = fh.read(HEADER.size)
+    if len(data) < HEADER.size:
+        raise ValueError('Pattern file too short for a header')
+    magic, version, channels, count, fps, order = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError(f'Not a pattern file, magic is {magic!r}')
+    if version != VERSION:
+        raise ValueError(f'Unsupported pattern version {version}')
+    return SimpleNamespace(count = count, channels = channels, fps = fps,
+            order = order.rstrip(b'\0').decode(), frame_size = count * channels)
+
+
+class PatternWriter():
+    """
+    Append frames to a new pattern file
+    """
+
+    def __init__(self, path: str, count: int, fps: float, order: str = 'RGB') -> None:
+        """
+        Params
+        ------
+        path
+            file to create, overwritten if it exists
+        count
+            LEDs per frame
+        fps
+            frames per second the pattern plays at
+        order
+            channel order of the frames written
+        """
+        self.path = path
+        self.count = count
+        self.frames = 0
+        self.fh = open(path, 'wb')
+        self.fh.write(HEADER.pack(MAGIC, VERSION, 3, count, fps, order.encode()))
+
+
+    def write(self, frame: np.ndarray) -> None:
+        """
+        Append one (count, 3) uint8 frame
+        """
+        self.fh.write(np.ascontiguousarray(frame, dtype = np.uint8).data)
+        self.frames += 1
+
+
+    def close(self) -> None:
+        self.fh.close()
+
+
+def render(path: str,
+        config: Config,
+        seconds: float,
+        wav: Optional[str] = None
+    ) -> int:
+    """
+    Render the segments of a config offline, as fast as possible, with the
+    colour correction the server would apply, and record them to a pattern
+
+    Params
+    ------
+    path
+        pattern file to write
+    config
+        validated config, as config/default.yml, see `lux.tools.schema`
+    seconds
+        length of the pattern
+    wav
+        16-bit WAV file the audio effects analyse, stepped in time with the
+        frames so that the pattern matches the track exactly
+
+    Returns
+    ------
+    number of frames recorded
+    """
+    from lux.audio.pipeline import AudioPipeline
+    from lux.audio.source import WavSource
+    from lux.leds.compositor import Compositor
+    from lux.leds.postprocess import PostProcessor
+    from lux.leds.segment import Segment
+    from lux.tools.schema import compile
+
+    p = compile(config)
+    postprocess = PostProcessor(p.length)
+    postprocess.set_params(p.lut, p.attack, p.release, p.max_current, p.ma_per_channel)
+    compositor = Compositor(Segment((0, p.length), False), config.fps, postprocess)
+
+    audio = None
+    if wav:
+        audio = AudioPipeline(WavSource(wav, config.audio.blocksize, realtime = False),
+                config.audio.bands)
+    compositor.add_from_config(p.segments, p.col, audio = audio)
+
+    compositor.record(path)
+    frames = int(seconds * config.fps)
+    for i in range(frames):
+        t = i / config.fps
+        # analyse the audio up to the time of the frame
+        while audio is not None and audio.blocks * audio.source.blocksize < t * audio.source.samplerate:
+            if not audio.step():
+                audio = None
+        compositor.render(t)
+    compositor.stop_recording()
+    return frames
+
+
+if __name__ == '__main__':
+    import argparse
+    from lux.tools.schema import load_file
+
+    parser = argparse.ArgumentParser(
+        description = 'Pre-render the segments of a config to a pattern file')
+    parser.add_argument('path', help = 'pattern file to write')
+    parser.add_argument('--config', default = './config/default.yml')
+    parser.add_argument('--seconds', type = float, default = 10)
+    parser.add_argument('--wav', default = None, help = 'track the audio effects follow')
+    args = parser.parse_args()
+
+    config = load_file(args.config)
+    frames = render(args.path, config, args.seconds, args.wav)
+    print(f"Recorded {frames} frames at {config.fps} fps to {args.path}")
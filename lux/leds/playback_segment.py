@@ -0,0 +1,168 @@
+#!/usr/bin/python3
+
+import argparse
+import logging
+import mmap
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract segment class
+from lux.leds.segment import Segment
+from lux.leds.drivers import DRIVERS, open_driver
+from lux.leds.pattern import HEADER, read_header
+from lux.tools.scheduler import FrameScheduler
+
+log = logging.getLogger(__name__)
+
+"""
+Class playing back a pattern file recorded from the strip. The file is
+memory-mapped, the frame buffer of the segment is a view of the current
+frame in the map, and commits hand a slice of the map straight to the
+output, so playing a frame costs the same whatever effect was recorded
+"""
+class PlaybackSegment(Segment):
+    def __init__(self,
+            path: str,
+            write: Optional[Callable[[memoryview], None]] = None,
+            loop: bool = True
+        ) -> None:
+        """
+        Params
+        ------
+        path
+            pattern file, see `lux.leds.pattern`
+        write
+            called with the bytes of the frame on every commit, e.g. the
+            write of an SPI device; the bytes are a view of the file, so they
+            must not be kept after the call
+        loop
+            if True, playback starts over at the end of the pattern
+        """
+        self.fh = open(path, 'rb')
+        self.header = read_header(self.fh)
+        super().__init__((0, self.header.count), False)
+
+        self.map = mmap.mmap(self.fh.fileno(), 0, access = mmap.ACCESS_READ)
+        self.length = (len(self.map) - HEADER.size) // self.header.frame_size
+        if self.length == 0:
+            raise ValueError(f'No frames in pattern {path}')
+
+        # read-only views of the map, nothing is copied
+        self.view = memoryview(self.map)
+        self.frames = np.frombuffer(self.map, dtype = np.uint8, offset = HEADER.size,
+                count = self.length * self.header.frame_size).reshape(
+                        self.length, self.header.count, self.header.channels)
+
+        self.write = write
+        self.loop = loop
+        self.fps = self.header.fps
+        self.scheduler = FrameScheduler(self.fps)
+        self.position = 0
+        self.frame = self.frames[0]
+        log.info('Opened pattern %s, %d frames of %d LEDs at %g fps',
+                path, self.length, self.header.count, self.fps)
+
+
+    def seek(self, position: int) -> None:
+        """
+        Make frame `position` the current frame, wrapping around if looping
+        """
+        if self.loop:
+            position %= self.length
+        self.position = min(max(position, 0), self.length - 1)
+        self.frame = self.frames[self.position]
+
+
+    def seek_time(self, seconds: float) -> None:
+        """
+        Make the frame `seconds` into the pattern the current frame
+        """
+        self.seek(int(round(seconds * self.fps)))
+
+
+    def commit_pixels(self) -> None:
+        """
+        Send the current frame, as a slice of the mapped file
+        """
+        if self.write is not None:
+            begin = HEADER.size + self.position * self.header.frame_size
+            self.write(self.view[begin:begin + self.header.frame_size])
+        super().commit_pixels()
+
+
+    def play(self,
+            running: Optional[Callable[[], bool]] = None,
+            duration: Optional[float] = None
+        ) -> None:
+        """
+        Play frames from the current position at the pattern's frame rate,
+        blocking. Frames the scheduler drops are skipped, so playback keeps
+        to the recorded timing
+
+        Params
+        ------
+        running
+            playback stops as soon as this returns False
+        duration
+            if given, seconds to play for
+        """
+        start = self.position
+        for t in self.scheduler.ticks(running, duration):
+            position = start + int(round(t * self.fps))
+            if position >= self.length and not self.loop:
+                break
+            self.seek(position)
+            self.commit_pixels()
+
+
+    def close(self) -> None:
+        # views of the map have to go before it can be closed
+        self.frame = None
+        self.frames = None
+        self.view.release()
+        self.map.close()
+        self.fh.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Play a pattern file on the LEDs')
+    parser.add_argument('path', help = 'pattern file to play')
+    parser.add_argument('--leds', default = '', choices = [ '' ] + list(DRIVERS),
+        help = 'strip to play on, nothing to only measure playback')
+    parser.add_argument('--seek', type = float, default = 0, help = 'seconds to start at')
+    parser.add_argument('--seconds', type = float, default = None)
+    parser.add_argument('--no-loop', action = 'store_true')
+    parser.add_argument('--device', default = '/dev/spidev0.0')
+    parser.add_argument('--speed', type = int, default = 0, help = 'SPI clock in Hz')
+    parser.add_argument('--order', default = '', help = 'channel order of the strip')
+    args = parser.parse_args()
+
+    write = None
+    if args.leds:
+        from lux.tools.schema import SPIConfig
+        with open(args.path, 'rb') as fh:
+            count = read_header(fh).count
+        spi = SPIConfig(device = args.device, speed_hz = args.speed, order = args.order)
+        write = open_driver(args.leds, count, spi).write
+
+    segment = PlaybackSegment(args.path, write, loop = not args.no_loop)
+    segment.seek_time(args.seek)
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        segment.play(duration = args.seconds)
+    except KeyboardInterrupt:
+        pass
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+
+    stats = segment.scheduler.stats()
+    print(f"frames           {stats['frames']} of {segment.length}")
+    print(f"achieved fps     {stats['achieved_fps']:.1f}")
+    print(f"dropped frames   {stats['dropped']}")
+    print(f"CPU              {100 * cpu / wall:.1f}%")
+    segment.close()
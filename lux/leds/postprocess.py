@@ -0,0 +1,177 @@
+#!/usr/bin/python3
+
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+def correction_lut(
+        gamma: float = 2.2,
+        white: Tuple[int, int, int] = (255, 255, 255),
+        brightness: float = 1.0
+    ) -> np.ndarray:
+    """
+    Precompute per-channel gamma, white balance and brightness correction
+
+    Params
+    ------
+    gamma
+        exponent mapping perceived brightness to LED duty cycle
+    white
+        RGB output the strip shows for full white, scaling each channel
+    brightness
+        global brightness cap in [0, 1]
+
+    Returns
+    ------
+    (3, 256) uint8 array where row c maps input values of channel c to output
+    """
+    x = np.linspace(0, 1, 256) ** gamma
+    scale = np.asarray(white, dtype = np.float64)[:, None] * brightness
+    return np.round(x[None, :] * scale).astype(np.uint8)
+
+
+class PostProcessor():
+    """
+    Correct a composed (N, 3) frame before it is committed, in place or into
+    an output buffer:
+
+    - an asymmetric attack/release exponential moving average over time,
+      which removes flicker from sampled colours while still following
+      sudden increases
+    - a per-channel gamma, white balance and brightness LUT
+    - a power limiter scaling the whole frame down when its estimated
+      current draw is over budget
+
+    All buffers are allocated up front, so processing a frame does not
+    allocate.
+    """
+
+    def __init__(self,
+            count: int,
+            gamma: float = 2.2,
+            white: Tuple[int, int, int] = (255, 255, 255),
+            brightness: float = 1.0,
+            attack: float = 1.0,
+            release: float = 1.0,
+            max_current: float = 0,
+            ma_per_channel: float = 20.0,
+        ) -> None:
+        """
+        Params
+        ------
+        count
+            number of LEDs in the frames processed
+        gamma, white, brightness
+            see `correction_lut`
+        attack, release
+            weight of the new frame in the moving average when a channel gets
+            brighter or darker respectively; 1 disables smoothing
+        max_current
+            current budget of the strip in mA, 0 for no limit
+        ma_per_channel
+            current in mA one channel of one LED draws at full brightness
+        """
+        self.count = count
+        self.attack = attack
+        self.release = release
+        self.max_current = max_current
+        self.ma_per_channel = ma_per_channel
+
+        # the three channel LUTs side by side, looked up in one `take` by
+        # offsetting each channel's values into its own LUT
+        self.lut = correction_lut(gamma, white, brightness).reshape(-1)
+        self.offsets = np.array([0, 256, 512], dtype = np.intp)
+
+        self.smooth = np.zeros((count, 3), dtype = np.float32)
+        self.diff = np.zeros((count, 3), dtype = np.float32)
+        self.rising = np.zeros((count, 3), dtype = bool)
+        self.weights = np.zeros((count, 3), dtype = np.float32)
+        self.index = np.zeros((count, 3), dtype = np.intp)
+
+        # estimated current of the last frame after limiting, in mA
+        self.current = 0.0
+
+
+    def set_lut(self,
+            gamma: float = 2.2,
+            white: Tuple[int, int, int] = (255, 255, 255),
+            brightness: float = 1.0
+        ) -> None:
+        """
+        Replace the colour correction, see `correction_lut`
+        """
+        self.lut = correction_lut(gamma, white, brightness).reshape(-1)
+
+
+    def set_params(self,
+            lut: np.ndarray,
+            attack: float,
+            release: float,
+            max_current: float,
+            ma_per_channel: float
+        ) -> None:
+        """
+        Replace every parameter at once, with a LUT precomputed as in
+        `lux.tools.schema.compile`. Called between frames, so a frame is
+        never processed with a mix of old and new parameters
+        """
+        self.lut = lut
+        self.attack = attack
+        self.release = release
+        self.max_current = max_current
+        self.ma_per_channel = ma_per_channel
+
+
+    def _filter(self, frame: np.ndarray, out: np.ndarray) -> None:
+        """
+        Move the smoothed frame towards `frame` and write it to `out`
+        """
+        np.subtract(frame, self.smooth, out = self.diff)
+        np.greater(self.diff, 0, out = self.rising)
+        self.weights.fill(self.release)
+        np.copyto(self.weights, self.attack, where = self.rising)
+        np.multiply(self.diff, self.weights, out = self.diff)
+        self.smooth += self.diff
+        np.rint(self.smooth, out = self.diff)
+        np.copyto(out, self.diff, casting = 'unsafe')
+
+
+    def _limit(self, frame: np.ndarray) -> None:
+        """
+        Scale `frame` down if it draws more than `max_current`
+        """
+        self.current = float(frame.sum()) / 255 * self.ma_per_channel
+        if self.max_current and self.current > self.max_current:
+            np.multiply(frame, self.max_current / self.current, out = self.diff)
+            np.copyto(frame, self.diff, casting = 'unsafe')
+            self.current = self.max_current
+
+
+    def process(self, frame: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Smooth, correct and limit `frame`
+
+        Params
+        ------
+        frame
+            (count, 3) uint8 RGB frame
+        out
+            (count, 3) uint8 buffer for the result, `frame` itself if None,
+            which is corrected in place. Otherwise `frame` is left as it is
+
+        Returns
+        ------
+        `out`
+        """
+        if out is None:
+            out = frame
+        if self.attack < 1 or self.release < 1:
+            self._filter(frame, out)
+            frame = out
+
+        np.add(frame, self.offsets, out = self.index)
+        np.take(self.lut, self.index, out = out)
+
+        self._limit(out)
+        return out
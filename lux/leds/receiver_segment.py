@@ -0,0 +1,302 @@
+#!/usr/bin/python3
+
+import argparse
+import heapq
+import logging
+import socket
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract segment class
+from lux.leds.segment import Segment
+from lux.leds import ddp
+from lux.leds.drivers import DRIVERS, open_driver
+from lux.tools.metrics import Histogram
+
+log = logging.getLogger(__name__)
+
+"""
+Class implementing a strip shown from frames streamed by an operator node,
+see `lux.leds.net_segment`. Packets are assembled into frames by sequence
+number, complete frames wait in a jitter buffer until the time stamped on
+them, and are then committed through the strip's output segment, so every
+strip of the installation changes on the same frame. Frame buffers are
+preallocated and recycled, the receiving and presenting each run in a thread
+"""
+class ReceiverSegment(Segment):
+    def __init__(self,
+            output: Segment,
+            port: int = ddp.DDP_PORT,
+            host: str = '0.0.0.0',
+            depth: int = 8,
+            max_ahead: float = 1.0,
+        ) -> None:
+        """
+        Params
+        ------
+        output
+            segment driving the physical strip; frames are shown on all of it
+        port
+            UDP port to listen on
+        host
+            address to listen on
+        depth
+            most complete frames held in the jitter buffer, the oldest is
+            dropped when it is full
+        max_ahead
+            frames stamped further than this many seconds ahead are shown as
+            soon as they arrive, as the clocks of the nodes are not in sync
+        """
+        super().__init__((output.start, output.stop), False, output)
+        self.max_ahead = max_ahead
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.5)
+
+        # one buffer being assembled, `depth` in the jitter buffer and one
+        # being shown
+        self.buffers = [ np.zeros_like(self.frame) for _ in range(depth + 2) ]
+        self.free: List[int] = list(range(depth + 2))
+        self.depth = depth
+        # (time to show, arrival order, buffer index) of complete frames
+        self.queue: List[Tuple[float, int, int]] = []
+        self.ready = threading.Condition()
+
+        self.assembling: Optional[int] = None
+        # pixel bytes received of the frame being assembled, and the offsets
+        # of its packets, so a duplicated packet is only counted once
+        self.filled = 0
+        self.offsets: Set[int] = set()
+        self.sequence = 0
+        self.pushed = 0
+
+        self.received = 0
+        self.presented = 0
+        self.incomplete = 0
+        self.late = 0
+        self.skipped = 0
+        self.overruns = 0
+        self.unsynced = 0
+        # how late frames are shown after their time
+        self.lateness = Histogram()
+
+        self.alive = False
+        self.threads: List[threading.Thread] = []
+        log.info('Listening for DDP frames of %d LEDs on %s:%d', self.count, host, port)
+
+
+    def receive(self) -> None:
+        """
+        Assemble packets into frames and queue the complete ones, until
+        stopped
+        """
+        packet = bytearray(ddp.HEADER.size + ddp.MAX_DATA)
+        view = memoryview(packet)
+        size = self.frame.nbytes
+        while self.alive:
+            try:
+                n = self.sock.recv_into(packet)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            try:
+                sequence, offset, length, header, code, push = ddp.unpack_header(view[:n])
+            except ValueError:
+                continue
+
+            if self.assembling is None or (sequence and sequence != self.sequence):
+                # a packet of the frame just queued arriving late
+                if self.assembling is None and sequence and sequence == self.pushed:
+                    continue
+                if self.assembling is not None:
+                    self.incomplete += 1
+                    with self.ready:
+                        self.free.append(self.assembling)
+                self.assembling = self.take()
+                self.filled = 0
+                self.offsets.clear()
+                self.sequence = sequence
+
+            length = max(0, min(length, n - header, size - offset))
+            frame = memoryview(self.buffers[self.assembling]).cast('B')
+            frame[offset:offset + length] = view[header:header + length]
+            if offset not in self.offsets:
+                self.offsets.add(offset)
+                self.filled += length
+
+            if push:
+                if self.filled < size:
+                    # a packet was lost, the rest of the buffer is stale
+                    self.incomplete += 1
+                    with self.ready:
+                        self.free.append(self.assembling)
+                    self.assembling = None
+                    self.pushed = self.sequence
+                else:
+                    self.queue_frame(code)
+
+
+    def take(self) -> int:
+        """
+        Returns
+        ------
+        index of a free frame buffer, dropping the oldest queued frame if
+        there is none
+        """
+        with self.ready:
+            if not self.free:
+                _, _, index = heapq.heappop(self.queue)
+                self.overruns += 1
+                return index
+            return self.free.pop()
+
+
+    def queue_frame(self, code: Optional[int]) -> None:
+        """
+        Queue the frame assembled to be shown at timecode `code`, or straight
+        away if it has none
+        """
+        now = time.time()
+        at = now if code is None else ddp.from_timecode(code, now)
+        if at - now > self.max_ahead:
+            if not self.unsynced:
+                log.warning('Frames stamped %.1fs ahead, are the clocks in sync?', at - now)
+            self.unsynced += 1
+            at = now
+
+        with self.ready:
+            heapq.heappush(self.queue, (at, self.received, self.assembling))
+            self.ready.notify()
+        self.received += 1
+        self.pushed = self.sequence
+        self.assembling = None
+
+
+    def present(self) -> None:
+        """
+        Show each queued frame at its time, until stopped. When several are
+        due, e.g. after a stall, only the newest is shown
+        """
+        shown = None
+        last = 0.0
+        while self.alive:
+            with self.ready:
+                if shown is not None:
+                    self.free.append(shown)
+                    shown = None
+                if not self.queue:
+                    self.ready.wait(0.5)
+                    continue
+                wait = self.queue[0][0] - time.time()
+                if wait > 0:
+                    self.ready.wait(wait)
+                    continue
+
+                at, _, shown = heapq.heappop(self.queue)
+                now = time.time()
+                while self.queue and self.queue[0][0] <= now:
+                    self.free.append(shown)
+                    self.skipped += 1
+                    at, _, shown = heapq.heappop(self.queue)
+
+            # frames arriving after a newer one was shown are dropped
+            if at < last:
+                self.late += 1
+                continue
+            last = at
+            np.copyto(self.frame, self.buffers[shown])
+            self.commit_pixels()
+            self.presented += 1
+            self.lateness.observe(max(0, int((time.time() - at) * 1e9)))
+
+
+    def listen(self) -> None:
+        """
+        Start receiving and presenting frames
+        """
+        self.alive = True
+        self.threads = [ threading.Thread(target = self.receive, daemon = True),
+                threading.Thread(target = self.present, daemon = True) ]
+        for thread in self.threads:
+            thread.start()
+
+
+    def close(self) -> None:
+        """
+        Stop the threads and close the socket
+        """
+        self.alive = False
+        with self.ready:
+            self.ready.notify()
+        for thread in self.threads:
+            thread.join(timeout = 1)
+        self.sock.close()
+
+
+    def stats(self) -> Dict:
+        """
+        Returns
+        ------
+        dict with the frames received and presented, those incomplete,
+        late, skipped as a newer one was due, or dropped as the jitter
+        buffer was full, and how late frames were shown
+        """
+        return {
+            'received':   self.received,
+            'presented':  self.presented,
+            'incomplete': self.incomplete,
+            'late':       self.late,
+            'skipped':    self.skipped,
+            'overruns':   self.overruns,
+            'unsynced':   self.unsynced,
+            'lateness':   self.lateness.summary(),
+        }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Show frames streamed by an operator node')
+    parser.add_argument('--count', type = int, required = True, help = 'LEDs in the strip')
+    parser.add_argument('--leds', default = '', choices = [ '' ] + list(DRIVERS),
+        help = 'strip to show frames on, nothing to only measure reception')
+    parser.add_argument('--port', type = int, default = ddp.DDP_PORT)
+    parser.add_argument('--depth', type = int, default = 8, help = 'frames in the jitter buffer')
+    parser.add_argument('--seconds', type = float, default = None)
+    parser.add_argument('--device', default = '/dev/spidev0.0')
+    parser.add_argument('--speed', type = int, default = 0, help = 'SPI clock in Hz')
+    parser.add_argument('--order', default = '', help = 'channel order of the strip')
+    args = parser.parse_args()
+
+    if args.leds:
+        from lux.tools.schema import SPIConfig
+        spi = SPIConfig(device = args.device, speed_hz = args.speed, order = args.order)
+        output = open_driver(args.leds, args.count, spi)
+    else:
+        output = Segment((0, args.count), False)
+
+    segment = ReceiverSegment(output, args.port, depth = args.depth)
+    segment.listen()
+    try:
+        if args.seconds:
+            time.sleep(args.seconds)
+        else:
+            threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    segment.close()
+
+    stats = segment.stats()
+    print(f"frames           {stats['presented']} of {stats['received']} received")
+    print(f"incomplete       {stats['incomplete']}")
+    print(f"late / skipped   {stats['late']} / {stats['skipped']}")
+    print(f"overruns         {stats['overruns']}")
+    print(f"lateness p50     {1000 * stats['lateness']['p50']:.2f} ms")
+    print(f"lateness p99     {1000 * stats['lateness']['p99']:.2f} ms")
@@ -0,0 +1,141 @@
+#!/usr/bin/python3
+
+import logging
+import time
+from types import SimpleNamespace
+from typing import Callable, Optional
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.leds import effects
+from lux.leds.segment import Segment
+from lux.tools.logger import FrameLog
+from lux.tools.metrics import registry
+from lux.tools.scheduler import FrameScheduler
+
+log = logging.getLogger(__name__)
+
+
+class Renderer():
+    """
+    Drive one effect onto one segment at a fixed frame rate, by evaluating the
+    effect at the current time and committing the frame it returns
+    """
+
+    def __init__(self,
+            segment: Segment,
+            effect: effects.Effect,
+            state: Optional[SimpleNamespace] = None,
+            fps: float = 30.0
+        ) -> None:
+        """
+        Params
+        ------
+        segment
+            segment the frames are committed to
+        effect
+            function `(t, state) -> (N, 3) frame`, see `lux.leds.effects`
+        state
+            effect state, a fresh one from `effects.make_state` if not given
+        fps
+            target frames per second
+        """
+        self.segment = segment
+        self.effect = effect
+        self.state = state if state is not None else effects.make_state(segment.count)
+        self.scheduler = FrameScheduler(fps)
+        self.frames = 0
+        # time the effect started at, effects are rendered from their start
+        self.started = 0.0
+
+        # effect switched away from, blended out over `transition` seconds
+        self.previous: Optional[SimpleNamespace] = None
+        self.transition = 0.0
+        self.scratch = np.zeros((segment.count, 3), dtype = np.float32)
+        self.blended = np.zeros((segment.count, 3), dtype = np.uint8)
+        self.framelog = FrameLog(log, effect.__name__)
+        self.effect_time = registry.histogram('lux_effect_seconds',
+                'Time to render one frame of an effect', effect = effect.__name__)
+        self.commit_time = registry.histogram('lux_commit_seconds',
+                'Time to commit a frame to the LEDs')
+
+
+    def render(self, t: float, commit: bool = True) -> None:
+        """
+        Render the frame at time `t`, `t - started` seconds into the effect,
+        and, unless `commit` is False, commit it
+        """
+        begin = time.monotonic_ns()
+        frame = self.effect(t - self.started, self.state)
+        if self.previous is not None:
+            alpha = (t - self.started) / self.transition
+            if alpha >= 1.0:
+                self.previous = None
+            else:
+                p = self.previous
+                frame = effects.crossfade(p.effect(t - p.started, p.state), frame,
+                        max(alpha, 0.0), self.scratch, self.blended)
+        self.segment.set_frame(frame)
+        rendered = time.monotonic_ns()
+        self.effect_time.observe(rendered - begin)
+        if commit:
+            self.segment.commit_pixels()
+            committed = time.monotonic_ns()
+            self.commit_time.observe(committed - rendered)
+            self.framelog.add(begin, rendered, committed)
+        self.frames += 1
+
+
+    def switch(self,
+            effect: effects.Effect,
+            state: SimpleNamespace,
+            t: float,
+            transition: float = 0.0
+        ) -> None:
+        """
+        Render `effect` from `state` instead, starting from its beginning at
+        time `t`
+
+        Params
+        ------
+        transition
+            seconds over which the current effect keeps rendering and is
+            crossfaded into the new one, 0 to switch at once. Switching during
+            a transition fades from the effect being faded in
+        """
+        if transition > 0:
+            self.previous = SimpleNamespace(effect = self.effect, state = self.state,
+                    started = self.started)
+            self.transition = transition
+        else:
+            self.previous = None
+        self.effect = effect
+        self.state = state
+        self.started = t
+        self.framelog.name = effect.__name__
+        self.effect_time = registry.histogram('lux_effect_seconds',
+                'Time to render one frame of an effect', effect = effect.__name__)
+
+
+    def run(self,
+            running: Optional[Callable[[], bool]] = None,
+            duration: Optional[float] = None
+        ) -> None:
+        """
+        Render frames at the scheduler's frame rate, blocking
+
+        Params
+        ------
+        running
+            rendering stops as soon as this returns False
+        duration
+            if given, seconds of effect to render
+        """
+        for t in self.scheduler.ticks(running, duration):
+            self.render(t)
+
+        log.info('Rendered %d frames of %s, dropped %d',
+                self.frames, self.effect.__name__, self.scheduler.dropped)
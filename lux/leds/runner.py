@@ -0,0 +1,284 @@
+#!/usr/bin/python3
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Optional, Tuple
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.leds.compositor import Compositor
+from lux.tools.metrics import registry
+
+log = logging.getLogger(__name__)
+
+# a command is applied to the compositor on the render thread, between frames
+Command = Callable[[Compositor], None]
+
+
+class EffectRunner():
+    """
+    Own the render thread of a compositor, so that effects never run on the
+    threads serving web requests.
+
+    Callers post commands, such as switching the effect of a segment or
+    changing its parameters, onto a queue and return straight away. While
+    playing, the render thread applies every queued command before each
+    frame, so a switch is shown within one frame period and an effect is
+    preempted between two of its frames. While paused, it waits on the queue
+    and after each command renders frames for `settle` seconds, so the strip
+    still shows the change once transitions and smoothing have caught up.
+
+    Under an asyncio server, `arun` keeps the same loop on the event loop
+    instead, handing each frame to a single worker thread.
+    """
+
+    def __init__(self,
+            compositor: Compositor,
+            sample: Optional[Callable[[], None]] = None,
+            settle: float = 1.0
+        ) -> None:
+        """
+        Params
+        ------
+        compositor
+            renders and commits the whole strip
+        sample
+            called before every frame while playing, to read the inputs of
+            the effects, such as camera frames
+        settle
+            seconds frames are rendered for after a command while paused
+        """
+        self.compositor = compositor
+        self.scheduler = compositor.scheduler
+        self.sample = sample
+        self.settle = settle
+        self.commands: queue.SimpleQueue = queue.SimpleQueue()
+
+        # time of the last frame rendered, effects switched to start from it
+        self.t = 0.0
+        self.playing = False
+        self.alive = False
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        # set when rendering on an event loop, woken by posted commands
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wake: Optional[asyncio.Event] = None
+        self.frame_time = registry.histogram('lux_frame_seconds',
+                'Time to sample inputs, render and commit one frame')
+
+
+    def post(self, command: Command) -> None:
+        """
+        Queue `command` to be applied on the render thread before the next
+        frame
+        """
+        self.commands.put(command)
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wake.set)
+
+
+    def switch(self,
+            index: int,
+            name: str,
+            col: Tuple[int, int, int],
+            transition: float = 0.0,
+            **sources
+        ) -> None:
+        """
+        Switch segment `index` to the effect `name`, starting from its
+        beginning. The state is built here, so the render thread only swaps
+        it in
+
+        Params
+        ------
+        col
+            colour of the effect, and of solid if `name` is not available
+        transition
+            seconds to crossfade from the current effect, 0 to cut
+        sources
+            inputs of the effects, see `Compositor.add_from_config`
+        """
+        renderer = self.compositor.renderers[index]
+        effect, state = self.compositor.make(name, renderer.segment.count, col, **sources)
+        self.post(lambda c: c.renderers[index].switch(effect, state, self.t, transition))
+
+
+    def update(self, index: int, **params) -> None:
+        """
+        Change parameters of the state of segment `index`, e.g. `col`
+        """
+        def command(c: Compositor) -> None:
+            for k, v in params.items():
+                setattr(c.renderers[index].state, k, v)
+        self.post(command)
+
+
+    def apply(self) -> int:
+        """
+        Apply every queued command
+
+        Returns
+        ------
+        the number of commands applied
+        """
+        applied = 0
+        while True:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return applied
+            command(self.compositor)
+            applied += 1
+
+
+    def frames(self,
+            running: Callable[[], bool],
+            duration: Optional[float] = None,
+            sample: bool = True
+        ) -> None:
+        """
+        Render frames on the scheduler, applying queued commands before each,
+        with the effect time carrying on from the last frame
+
+        Params
+        ------
+        running
+            rendering stops as soon as this returns False
+        duration
+            if given, seconds of frames to render
+        sample
+            whether to sample the inputs before each frame
+        """
+        offset = self.t
+        for t in self.scheduler.ticks(running, duration):
+            self.t = offset + t
+            self.frame(sample)
+
+
+    def frame(self, sample: bool = True) -> None:
+        """
+        Apply queued commands, sample the inputs if `sample`, and render and
+        commit the frame at the current effect time
+        """
+        begin = time.monotonic_ns()
+        self.apply()
+        if sample and self.sample is not None:
+            self.sample()
+        self.compositor.render(self.t)
+        self.frame_time.observe(time.monotonic_ns() - begin)
+
+
+    async def aframes(self,
+            executor: ThreadPoolExecutor,
+            running: Callable[[], bool],
+            duration: Optional[float] = None,
+            sample: bool = True
+        ) -> None:
+        """
+        Like `frames`, keeping the frame deadlines on the event loop and
+        rendering each frame on `executor`
+        """
+        loop = asyncio.get_running_loop()
+        offset = self.t
+        async for t in self.scheduler.aticks(running, duration):
+            self.t = offset + t
+            await loop.run_in_executor(executor, self.frame, sample)
+
+
+    def run(self) -> None:
+        """
+        Render frames while playing, and frames on demand while paused, until
+        stopped
+        """
+        paused = lambda: self.alive and not self.playing
+        while self.alive:
+            if self.playing:
+                self.frames(lambda: self.playing and self.alive)
+                # finish any transition the pause interrupted
+                self.frames(paused, self.settle, sample = False)
+                continue
+
+            try:
+                command = self.commands.get(timeout = 0.5)
+            except queue.Empty:
+                continue
+            command(self.compositor)
+            self.frames(paused, self.settle, sample = False)
+
+
+    async def arun(self) -> None:
+        """
+        Render as `run` does, on the running event loop rather than a thread
+        of its own, until stopped. Frames are rendered on one worker thread,
+        so the compositor is still only touched by one thread and the event
+        loop stays free for clients. While paused, the loop sleeps until a
+        command is posted
+        """
+        # replace the render thread, if started
+        self.stop()
+        self.loop = asyncio.get_running_loop()
+        self.wake = asyncio.Event()
+        # the render loop runs on the event loop's thread, which `start`
+        # and the thread gauge see as the render thread
+        self.thread = threading.current_thread()
+        self.alive = True
+
+        executor = ThreadPoolExecutor(1, 'render')
+        paused = lambda: self.alive and not self.playing
+        try:
+            while self.alive:
+                if self.playing:
+                    await self.aframes(executor, lambda: self.playing and self.alive)
+                    await self.aframes(executor, paused, self.settle, sample = False)
+                    continue
+
+                self.wake.clear()
+                if self.commands.empty():
+                    await self.wake.wait()
+                    continue
+                await self.aframes(executor, paused, self.settle, sample = False)
+        finally:
+            executor.shutdown(wait = False)
+            self.loop = None
+
+
+    def start(self) -> None:
+        """
+        Start the render thread paused, unless it is already running
+        """
+        if not self.thread.is_alive():
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.alive = True
+            self.thread.start()
+
+
+    def play(self) -> None:
+        """
+        Render frames at the scheduler's frame rate
+        """
+        self.playing = True
+        # wake the render thread if it waits for a command
+        self.post(lambda c: None)
+
+
+    def pause(self) -> None:
+        """
+        Stop rendering after the current frame, still applying commands
+        """
+        self.playing = False
+
+
+    def stop(self) -> None:
+        """
+        Stop the render thread
+        """
+        self.playing = False
+        self.alive = False
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wake.set)
+        elif self.thread.is_alive() and self.thread is not threading.current_thread():
+            self.thread.join(timeout = 1)
@@ -5,11 +5,15 @@ import importlib
 import logging
 import random
 import time
-from typing import Any, Callable, List, Tuple
+from typing import Any, Callable, List, Optional, Tuple
+
+import numpy as np
 
 # initialise logging to file
 import lux.tools.logger
 
+log = logging.getLogger(__name__)
+
 """
 Abstract class implementing the main behaviour of a segment of the LED strip
 """
@@ -17,6 +21,7 @@ class Segment(ABC):
     def __init__(self,
             segment: Tuple[int, int],
             reverse: bool,
+            parent: Optional['Segment'] = None,
             #effect: Callable[[Any], None]
         ) -> None:
         """
@@ -30,39 +35,98 @@ class Segment(ABC):
             segment
         reverse
             True if the effect should be applied in reverse order
+        parent
+            segment driving the physical strip this segment is part of; if
+            given, the frame buffer is a view of the parent's buffer and
+            commits go through the parent, so several segments can be
+            composed into one strip and written out together
         effect
             function that takes a range of LEDs and applies an effect to them
         """
+        self.start, self.stop = segment
+        self.reverse = reverse
         self.RANGE = list(range(*segment))
         if reverse:
-            self.RANGE = reverse(self.RANGE)
+            self.RANGE = self.RANGE[::-1]
         #self.effect = effect
         self.count = len(self.RANGE)
+        self.parent = parent
+
+        # (N, 3) uint8 RGB frame buffer in physical order, so row j holds the
+        # colour of LED `start + j` regardless of `reverse`
+        if parent is None:
+            self.frame = np.zeros((self.count, 3), dtype = np.uint8)
+        else:
+            if self.start < parent.start or self.stop > parent.stop:
+                raise ValueError(f'Segment {segment} outside of parent '
+                        f'{(parent.start, parent.stop)}')
+            self.frame = parent.frame[self.start - parent.start:self.stop - parent.start]
 
-        logging.info(f"Initialisation complete for segment {segment} {'(reversed)' if reverse else ''}")
-        #logging.info(f"with effect {effect.func_name}")
+        log.info('Initialisation complete for segment %s %s', segment, '(reversed)' if reverse else '')
 
 
     def set_pixel(self, i: int, col: Tuple[int, int, int]) -> None:
         """
-        Set pixel i to colour col
+        Set pixel i to colour col, where i is an index in RANGE
+        """
+        self.frame[i - self.start] = col
+
+
+    def get_pixel(self, i: int) -> Tuple[int, int, int]:
+        """
+        Get the colour of pixel i, where i is an index in RANGE
+        """
+        r, g, b = self.frame[i - self.start]
+        return (int(r), int(g), int(b))
+
+
+    def set_frame(self, frame: np.ndarray) -> None:
+        """
+        Set the colour of every pixel in the segment at once
+
+        Params
+        ------
+        frame
+            (N, 3) array of RGB values 0-255 in effect order, i.e. row k is
+            the colour of pixel RANGE[k]; reversed segments are flipped here
+        """
+        if self.reverse:
+            frame = frame[::-1]
+        np.copyto(self.frame, frame, casting = 'unsafe')
+
+
+    def get_frame(self) -> np.ndarray:
+        """
+        Returns
+        ------
+        (N, 3) view of the frame buffer in effect order, the inverse of
+        set_frame
+        """
+        return self.frame[::-1] if self.reverse else self.frame
+
+
+    def fill(self, col: Tuple[int, int, int]) -> None:
+        """
+        Set all pixels in the segment to colour col
         """
-        logging.info(f"Setting pixel {i} to colour {col}")
+        self.frame[:] = col
 
 
     def commit_pixels(self) -> None:
         """
-        Set pixel i to colour col
+        Commit pixels that have been set since the last commit
         """
-        logging.info(f"Committing range")
+        if self.parent is not None:
+            self.parent.commit_pixels()
+            return
+        log.debug('Committing range %d-%d', self.start, self.stop)
 
 
     def all_off(self) -> None:
         """
         Turn off all LEDs in the segment
         """
-        (self.set_pixel(i, [0, 0, 0]) for i in self.segment)
+        self.fill((0, 0, 0))
         self.commit_pixels()
 
-        logging.info('All off')
-
+        log.info('All off')
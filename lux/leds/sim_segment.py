@@ -0,0 +1,155 @@
+#!/usr/bin/python3
+
+import argparse
+import logging
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract segment class
+from lux.leds.segment import Segment
+from lux.leds.pattern import PatternWriter
+
+log = logging.getLogger(__name__)
+
+"""
+Class implementing a virtual LED strip, for developing and benchmarking
+effects without a RaspberryPi. Committed frames can be previewed as images,
+for example on the /video_feed MJPEG stream, and recorded to a pattern file
+"""
+class SimSegment(Segment):
+    def __init__(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            preview: Optional[Callable[[np.ndarray], None]] = None,
+            record: Optional[str] = None,
+            fps: float = 30.0,
+            led_size: int = 8,
+        ) -> None:
+        """
+        Params
+        ------
+        segment
+            smallest and largest index of LEDs (largest not included) in the
+            segment
+        reverse
+            True if the effect should be applied in reverse order
+        preview
+            called with a BGR image of the strip on every commit
+        record
+            if given, path of a pattern file every committed frame is
+            appended to
+        fps
+            frame rate written to the pattern file header
+        led_size
+            width and height in pixels of one LED in the preview image
+        """
+        super().__init__(segment, reverse)
+
+        self.preview = preview
+        self.led_size = led_size
+        # preview images are handed over by reference, so rotate through a
+        # few so that one being encoded is not overwritten straight away
+        self.images = [ np.zeros((led_size, self.count * led_size, 3), dtype = np.uint8)
+                for _ in range(3) ]
+
+        self.writer = PatternWriter(record, self.count, fps) if record else None
+
+        self.commits = 0
+        self.first_commit = None
+        self.last_commit = None
+        # bytes a WS2801 strip up to the last LED of the segment would be sent
+        self.payload_size = self.stop * 3
+        log.info('Initialisation of simulated LEDs complete')
+
+
+    def commit_pixels(self) -> None:
+        """
+        Record the frame, and render it for the preview
+        """
+        now = time.perf_counter()
+        if self.first_commit is None:
+            self.first_commit = now
+        self.last_commit = now
+        self.commits += 1
+
+        if self.writer is not None:
+            self.writer.write(self.frame)
+
+        if self.preview is not None:
+            image = self.images[self.commits % len(self.images)]
+            # broadcast each LED over its square of the image, RGB to BGR
+            image.reshape(self.led_size, self.count, self.led_size, 3)[:] = \
+                    self.frame[None, :, None, ::-1]
+            self.preview(image)
+
+        super().commit_pixels()
+
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns
+        ------
+        dict with the number of commits, achieved commit rate, SPI payload
+        size per frame and the SPI throughput that rate would need
+        """
+        elapsed = (self.last_commit - self.first_commit) if self.commits > 1 else 0
+        fps = (self.commits - 1) / elapsed if elapsed else 0.0
+        return {
+            'commits':       self.commits,
+            'fps':           fps,
+            'payload_bytes': self.payload_size,
+            'bytes_per_sec': fps * self.payload_size,
+        }
+
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+
+if __name__ == '__main__':
+    from lux.leds import effects
+    from lux.leds.renderer import Renderer
+
+    parser = argparse.ArgumentParser(
+        description = 'Render an effect headless on a simulated strip and report throughput')
+    parser.add_argument('--effect', default = 'rainbow', choices = list(effects.EFFECTS))
+    parser.add_argument('--leds', type = int, default = 300)
+    parser.add_argument('--fps', type = float, default = 0,
+        help = 'target frame rate, 0 to render as fast as possible')
+    parser.add_argument('--seconds', type = float, default = 5)
+    parser.add_argument('--record', default = None, help = 'pattern file to record to')
+    args = parser.parse_args()
+
+    segment = SimSegment((0, args.leds), False, record = args.record, fps = args.fps or 30)
+    renderer = Renderer(segment, effects.EFFECTS[args.effect],
+            effects.make_state(args.leds, col = (255, 128, 0)), args.fps or 30)
+
+    begin = time.perf_counter()
+    render_time = 0.0
+    if args.fps:
+        renderer.run(duration = args.seconds)
+    else:
+        while time.perf_counter() - begin < args.seconds:
+            t = time.perf_counter()
+            renderer.render(t - begin)
+            render_time += time.perf_counter() - t
+    segment.close()
+
+    stats = segment.stats()
+    print(f"effect           {args.effect} on {args.leds} LEDs")
+    print(f"frames           {stats['commits']}")
+    print(f"achieved fps     {stats['fps']:.1f}")
+    if render_time:
+        print(f"frame time       {1e6 * render_time / stats['commits']:.1f} us")
+    print(f"SPI payload      {stats['payload_bytes']} bytes/frame")
+    print(f"SPI throughput   {stats['bytes_per_sec'] / 1e6:.3f} MB/s")
+    if args.fps:
+        print(f"dropped frames   {renderer.scheduler.dropped}")
+    if args.record:
+        print(f"recorded to      {args.record}")
@@ -0,0 +1,224 @@
+#!/usr/bin/python3
+
+import argparse
+import fcntl
+import logging
+import os
+import stat
+import struct
+import time
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+log = logging.getLogger(__name__)
+
+"""
+Native output to a Linux spidev device, without the Adafruit libraries.
+
+A frame is written with plain write(2) calls on /dev/spidevB.C, each at most
+the spidev `bufsiz` bytes the kernel accepts per transfer, so a long strip
+goes out in a few chunks with no per-pixel Python work. Any other path, such
+as a regular file or a FIFO, is written the same way without the ioctls, so
+the output can be captured and checked without hardware.
+"""
+
+# spidev ioctls, _IOW('k', nr, size)
+SPI_IOC_WR_MODE          = 0x40016b01
+SPI_IOC_WR_BITS_PER_WORD = 0x40016b03
+SPI_IOC_WR_MAX_SPEED_HZ  = 0x40046b04
+
+# largest transfer the spidev module accepts, unless configured otherwise
+BUFSIZ_PATH = '/sys/module/spidev/parameters/bufsiz'
+DEFAULT_BUFSIZ = 4096
+
+Buffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+
+def spidev_bufsiz(path: str = BUFSIZ_PATH) -> int:
+    """
+    Returns
+    ------
+    the largest single transfer the spidev kernel module accepts
+    """
+    try:
+        with open(path) as fh:
+            return int(fh.read())
+    except (OSError, ValueError):
+        return DEFAULT_BUFSIZ
+
+
+class SPIDevice():
+    """
+    Write buffers to a spidev device in chunks of at most `bufsiz` bytes, and
+    measure the throughput achieved
+    """
+
+    def __init__(self,
+            path: str = '/dev/spidev0.0',
+            speed_hz: int = 1000000,
+            mode: int = 0,
+            bufsiz: Optional[int] = None
+        ) -> None:
+        """
+        Params
+        ------
+        path
+            spidev device, or any existing writable file to capture the
+            output
+        speed_hz
+            SPI clock
+        mode
+            SPI mode, 0-3
+        bufsiz
+            largest write, read from the spidev module if not given
+        """
+        self.path = path
+        self.speed_hz = speed_hz
+        self.bufsiz = bufsiz or spidev_bufsiz()
+
+        self.fd = os.open(path, os.O_WRONLY)
+        self.device = stat.S_ISCHR(os.fstat(self.fd).st_mode)
+        if self.device:
+            fcntl.ioctl(self.fd, SPI_IOC_WR_MODE, struct.pack('B', mode))
+            fcntl.ioctl(self.fd, SPI_IOC_WR_BITS_PER_WORD, struct.pack('B', 8))
+            fcntl.ioctl(self.fd, SPI_IOC_WR_MAX_SPEED_HZ, struct.pack('I', speed_hz))
+
+        self.bytes = 0
+        self.writes = 0
+        self.frames = 0
+        self.write_time = 0.0
+        log.info('Opened SPI %s at %d Hz, %d byte transfers', path, speed_hz, self.bufsiz)
+
+
+    def write(self, data: Buffer) -> None:
+        """
+        Write one frame, in as few transfers as spidev allows. The buffer is
+        sliced, not copied
+        """
+        view = memoryview(data).cast('B')
+        begin = time.perf_counter()
+        for offset in range(0, len(view), self.bufsiz):
+            chunk = view[offset:offset + self.bufsiz]
+            while len(chunk):
+                chunk = chunk[os.write(self.fd, chunk):]
+            self.writes += 1
+        self.write_time += time.perf_counter() - begin
+        self.bytes += len(view)
+        self.frames += 1
+
+
+    def bytes_per_sec(self) -> float:
+        """
+        Returns
+        ------
+        bytes per second achieved while writing, or the SPI clock rate
+        before anything was written
+        """
+        if self.write_time > 0:
+            return self.bytes / self.write_time
+        return self.speed_hz / 8
+
+
+    def max_fps(self, frame_bytes: int, latch: float = 0.0) -> float:
+        """
+        Returns
+        ------
+        the highest frame rate the achieved throughput sustains for frames
+        of `frame_bytes` bytes, for strips which need the clock held low for
+        `latch` seconds between frames. Writes to a file are not bound by
+        the clock, so the throughput is capped at the clock rate
+        """
+        bytes_per_sec = min(self.bytes_per_sec(), self.speed_hz / 8)
+        return 1.0 / (frame_bytes / bytes_per_sec + latch)
+
+
+    def stats(self, frame_bytes: int, latch: float = 0.0) -> Dict[str, float]:
+        """
+        Returns
+        ------
+        dict with the frames, bytes and transfers written, the throughput
+        the clock allows and that achieved, and the max fps for frames of
+        `frame_bytes`, see `max_fps`
+        """
+        return {
+            'frames':              self.frames,
+            'bytes':               self.bytes,
+            'writes':              self.writes,
+            'clock_bytes_per_sec': self.speed_hz / 8,
+            'bytes_per_sec':       self.bytes_per_sec(),
+            'max_fps':             self.max_fps(frame_bytes, latch),
+        }
+
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class CaptureSPI(SPIDevice):
+    """
+    Stand-in for an SPI device that keeps the bytes of every frame written,
+    to check the wire format of a driver without hardware
+    """
+
+    def __init__(self, speed_hz: int = 1000000, bufsiz: int = DEFAULT_BUFSIZ, keep: bool = True) -> None:
+        """
+        Params
+        ------
+        keep
+            if False, frames are counted but not kept, e.g. to benchmark
+        """
+        self.path = None
+        self.speed_hz = speed_hz
+        self.bufsiz = bufsiz
+        self.device = False
+        self.keep = keep
+        self.captured: List[bytes] = []
+
+        self.bytes = 0
+        self.writes = 0
+        self.frames = 0
+        self.write_time = 0.0
+
+
+    def write(self, data: Buffer) -> None:
+        view = memoryview(data).cast('B')
+        if self.keep:
+            self.captured.append(bytes(view))
+        self.writes += -(-len(view) // self.bufsiz)
+        self.bytes += len(view)
+        self.frames += 1
+
+
+    def close(self) -> None:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description = 'Measure SPI throughput and the max fps of a strip')
+    parser.add_argument('--device', default = '/dev/spidev0.0',
+        help = 'spidev device, or a file to write to instead')
+    parser.add_argument('--speed', type = int, default = 1000000, help = 'SPI clock in Hz')
+    parser.add_argument('--leds', type = int, default = 300)
+    parser.add_argument('--seconds', type = float, default = 3)
+    args = parser.parse_args()
+
+    # WS2801 latch a frame once the clock is low for 500 us
+    latch = 0.0005
+    spi = SPIDevice(args.device, args.speed)
+    frame = np.zeros((args.leds, 3), dtype = np.uint8)
+    end = time.perf_counter() + args.seconds
+    while time.perf_counter() < end:
+        spi.write(frame)
+    spi.close()
+
+    stats = spi.stats(frame.nbytes, latch)
+    print(f"frames           {stats['frames']} of {args.leds} LEDs")
+    print(f"transfers        {stats['writes']} of up to {spi.bufsiz} bytes")
+    print(f"clock allows     {stats['clock_bytes_per_sec'] / 1e6:.3f} MB/s")
+    print(f"achieved         {stats['bytes_per_sec'] / 1e6:.3f} MB/s")
+    print(f"max fps          {stats['max_fps']:.1f}")
@@ -0,0 +1,175 @@
+#!/usr/bin/python3
+
+from abc import abstractmethod
+import logging
+import time
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract segment class
+from lux.leds.segment import Segment
+from lux.leds.spi import Buffer, SPIDevice
+
+log = logging.getLogger(__name__)
+
+"""
+Abstract class implementing the behaviour shared by LED strips driven over
+SPI. The segment holds the whole strip up to its last LED in one RGB frame
+buffer; on commit, each driver encodes it into its wire format with
+vectorised NumPy operations into a preallocated buffer, which goes out as a
+single payload.
+
+The last frame sent is kept, and commits of an unchanged frame are skipped
+until it is `keepalive` seconds old, so static scenes cost a comparison per
+frame rather than an encode and a bus transfer. Drivers whose strips keep
+the LEDs past the end of a shorter frame send only up to the last LED that
+changed
+"""
+class SPISegment(Segment):
+    # defaults of each driver
+    ORDER = 'RGB'
+    SPEED_HZ = 1000000
+    # seconds the strip needs between frames to latch them
+    LATCH = 0.0
+
+    def __init__(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            device: Union[str, SPIDevice] = '/dev/spidev0.0',
+            speed_hz: Optional[int] = None,
+            order: Optional[str] = None,
+            keepalive: float = 1.0,
+        ) -> None:
+        """
+        Params
+        ------
+        segment
+            smallest and largest index of LEDs (largest not included) in the
+            segment
+        reverse
+            True if the effect should be applied in reverse order
+        device
+            spidev device the strip is connected to, a file to write to
+            instead, or an open device such as a `CaptureSPI`
+        speed_hz
+            SPI clock, the driver's default if not given
+        order
+            order the strip expects the colour channels in, e.g. 'GRB', the
+            driver's default if not given
+        keepalive
+            seconds after which an unchanged frame is sent again, in case a
+            strip was reconnected or glitched, 0 to send every frame
+        """
+        super().__init__(segment, reverse)
+
+        # the strip has to be clocked out up to LED `stop - 1`, so keep one
+        # buffer for all of it and make the segment frame a view of our slice
+        self.strip = np.zeros((self.stop, 3), dtype = np.uint8)
+        self.frame = self.strip[self.start:self.stop]
+
+        order = (order or self.ORDER).upper()
+        self.order = np.array([ 'RGB'.index(c) for c in order ], dtype = np.intp)
+        self.identity = order == 'RGB'
+
+        if isinstance(device, SPIDevice):
+            self.spi = device
+        else:
+            self.spi = SPIDevice(device, speed_hz or self.SPEED_HZ)
+        self.wire = self.allocate(self.stop)
+
+        # the frame last sent, and which of its bytes the next one changes
+        self.keepalive = keepalive
+        self.last = np.zeros_like(self.strip)
+        self.changed = np.zeros(self.strip.shape, dtype = bool)
+        self.sent_at: Optional[float] = None
+        self.skipped = 0
+        self.partial = 0
+
+
+    @abstractmethod
+    def allocate(self, count: int) -> np.ndarray:
+        """
+        Returns
+        ------
+        the wire buffer for a strip of `count` LEDs, with any constant parts
+        of the wire format, such as start and end frames, already filled in
+        """
+
+
+    @abstractmethod
+    def encode(self, rgb: np.ndarray) -> Buffer:
+        """
+        Encode an (N, 3) RGB frame of the whole strip into its wire format
+
+        Returns
+        ------
+        the bytes to send, usually a view of the wire buffer
+        """
+
+
+    def prefix(self, count: int) -> Optional[Buffer]:
+        """
+        Encode the first `count` LEDs of the strip, for strips that keep the
+        colour of the LEDs a frame does not reach
+
+        Returns
+        ------
+        the bytes to send, or None if the driver only sends whole frames
+        """
+        return None
+
+
+    def write(self, data: Buffer) -> None:
+        """
+        Encode and send a whole strip of RGB bytes, such as a frame of a
+        pattern
+        """
+        rgb = np.frombuffer(data, dtype = np.uint8).reshape(-1, 3)
+        self.spi.write(self.encode(rgb))
+
+
+    def commit_pixels(self) -> None:
+        """
+        Commit pixels that have been set since the last commit, causing the
+        LEDs to actually change colour. Nothing is sent if no pixel changed
+        since the last frame sent, unless it is older than `keepalive`
+        """
+        now = time.monotonic()
+        stale = self.sent_at is None or not self.keepalive or \
+                now - self.sent_at >= self.keepalive
+
+        data = None
+        if not stale:
+            changed = self.changed.reshape(-1)
+            np.not_equal(self.strip, self.last, out = self.changed)
+            if not changed.any():
+                self.skipped += 1
+                return
+            # one past the last LED changed, searching from the end
+            count = (len(changed) - np.argmax(changed[::-1]) + 2) // 3
+            if count < self.stop:
+                data = self.prefix(count)
+                self.partial += data is not None
+
+        self.spi.write(self.encode(self.strip) if data is None else data)
+        np.copyto(self.last, self.strip)
+        self.sent_at = now
+        super().commit_pixels()
+
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns
+        ------
+        dict with the frames and bytes sent, the SPI throughput achieved and
+        the highest frame rate it sustains for this strip, and the commits
+        skipped as unchanged or sent only up to their last change
+        """
+        stats = self.spi.stats(self.wire.nbytes, self.LATCH)
+        stats['skipped'] = self.skipped
+        stats['partial'] = self.partial
+        return stats
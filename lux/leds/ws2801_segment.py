@@ -1,71 +1,62 @@
 #!/usr/bin/python3
 
-from abc import ABC
-import importlib
 import logging
-import random
-import time
-from typing import Any, Callable, List, Tuple
+from typing import Optional, Tuple, Union
 
-# hardware controllers
-import Adafruit_WS2801 as LED
-import Adafruit_GPIO.SPI as SPI
-import RPi.GPIO as GPIO
+import numpy as np
 
 # initialise logging to file
 import lux.tools.logger
 
+# import abstract SPI segment class
+from lux.leds.spi import Buffer, SPIDevice
+from lux.leds.spi_segment import SPISegment
+
+log = logging.getLogger(__name__)
+
+SPI_DEVICE   = '/dev/spidev0.0'
+SPI_CLOCK_HZ = 1000000
+
 """
 Class implementing the behaviour of a segment of the LED strip on an actual
-RaspberryPi using the WS2801 leds
+RaspberryPi using the WS2801 leds, written natively through spidev. WS2801
+are shift registers taking 3 bytes per LED, so the frame buffer goes out as
+it is, or with its channels reordered
 """
-class WS2801Segment(Segment):
+class WS2801Segment(SPISegment):
+    ORDER = 'RGB'
+    SPEED_HZ = SPI_CLOCK_HZ
+    # a frame latches once the clock is held low for 500 us
+    LATCH = 0.0005
+
     def __init__(self,
             segment: Tuple[int, int],
             reverse: bool,
-            effect: Callable[List[int]]
+            device: Union[str, SPIDevice] = SPI_DEVICE,
+            speed_hz: Optional[int] = None,
+            order: Optional[str] = None,
+            keepalive: float = 1.0,
         ) -> None:
         """
-        Initialise abstract class (also useful for mocking the segment on a dev
-        environment)
-
-        Params
-        ------
-        segment
-            smallest and largest index of LEDs (largest not included) in the
-            segment
-        reverse
-            True if the effect should be applied in reverse order
-        effect
-            function that takes a range of LEDs and applies an effect to them
-        """
-        super().__init__(segment, reverse, effect)
-
-        self.pixels = LED.WS2801Pixels(segment[1], spi=SPI.SpiDev(SPI_PORT, SPI_DEVICE), gpio=GPIO)
-        logging.info('Initialisation of WS2801 LEDs complete')
-
-
-    def set_pixel(self, i: int, col: Tuple[int, int, int]) -> None:
-        """
-        Set pixel i to colour col
+        Initialise the SPI device driving the strip, see `SPISegment`
         """
-        self.pixels.set_pixel(i, LED.RGB_to_color(col))
-        super().set_pixel()
+        super().__init__(segment, reverse, device, speed_hz, order, keepalive)
+        log.info('Initialisation of WS2801 LEDs complete')
 
 
-    def commit_pixels(self) -> None:
-        """
-        Commit pixels that have been set since the last commit, causing the
-        LEDs to actually change colour
-        """
-        self.pixels.show()
-        super().commit_pixels()
+    def allocate(self, count: int) -> np.ndarray:
+        # RGB strips are sent the frame buffer itself
+        return self.strip if self.identity else np.zeros((count, 3), dtype = np.uint8)
 
 
-    def all_off(self) -> None:
-        """
-        Turn off all LEDs in the segment
-        """
-        super().all_off()
+    def encode(self, rgb: np.ndarray) -> Buffer:
+        if self.identity:
+            return rgb
+        wire = self.wire[:len(rgb)]
+        np.take(rgb, self.order, axis = 1, out = wire, mode = 'clip')
+        return wire
 
 
+    def prefix(self, count: int) -> Buffer:
+        # LEDs past the end of a frame keep their colour once it latches
+        return self.encode(self.strip[:count])
@@ -0,0 +1,94 @@
+#!/usr/bin/python3
+
+import logging
+from typing import Optional, Tuple, Union
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+# import abstract SPI segment class
+from lux.leds.spi import Buffer, SPIDevice
+from lux.leds.spi_segment import SPISegment
+
+log = logging.getLogger(__name__)
+
+
+def bit_lut(bits: int) -> np.ndarray:
+    """
+    Table expanding each byte into the SPI bits that make up its WS2812
+    pulses, MSB first: with 3 bits a 0 is 100 and a 1 is 110, with 4 bits a
+    0 is 1000 and a 1 is 1110
+
+    Returns
+    ------
+    (256, bits) uint8 array, the `bits` bytes each byte is sent as
+    """
+    zero, one = { 3: (0b100, 0b110), 4: (0b1000, 0b1110) }[bits]
+    values = np.arange(256)
+    pulses = np.zeros(256, dtype = np.uint64)
+    for i in range(8):
+        bit = (values >> (7 - i)) & 1
+        pulses = (pulses << np.uint64(bits)) | np.where(bit, one, zero).astype(np.uint64)
+    # the 8 * bits pulse bits as big-endian bytes
+    shifts = np.arange(bits - 1, -1, -1, dtype = np.uint64) * np.uint64(8)
+    return ((pulses[:, None] >> shifts) & np.uint64(0xFF)).astype(np.uint8)
+
+
+"""
+Class implementing the behaviour of a segment of the LED strip using WS2812B
+(or WS2811, SK6812 RGB) leds, driven from SPI. These LEDs read a single wire
+with pulse widths encoding the bits, so each bit is sent as 3 or 4 SPI bits
+whose clock makes up the pulse timing: 2.4 MHz with 3 bits, 3.2 MHz with 4.
+Bytes are expanded through a lookup table in one vectorised take, and frames
+end with the line held low long enough to latch
+"""
+class WS2812Segment(SPISegment):
+    ORDER = 'GRB'
+    SPEED_HZ = 2400000
+    # the line has to be held low for 280 us between frames
+    RESET = 0.00028
+
+    def __init__(self,
+            segment: Tuple[int, int],
+            reverse: bool,
+            device: Union[str, SPIDevice] = '/dev/spidev0.0',
+            speed_hz: Optional[int] = None,
+            order: Optional[str] = None,
+            keepalive: float = 1.0,
+            bits: int = 3,
+        ) -> None:
+        """
+        Initialise the SPI device driving the strip, see `SPISegment`
+
+        Params
+        ------
+        bits
+            SPI bits per data bit, 3 or 4; the clock defaults to 800 kHz
+            times this
+        """
+        self.bits = bits
+        self.lut = bit_lut(bits)
+        super().__init__(segment, reverse, device, speed_hz or 800000 * bits, order,
+                keepalive)
+        log.info('Initialisation of WS2812 LEDs complete')
+
+
+    def allocate(self, count: int) -> np.ndarray:
+        # the reset is sent as zero bytes, since SPI has no idle time
+        reset = int(self.RESET * self.spi.speed_hz / 8) + 1
+        wire = np.zeros(count * 3 * self.bits + reset, dtype = np.uint8)
+        self.pulses = wire[:count * 3 * self.bits].reshape(count, 3, self.bits)
+        # colour bytes as indices into the table, in wire order
+        self.index = np.zeros((count, 3), dtype = np.intp)
+        return wire
+
+
+    def encode(self, rgb: np.ndarray) -> Buffer:
+        n = len(rgb)
+        index = self.index[:n]
+        for i, c in enumerate(self.order):
+            index[:, i] = rgb[:, c]
+        np.take(self.lut, index, axis = 0, out = self.pulses[:n], mode = 'clip')
+        return self.wire
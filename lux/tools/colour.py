@@ -1,8 +1,144 @@
-import cv2
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
 import numpy as np
 
-from typing import Dict, Tuple
+"""
+Colour conversions between hex strings, RGB and HSV in the ranges of OpenCV
+    H: 0-179
+    S: 0-255
+    V: 0-255
+
+The array functions convert whole (..., 3) uint8 arrays in one vectorised
+pass without importing OpenCV, and match cv2.cvtColor with COLOR_RGB2HSV
+and COLOR_HSV2RGB exactly, from tables precomputed with the arithmetic of
+OpenCV. The scalar functions are cached, as the same few colours are
+converted over and over by the web UI and config.
+"""
+
+HSV_SHIFT = 12
+
+# fixed point reciprocals used by OpenCV for 8-bit RGB to HSV, so results
+# match it bit for bit
+_i = np.arange(256, dtype = np.float64)
+with np.errstate(divide = 'ignore'):
+    SDIV_TABLE = np.where(_i > 0, np.round((255 << HSV_SHIFT) / _i), 0).astype(np.int64)
+    HDIV_TABLE = np.where(_i > 0, np.round((180 << HSV_SHIFT) / (6 * _i)), 0).astype(np.int64)
+
+
+def _hsv_factors() -> np.ndarray:
+    """
+    Factor of V each RGB channel is, per H and S, computed in float32 as
+    OpenCV does for 8-bit HSV to RGB, with the fused multiply-add its
+    vectorised path uses for `1 - s * f`, so that scaling V by the factor
+    rounds as OpenCV does
+
+    Returns
+    ------
+    (256, 256, 3) float32 array, indexed by H and S
+    """
+    one = np.float32(1)
+    h = np.arange(256, dtype = np.float32) * np.float32(6 / 180)
+    whole = np.trunc(h)
+    f = (h - whole)[:, None]
+    sector = (whole - 6 * np.trunc(whole / 6)).astype(np.intp)
+    s = (np.arange(256, dtype = np.float32) * np.float32(1 / 255)).astype(np.float64)[None, :]
+
+    def fma(a: np.ndarray, b: np.ndarray, c: np.float32) -> np.ndarray:
+        # float32 products are exact in float64, so this rounds once
+        return (a * b.astype(np.float64) + c).astype(np.float32)
+
+    # v, p, q and t as factors of v
+    factors = np.stack(np.broadcast_arrays(one, fma(-s, one, one), fma(-s, f, one),
+            fma(-s, one - f, one)), axis = -1).astype(np.float32)
+    channels = SECTOR_CHANNELS[sector][:, None, :].repeat(256, axis = 1)
+    return np.take_along_axis(factors, channels, axis = -1)
+
+
+# which of v, p, q, t each RGB channel takes in each sector
+SECTOR_CHANNELS = np.array([
+    [0, 3, 1],
+    [2, 0, 1],
+    [1, 0, 3],
+    [1, 2, 0],
+    [3, 1, 0],
+    [0, 1, 2],
+], dtype = np.intp)
+
+# the RGB factors of V for every H and S, so a conversion is one lookup and
+# two multiplications, and V scaled to 0-1 as OpenCV does
+HSV_FACTORS = _hsv_factors()
+V_SCALE = np.arange(256, dtype = np.float32) * np.float32(1 / 255)
+
+
+def rgb_to_hsv_array(rgb: np.ndarray) -> np.ndarray:
+    """
+    Convert RGB colours to HSV in OpenCV ranges
+
+    Params
+    ------
+    rgb
+        (..., 3) array of RGB values 0-255
+
+    Returns
+    ------
+    (..., 3) uint8 array of HSV values
+    """
+    rgb = np.asarray(rgb, dtype = np.int64)
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    v = rgb.max(axis = -1)
+    diff = v - rgb.min(axis = -1)
+
+    half = 1 << (HSV_SHIFT - 1)
+    s = (diff * SDIV_TABLE[v] + half) >> HSV_SHIFT
+    h = np.where(v == r, g - b, np.where(v == g, b - r + 2 * diff, r - g + 4 * diff))
+    h = (h * HDIV_TABLE[diff] + half) >> HSV_SHIFT
+    h += np.where(h < 0, 180, 0)
+
+    return np.stack([h, s, v], axis = -1).astype(np.uint8)
+
+
+def hsv_to_rgb_array(hsv: np.ndarray) -> np.ndarray:
+    """
+    Convert HSV colours in OpenCV ranges to RGB
+
+    Params
+    ------
+    hsv
+        (..., 3) array of HSV values
+
+    Returns
+    ------
+    (..., 3) uint8 array of RGB values 0-255
+    """
+    hsv = np.asarray(hsv)
+    h = hsv[..., 0].astype(np.uint8)
+    s = hsv[..., 1].astype(np.uint8)
+    v = V_SCALE[hsv[..., 2].astype(np.uint8)]
 
+    rgb = HSV_FACTORS[h, s]
+    rgb *= v[..., None]
+    rgb *= np.float32(255)
+    return np.rint(rgb, out = rgb).astype(np.uint8)
+
+
+def hex_to_rgb_array(cs: List[str]) -> np.ndarray:
+    """
+    Convert hex strings of the form #ffffff to an (N, 3) uint8 RGB array
+    """
+    data = bytes.fromhex(''.join(c[1:7] for c in cs))
+    return np.frombuffer(data, dtype = np.uint8).reshape(-1, 3).copy()
+
+
+def rgb_to_hex_array(rgb: np.ndarray) -> List[str]:
+    """
+    Convert an (N, 3) RGB array to hex strings of the form #ffffff
+    """
+    data = np.asarray(rgb, dtype = np.uint8).reshape(-1, 3).tobytes().hex()
+    return [ '#' + data[i:i + 6] for i in range(0, len(data), 6) ]
+
+
+@lru_cache(maxsize = 1024)
 def hex_to_rgb(c: str) -> Tuple[int, int, int]:
     """
     Convert from hex to RGB
@@ -16,10 +152,10 @@ def hex_to_rgb(c: str) -> Tuple[int, int, int]:
     ------
     Tuple with RGB values 0-255
     """
-    rgb = np.uint8([ int(c[i:j], base = 16) for i,j in [(1,3),(3,5),(5,7)] ])
-    return (rgb[0], rgb[1], rgb[2])
+    return (int(c[1:3], 16), int(c[3:5], 16), int(c[5:7], 16))
 
 
+@lru_cache(maxsize = 1024)
 def rgb_to_hex(rgb: Tuple[int, int, int]) -> str:
     """
     Convert from RGB tuple, to HTML compatible hex colour
@@ -33,9 +169,42 @@ def rgb_to_hex(rgb: Tuple[int, int, int]) -> str:
     ------
     7-digit hex string of the form #ffffff representing a RGB colour
     """
-    hexs = [ str(hex(i))[2:] for i in list(rgb) ]
-    hexs = [ f"0{i}" if len(i) == 1 else i for i in hexs ]
-    return '#' + ''.join(hexs)
+    return '#%02x%02x%02x' % tuple(int(i) for i in rgb)
+
+
+@lru_cache(maxsize = 1024)
+def _rgb_to_hsv(rgb: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    h, s, v = rgb_to_hsv_array(rgb)
+    return (int(h), int(s), int(v))
+
+
+@lru_cache(maxsize = 1024)
+def _hsv_to_rgb(hsv: Tuple[int, int, int]) -> Tuple[int, int, int]:
+    r, g, b = hsv_to_rgb_array(hsv)
+    return (int(r), int(g), int(b))
+
+
+def rgb_to_hsv(rgb: Tuple[int, int, int]) -> Dict[str, int]:
+    """
+    Convert from RGB tuple to HSV dict, using the ranges of OpenCV
+
+    Returns
+    ------
+    HSV dict with keys 'hue', 'saturation', 'value'
+    """
+    h, s, v = _rgb_to_hsv(tuple(rgb))
+    return { 'hue': h, 'saturation': s, 'value': v }
+
+
+def hsv_to_rgb(hsv: Dict[str, int]) -> Tuple[int, int, int]:
+    """
+    Convert from HSV dict in the ranges of OpenCV to RGB tuple
+
+    Params
+    ------
+    HSV dict with keys 'hue', 'saturation', 'value'
+    """
+    return _hsv_to_rgb((int(hsv['hue']), int(hsv['saturation']), int(hsv['value'])))
 
 
 def hex_to_hsv(c: str) -> Dict[str, int]:
@@ -49,15 +218,12 @@ def hex_to_hsv(c: str) -> Dict[str, int]:
 
     Returns
     ------
-    HSV dict with keys 'hue', 'saturation', 'luminosity' and values in OpenCV ranges
+    HSV dict with keys 'hue', 'saturation', 'value' and values in OpenCV ranges
         H: 0-179
         S: 0-255
         V: 0-255
     """
-
-    rgb = np.uint8([[[ int(c[i:j], base = 16) for i,j in [(1,3),(3,5),(5,7)] ]]])
-    hsv = cv2.cvtColor(rgb, cv2.COLOR_RGB2HSV)
-    return { 'hue': hsv[0][0][0], 'saturation': hsv[0][0][1], 'value': hsv[0][0][2] }
+    return rgb_to_hsv(hex_to_rgb(c))
 
 
 def hsv_to_hex(hsv: Dict[str, int]) -> str:
@@ -66,7 +232,7 @@ def hsv_to_hex(hsv: Dict[str, int]) -> str:
 
     Params
     ------
-    HSV dict with keys 'hue', 'saturation', 'luminosity' and values in OpenCV ranges
+    HSV dict with keys 'hue', 'saturation', 'value' and values in OpenCV ranges
         H: 0-179
         S: 0-255
         V: 0-255
@@ -75,9 +241,4 @@ def hsv_to_hex(hsv: Dict[str, int]) -> str:
     ------
     7-digit hex string of the form #ffffff representing a RGB colour
     """
-
-    rgb = cv2.cvtColor(np.uint8([[list(hsv.values())]]), cv2.COLOR_HSV2RGB)
-    hexs = [ str(hex(i))[2:] for i in rgb[0][0] ]
-    hexs = [ f"0{i}" if len(i) == 1 else i for i in hexs ]
-    return '#' + ''.join(hexs)
-
+    return rgb_to_hex(hsv_to_rgb(hsv))
@@ -1,20 +1,30 @@
+import dataclasses
 from types import SimpleNamespace
 
 def parse(d):
     """
-    Convert nested dict to nested namespace
+    Convert nested dict to nested namespace, including dicts in lists
     """
+    if isinstance(d, list):
+        return [ parse(v) for v in d ]
+    if not isinstance(d, dict):
+        return d
     x = SimpleNamespace()
-    _ = [setattr(x, k, parse(v)) if isinstance(v, dict) else setattr(x, k, v)
-            for k, v in d.items() ]
+    _ = [ setattr(x, k, parse(v)) for k, v in d.items() ]
     return x
 
 def unparse(n):
     """
-    Convert nested namespace to nested dict
+    Convert nested namespace or dataclass to nested dict, including those in
+    lists
     """
-    return { k: unparse(v) if isinstance(v, SimpleNamespace) else v
-            for k,v in vars(n).items() }
+    if isinstance(n, list):
+        return [ unparse(v) for v in n ]
+    if dataclasses.is_dataclass(n):
+        return { f.name: unparse(getattr(n, f.name)) for f in dataclasses.fields(n) }
+    if not isinstance(n, SimpleNamespace):
+        return n
+    return { k: unparse(v) for k,v in vars(n).items() }
 
 def unwrap_resolution(resolution: SimpleNamespace):
     """
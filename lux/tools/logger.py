@@ -1,7 +1,30 @@
 from datetime import date
+import atexit
 import logging
+import logging.handlers
 import os
+import queue
 import socket
+import time
+from typing import Any, Optional
+
+"""
+Logging for every module of lux, initialised on first import.
+
+Records are put on a queue by the calling thread and written to the log file
+by a background listener, so the render, audio and web threads never wait on
+the SD card. The listener writes records as they arrive but only flushes the
+file once the queue is drained or every `BATCH` records, so a burst costs a
+single write.
+
+Modules log to loggers named after them, so each subsystem (lux.leds,
+lux.audio, lux.video, lux.web) can be levelled on its own. Calls on the render
+path use %-style arguments, so a disabled level costs one comparison and the
+message is never formatted.
+"""
+
+# records written between flushes of the log file, at most
+BATCH = 256
 
 # create directory for logs if it doesn't exit
 if not os.path.exists('logs'):
@@ -13,5 +36,118 @@ hostname = socket.gethostname()
 today = date.today().strftime('%Y%m%d')
 
 log_path = f"logs/{hostname}_{today}.log"
-logging.basicConfig(filename = log_path, filemode = 'a', level = logging.INFO,
-        format = '%(asctime)s.%(msecs)03d %(message)s', datefmt = '%H:%M:%S')
+
+
+class BatchingFileHandler(logging.FileHandler):
+    """
+    File handler for the queue listener, which only flushes once the queue
+    it is fed from is empty or after `capacity` records
+    """
+
+    def __init__(self, filename: str, records: queue.SimpleQueue, capacity: int = BATCH) -> None:
+        super().__init__(filename, mode = 'a')
+        self.records = records
+        self.capacity = capacity
+        self.pending = 0
+
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+            self.pending += 1
+            if self.pending >= self.capacity or self.records.empty():
+                self.flush()
+        except Exception:
+            self.handleError(record)
+
+
+    def flush(self) -> None:
+        super().flush()
+        self.pending = 0
+
+
+records: queue.SimpleQueue = queue.SimpleQueue()
+file_handler = BatchingFileHandler(log_path, records)
+file_handler.setFormatter(logging.Formatter('%(asctime)s.%(msecs)03d %(name)s %(message)s',
+        datefmt = '%H:%M:%S'))
+
+listener = logging.handlers.QueueListener(records, file_handler)
+listener.start()
+atexit.register(listener.stop)
+
+root = logging.getLogger()
+root.setLevel(os.environ.get('LUX_LOG_LEVEL', 'INFO'))
+if not any(isinstance(h, logging.handlers.QueueHandler) for h in root.handlers):
+    root.addHandler(logging.handlers.QueueHandler(records))
+
+
+def configure(config: Optional[Any]) -> None:
+    """
+    Set the level of the root logger and of each subsystem
+
+    Params
+    ------
+    config
+        the `logging` config, with the root `level`, and optionally a level
+        for any of `leds`, `audio`, `video` and `web`, e.g. 'DEBUG', 'WARNING'
+    """
+    if config is None:
+        return
+    level = getattr(config, 'level', None)
+    if level:
+        root.setLevel(level)
+    for subsystem in ('leds', 'audio', 'video', 'web'):
+        level = getattr(config, subsystem, None)
+        if level:
+            logging.getLogger(f"lux.{subsystem}").setLevel(level)
+
+
+class FrameLog():
+    """
+    Sample per-frame timings and log one summary record every `interval`
+    seconds, instead of a line per frame
+    """
+
+    def __init__(self, logger: logging.Logger, name: str, interval: float = 10.0) -> None:
+        """
+        Params
+        ------
+        logger
+            logger the summaries are written to, at INFO
+        name
+            what is rendered, included in each summary
+        interval
+            seconds between summaries
+        """
+        self.logger = logger
+        self.name = name
+        self.interval = interval
+        self.reset(time.monotonic_ns())
+
+
+    def reset(self, now: int) -> None:
+        self.since = now
+        self.frames = 0
+        self.render_time = 0
+        self.commit_time = 0
+        self.worst = 0
+
+
+    def add(self, begin: int, rendered: int, committed: int) -> None:
+        """
+        Account one frame, from monotonic_ns timestamps taken when it was
+        started, rendered and committed
+        """
+        self.frames += 1
+        self.render_time += rendered - begin
+        self.commit_time += committed - rendered
+        self.worst = max(self.worst, committed - begin)
+
+        elapsed = (committed - self.since) / 1e9
+        if elapsed >= self.interval:
+            if self.logger.isEnabledFor(logging.INFO):
+                self.logger.info('%s: %d frames, %.1f fps, render %.2f ms, commit %.2f ms, worst %.2f ms',
+                        self.name, self.frames, self.frames / elapsed,
+                        self.render_time / self.frames / 1e6,
+                        self.commit_time / self.frames / 1e6, self.worst / 1e6)
+            self.reset(committed)
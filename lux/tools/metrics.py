@@ -0,0 +1,174 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple
+
+"""
+Lightweight timing instrumentation for the render, commit and encode paths.
+
+Durations are taken with time.monotonic_ns and counted into histograms with
+fixed buckets, so recording a sample is a bisect and two additions, and no
+samples are kept. Percentiles are estimated from the buckets. The registry
+renders every metric as Prometheus text for /metrics, or as a dict for /stats.
+"""
+
+# bucket upper bounds in ns, doubling from 25 us to ~0.8 s
+BUCKETS_NS = tuple(25_000 << k for k in range(16))
+
+
+class Histogram():
+    """
+    Count durations into fixed buckets
+    """
+
+    def __init__(self, buckets_ns: Tuple[int, ...] = BUCKETS_NS) -> None:
+        self.bounds = buckets_ns
+        # one count per bucket, and one for samples above the last bound
+        self.counts = [ 0 ] * (len(buckets_ns) + 1)
+        self.count = 0
+        self.sum_ns = 0
+
+
+    def observe(self, ns: int) -> None:
+        """
+        Count one duration of `ns` nanoseconds
+        """
+        self.counts[bisect_left(self.bounds, ns)] += 1
+        self.count += 1
+        self.sum_ns += ns
+
+
+    def percentile(self, q: float) -> float:
+        """
+        Estimate the `q` quantile, 0-1, interpolating linearly within the
+        bucket it falls in
+
+        Returns
+        ------
+        duration in seconds, 0 if nothing was observed
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lo = self.bounds[i - 1] if i else 0
+                hi = self.bounds[i] if i < len(self.bounds) else self.bounds[-1]
+                return (lo + (hi - lo) * (rank - seen) / n) / 1e9
+            seen += n
+        return self.bounds[-1] / 1e9
+
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Returns
+        ------
+        dict with the count, mean and p50, p90 and p99 in seconds
+        """
+        return {
+            'count': self.count,
+            'mean':  self.sum_ns / self.count / 1e9 if self.count else 0.0,
+            'p50':   self.percentile(0.5),
+            'p90':   self.percentile(0.9),
+            'p99':   self.percentile(0.99),
+        }
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Labels, extra: str = '') -> str:
+    pairs = [ f'{k}="{v}"' for k, v in labels ] + ([ extra ] if extra else [])
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Registry():
+    """
+    Named histograms and gauges, each optionally split by labels
+    """
+
+    def __init__(self) -> None:
+        self.help: Dict[str, str] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.gauges: Dict[str, Dict[Labels, Callable[[], float]]] = {}
+
+
+    def histogram(self, name: str, help: str, **labels: str) -> Histogram:
+        """
+        Get the histogram `name` with `labels`, created on first use
+
+        Params
+        ------
+        name
+            metric name, in seconds as Prometheus expects, e.g.
+            lux_commit_seconds
+        help
+            description of the metric
+        labels
+            label values of this histogram, e.g. effect = 'rainbow_frame'
+        """
+        self.help.setdefault(name, help)
+        family = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        if key not in family:
+            family[key] = Histogram()
+        return family[key]
+
+
+    def gauge(self, name: str, help: str, read: Callable[[], float], **labels: str) -> None:
+        """
+        Register a gauge, read by calling `read` whenever metrics are
+        collected. Registering the same name and labels again replaces it
+        """
+        self.help.setdefault(name, help)
+        self.gauges.setdefault(name, {})[tuple(sorted(labels.items()))] = read
+
+
+    def prometheus(self) -> str:
+        """
+        Returns
+        ------
+        every metric in the Prometheus text exposition format
+        """
+        lines: List[str] = []
+        for name, family in self.gauges.items():
+            lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} gauge')
+            for labels, read in family.items():
+                lines.append(f'{name}{_labels(labels)} {float(read())}')
+
+        for name, family in self.histograms.items():
+            lines.append(f'# HELP {name} {self.help[name]}')
+            lines.append(f'# TYPE {name} histogram')
+            for labels, h in family.items():
+                cumulative = 0
+                for bound, n in zip(h.bounds, h.counts):
+                    cumulative += n
+                    le = _labels(labels, f'le="{bound / 1e9:g}"')
+                    lines.append(f'{name}_bucket{le} {cumulative}')
+                le = _labels(labels, 'le="+Inf"')
+                lines.append(f'{name}_bucket{le} {h.count}')
+                lines.append(f'{name}_sum{_labels(labels)} {h.sum_ns / 1e9}')
+                lines.append(f'{name}_count{_labels(labels)} {h.count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        Returns
+        ------
+        dict of every gauge value and histogram summary, by name and then
+        by comma separated label values ('' without labels)
+        """
+        def key(labels: Labels) -> str:
+            return ','.join(v for _, v in labels)
+
+        gauges = { name: { key(l): read() for l, read in family.items() }
+                for name, family in self.gauges.items() }
+        histograms = { name: { key(l): h.summary() for l, h in family.items() }
+                for name, family in self.histograms.items() }
+        return { 'gauges': gauges, 'histograms': histograms }
+
+
+# metrics of this process
+registry = Registry()
@@ -0,0 +1,221 @@
+import logging
+import os
+import tempfile
+import threading
+from typing import Callable, Dict, Optional, Tuple
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.tools.schema import Config, ConfigError, dump, load_file
+
+log = logging.getLogger(__name__)
+
+"""
+Reloading the config when its file changes, and writing it back without
+blocking the caller.
+
+The file is watched by polling its modification time, size and inode, which
+works on every filesystem, including network and SD card mounts inotify
+misses, and costs one `stat` a poll. Editors save by truncating or replacing
+the file, so a change is only loaded once the file has stayed the same for a
+whole poll. A file that does not validate is logged and ignored, keeping the
+config running.
+
+Writes are atomic: the YAML is written to a temporary file next to the
+config and renamed over it, so the watcher, or a crash, never sees half a
+file.
+"""
+
+
+def stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    """
+    Returns
+    ------
+    modification time, size and inode of `path`, or None if it is missing
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+class ConfigWatcher():
+    """
+    Call back with the new config whenever the file at `path` changes and
+    still validates
+    """
+
+    def __init__(self,
+            path: str,
+            callback: Callable[[Config], None],
+            interval: float = 0.5
+        ) -> None:
+        """
+        Params
+        ------
+        path
+            YAML config file to watch
+        callback
+            called on the watcher thread with each new config
+        interval
+            seconds between polls
+        """
+        self.path = path
+        self.callback = callback
+        self.interval = interval
+        self.last = stamp(path)
+        self.reloads = 0
+        self.errors = 0
+        self.stopped = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+
+    def refresh(self) -> None:
+        """
+        Take the file as it is now as seen, e.g. after writing it ourselves
+        """
+        self.last = stamp(self.path)
+
+
+    def poll(self) -> Optional[Config]:
+        """
+        Load the file if it changed and has since settled
+
+        Returns
+        ------
+        the new config, or None if the file did not change or is invalid
+        """
+        current = stamp(self.path)
+        if current is None or current == self.last:
+            return None
+        # wait for the writer to finish
+        self.stopped.wait(self.interval)
+        if stamp(self.path) != current:
+            return None
+        self.last = current
+
+        try:
+            config = load_file(self.path)
+        except (ConfigError, OSError, ValueError) as e:
+            # YAML errors are ValueErrors too
+            self.errors += 1
+            log.warning('Not reloading %s: %s', self.path, e)
+            return None
+        self.reloads += 1
+        log.info('Reloaded config from %s', self.path)
+        return config
+
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            config = self.poll()
+            if config is None:
+                continue
+            try:
+                self.callback(config)
+            except Exception:
+                log.exception('Applying config from %s failed', self.path)
+
+
+    def start(self) -> None:
+        self.stopped.clear()
+        self.thread = threading.Thread(target = self.run, name = 'config-watcher', daemon = True)
+        self.thread.start()
+        log.info('Watching %s for changes', self.path)
+
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join(timeout = 1)
+
+
+class ConfigWriter():
+    """
+    Write configs to YAML on a thread of its own. Configs are converted to
+    plain dicts when queued, so later changes are not written by mistake,
+    and when several writes to a file are queued only the newest is made
+    """
+
+    def __init__(self, written: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Params
+        ------
+        written
+            called with the path of every file written, on the writer thread
+        """
+        self.written = written
+        self.pending: Dict[str, Dict] = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.idle = threading.Event()
+        self.idle.set()
+        self.thread = threading.Thread(target = self.run, name = 'config-writer', daemon = True)
+        self.thread.start()
+
+
+    def save(self, config: Config, path: str) -> None:
+        """
+        Queue `config` to be written to `path`, returning straight away
+        """
+        data = dump(config)
+        with self.lock:
+            self.pending[path] = data
+            self.idle.clear()
+        self.wake.set()
+
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until every queued config is written
+
+        Returns
+        ------
+        False if they were not written within `timeout` seconds
+        """
+        return self.idle.wait(timeout)
+
+
+    def run(self) -> None:
+        while True:
+            self.wake.wait()
+            self.wake.clear()
+            while True:
+                with self.lock:
+                    if not self.pending:
+                        self.idle.set()
+                        break
+                    path, data = self.pending.popitem()
+                try:
+                    write(path, data)
+                    log.info('Saved config to %s', path)
+                    if self.written is not None:
+                        self.written(path)
+                except OSError as e:
+                    log.error('Could not save config to %s: %s', path, e)
+
+
+def write(path: str, data: Dict) -> None:
+    """
+    Atomically replace the YAML file at `path` with `data`
+    """
+    import yaml
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(prefix = '.config-', suffix = '.yml', dir = directory)
+    try:
+        # keep the permissions of the file replaced, not the private ones of
+        # a temporary file
+        try:
+            os.chmod(tmp, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(tmp, 0o644)
+        with os.fdopen(fd, 'w') as fh:
+            yaml.dump(data, fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
@@ -0,0 +1,57 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+class RingBuffer():
+    """
+    Single-producer, single-consumer ring of fixed-shape numpy records.
+
+    The writer fills the slot after the newest one and only then publishes it
+    by bumping the write counter, so readers never take a lock: they copy the
+    newest published slot and check the writer has not come round to that
+    slot again while they were copying.
+    """
+
+    def __init__(self, shape: Tuple[int, ...], size: int = 8, dtype = np.float32) -> None:
+        """
+        Params
+        ------
+        shape
+            shape of one record
+        size
+            number of slots, i.e. how many records the writer may run ahead
+            of a reader before the reader has to retry
+        dtype
+            numpy dtype of the records
+        """
+        self.size = size
+        self.slots = np.zeros((size, *shape), dtype = dtype)
+        self.written = 0
+
+
+    def push(self, record: np.ndarray) -> None:
+        """
+        Copy `record` into the next slot and publish it
+        """
+        self.slots[self.written % self.size] = record
+        self.written += 1
+
+
+    def latest(self, out: np.ndarray) -> Optional[int]:
+        """
+        Copy the newest record into `out`
+
+        Returns
+        ------
+        sequence number of the record copied, or None if nothing has been
+        written yet
+        """
+        while True:
+            seq = self.written
+            if seq == 0:
+                return None
+            np.copyto(out, self.slots[(seq - 1) % self.size])
+            # the copy is only torn if the writer reused the slot meanwhile
+            if self.written - seq < self.size - 1:
+                return seq
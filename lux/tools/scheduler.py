@@ -0,0 +1,155 @@
+import asyncio
+import time
+from typing import AsyncGenerator, Callable, Dict, Generator, Optional, Tuple
+
+
+class FrameScheduler():
+    """
+    Pace a loop at a fixed frame rate on the monotonic clock. Deadlines are
+    kept on a fixed grid from the start time, so time spent rendering and
+    committing does not add up into drift. When the loop falls behind by one
+    or more whole frames, those frames are dropped rather than rendered late
+    back to back.
+    """
+
+    def __init__(self, fps: float, smoothing: float = 0.1) -> None:
+        """
+        Params
+        ------
+        fps
+            target frames per second
+        smoothing
+            weight of the newest sample in the moving averages of the achieved
+            frame rate and jitter
+        """
+        self.fps = fps
+        self.frametime = 1.0 / fps
+        self.smoothing = smoothing
+        self.reset()
+
+
+    def reset(self) -> None:
+        """
+        Clear all counters
+        """
+        self.start = None
+        self.frames = 0
+        self.dropped = 0
+        self.achieved_fps = 0.0
+        self.jitter = 0.0
+        self._last = None
+
+
+    def ticks(self,
+            running: Optional[Callable[[], bool]] = None,
+            duration: Optional[float] = None
+        ) -> Generator[float, None, None]:
+        """
+        Sleep until each frame deadline and yield it
+
+        Params
+        ------
+        running
+            the loop stops as soon as this returns False
+        duration
+            if given, the loop stops after this many seconds
+
+        Returns
+        ------
+        a generator of frame times, in seconds since the first frame
+        """
+        self.reset()
+        self.start = time.monotonic()
+        deadline = self.start
+
+        while running is None or running():
+            now = time.monotonic()
+            if now < deadline:
+                time.sleep(deadline - now)
+                now = time.monotonic()
+
+            deadline, late = self._catch_up(deadline, now)
+            t = deadline - self.start
+            if duration is not None and t >= duration:
+                return
+
+            self._update(now, late)
+            yield t
+            deadline += self.frametime
+
+
+    async def aticks(self,
+            running: Optional[Callable[[], bool]] = None,
+            duration: Optional[float] = None
+        ) -> AsyncGenerator[float, None]:
+        """
+        Like `ticks`, awaiting each frame deadline on the running event loop
+        instead of sleeping
+        """
+        self.reset()
+        self.start = time.monotonic()
+        deadline = self.start
+
+        while running is None or running():
+            now = time.monotonic()
+            if now < deadline:
+                await asyncio.sleep(deadline - now)
+                now = time.monotonic()
+
+            deadline, late = self._catch_up(deadline, now)
+            t = deadline - self.start
+            if duration is not None and t >= duration:
+                return
+
+            self._update(now, late)
+            yield t
+            deadline += self.frametime
+
+
+    def _catch_up(self, deadline: float, now: float) -> Tuple[float, float]:
+        """
+        Skip every deadline we are already a whole frame late for at `now`
+
+        Returns
+        ------
+        the deadline of the frame to render, and how late it is
+        """
+        late = now - deadline
+        if late >= self.frametime:
+            missed = int(late // self.frametime)
+            self.dropped += missed
+            deadline += missed * self.frametime
+            late -= missed * self.frametime
+        return deadline, late
+
+
+    def _update(self, now: float, late: float) -> None:
+        """
+        Update counters with a frame starting at `now`, `late` seconds after
+        its deadline
+        """
+        self.frames += 1
+        self.jitter += self.smoothing * (late - self.jitter)
+        if self._last is not None and now > self._last:
+            fps = 1.0 / (now - self._last)
+            if self.achieved_fps:
+                self.achieved_fps += self.smoothing * (fps - self.achieved_fps)
+            else:
+                self.achieved_fps = fps
+        self._last = now
+
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns
+        ------
+        dict with the target and achieved fps, mean lateness of frames in
+        seconds, and counts of rendered and dropped frames
+        """
+        return {
+            'fps':          self.fps,
+            'achieved_fps': self.achieved_fps,
+            'jitter':       self.jitter,
+            'frames':       self.frames,
+            'dropped':      self.dropped,
+        }
@@ -0,0 +1,397 @@
+import dataclasses
+from dataclasses import dataclass, field
+import logging
+from typing import Any, Dict, List, Tuple, Union, get_args, get_origin, get_type_hints
+
+import numpy as np
+
+"""
+Typed schema of config/default.yml.
+
+Each section is a slotted dataclass, so a typo in the code is an
+AttributeError rather than a silent None, and attribute access is a slot
+lookup. `load` checks every key and value of the YAML against the schema and
+the ranges each section accepts, naming the offending key on error, so a
+broken config is rejected when loaded rather than failing mid-show. Sections
+missing from older files take the defaults below, which match
+config/default.yml.
+
+`compile` turns a config into the parameters the render loop needs,
+precomputed once: the solid colour in RGB, the slice of the strip of every
+segment, and the colour correction LUT.
+"""
+
+
+class ConfigError(ValueError):
+    """
+    A config does not match the schema
+    """
+
+
+def _check(ok: bool, message: str) -> None:
+    if not ok:
+        raise ConfigError(message)
+
+
+@dataclass(slots = True)
+class HSVConfig():
+    # OpenCV ranges
+    hue: int = 0
+    saturation: int = 0
+    value: int = 0
+
+    def __post_init__(self) -> None:
+        _check(0 <= self.hue <= 179, f'hue {self.hue} not in 0-179')
+        _check(0 <= self.saturation <= 255, f'saturation {self.saturation} not in 0-255')
+        _check(0 <= self.value <= 255, f'value {self.value} not in 0-255')
+
+
+@dataclass(slots = True)
+class RangeConfig():
+    # smallest and largest index of LEDs, largest not included
+    min: int = 0
+    max: int = 1
+
+    def __post_init__(self) -> None:
+        _check(0 <= self.min < self.max, f'range {self.min}-{self.max} is empty or negative')
+
+
+@dataclass(slots = True)
+class ResolutionConfig():
+    height: int = 480
+    width: int = 640
+
+
+@dataclass(slots = True)
+class AmbilightConfig():
+    depth: float = 0.15
+    height: int = 48
+    sides: List[str] = field(default_factory = lambda: [ 'left', 'top', 'right' ])
+    width: int = 64
+
+    def __post_init__(self) -> None:
+        _check(0 < self.depth <= 1, f'depth {self.depth} not in (0, 1]')
+        for side in self.sides:
+            _check(side in ('left', 'top', 'right', 'bottom'), f'unknown side {side!r}')
+
+
+@dataclass(slots = True)
+class AudioConfig():
+    bands: int = 16
+    blocksize: int = 512
+    samplerate: int = 44100
+    source: str = ''
+
+    def __post_init__(self) -> None:
+        _check(self.bands > 0 and self.blocksize > 0 and self.samplerate > 0,
+                'bands, blocksize and samplerate must be positive')
+
+
+@dataclass(slots = True)
+class CameraConfig():
+    awb_mode: str = 'sunlight'
+    framerate: int = 12
+    iso: int = 100
+    resolution: ResolutionConfig = field(default_factory = ResolutionConfig)
+    saturation: int = 100
+    shutter_speed: int = 31250
+
+
+@dataclass(slots = True)
+class CorrectionConfig():
+    attack: float = 1.0
+    brightness: float = 1.0
+    gamma: float = 2.2
+    ma_per_channel: float = 20
+    max_current: float = 0
+    release: float = 0.3
+    white: List[int] = field(default_factory = lambda: [ 255, 255, 255 ])
+
+    def __post_init__(self) -> None:
+        _check(0 < self.attack <= 1 and 0 < self.release <= 1,
+                'attack and release must be in (0, 1]')
+        _check(0 <= self.brightness <= 1, f'brightness {self.brightness} not in [0, 1]')
+        _check(self.gamma > 0, f'gamma {self.gamma} must be positive')
+        _check(self.max_current >= 0, 'max_current must not be negative')
+        _check(len(self.white) == 3 and all(0 <= c <= 255 for c in self.white),
+                f'white {self.white} must be 3 values in 0-255')
+
+
+@dataclass(slots = True)
+class LoggingConfig():
+    audio: str = 'INFO'
+    leds: str = 'INFO'
+    level: str = 'INFO'
+    video: str = 'INFO'
+    web: str = 'INFO'
+
+    def __post_init__(self) -> None:
+        for name in ('audio', 'leds', 'level', 'video', 'web'):
+            level = getattr(self, name)
+            _check(isinstance(logging.getLevelName(level), int), f'unknown log level {level!r}')
+
+
+@dataclass(slots = True)
+class ReceiverConfig():
+    host: str = ''
+    range: RangeConfig = field(default_factory = RangeConfig)
+
+
+@dataclass(slots = True)
+class NetConfig():
+    delay: float = 0.05
+    port: int = 4048
+    receivers: List[ReceiverConfig] = field(default_factory = list)
+
+    def __post_init__(self) -> None:
+        _check(self.delay >= 0, 'delay must not be negative')
+        _check(0 < self.port < 65536, f'port {self.port} not in 1-65535')
+
+
+@dataclass(slots = True)
+class EffectConfig():
+    solid: HSVConfig = field(default_factory = lambda: HSVConfig(23, 237, 245))
+
+
+@dataclass(slots = True)
+class DefaultSegmentConfig():
+    effect: EffectConfig = field(default_factory = EffectConfig)
+    range: RangeConfig = field(default_factory = lambda: RangeConfig(0, 10))
+    reverse: bool = False
+
+
+@dataclass(slots = True)
+class SegmentConfig():
+    effect: str = 'solid'
+    range: RangeConfig = field(default_factory = RangeConfig)
+    reverse: bool = False
+
+    def __post_init__(self) -> None:
+        from lux.leds.effects import EFFECTS
+        _check(isinstance(self.effect, str), f'effect {self.effect!r} is not a name')
+        _check(self.effect.lower() in EFFECTS,
+                f'unknown effect {self.effect!r}, one of ' + ', '.join(EFFECTS))
+
+
+@dataclass(slots = True)
+class ServerConfig():
+    CAMERA: Union[int, str] = 0
+    HOST: str = '0.0.0.0'
+    PORT: int = 8888
+
+
+@dataclass(slots = True)
+class SimConfig():
+    led_size: int = 8
+    record: str = ''
+
+    def __post_init__(self) -> None:
+        _check(self.led_size > 0, 'led_size must be positive')
+
+
+@dataclass(slots = True)
+class SPIConfig():
+    bits: int = 3
+    brightness: int = 31
+    device: str = '/dev/spidev0.0'
+    keepalive: float = 1.0
+    order: str = ''
+    speed_hz: int = 0
+
+    def __post_init__(self) -> None:
+        _check(self.bits in (3, 4), f'bits {self.bits} must be 3 or 4')
+        _check(0 <= self.brightness <= 31, f'brightness {self.brightness} not in 0-31')
+        _check(self.keepalive >= 0, 'keepalive must not be negative')
+        _check(self.order == '' or sorted(self.order.upper()) == [ 'B', 'G', 'R' ],
+                f'order {self.order!r} is not a permutation of RGB')
+        _check(self.speed_hz >= 0, 'speed_hz must not be negative')
+
+
+@dataclass(slots = True)
+class Config():
+    ambilight: AmbilightConfig = field(default_factory = AmbilightConfig)
+    audio: AudioConfig = field(default_factory = AudioConfig)
+    camera: CameraConfig = field(default_factory = CameraConfig)
+    correction: CorrectionConfig = field(default_factory = CorrectionConfig)
+    fps: float = 30
+    leds: str = ''
+    logging: LoggingConfig = field(default_factory = LoggingConfig)
+    net: NetConfig = field(default_factory = NetConfig)
+    segment: DefaultSegmentConfig = field(default_factory = DefaultSegmentConfig)
+    segments: List[SegmentConfig] = field(default_factory = list)
+    server: ServerConfig = field(default_factory = ServerConfig)
+    sim: SimConfig = field(default_factory = SimConfig)
+    spi: SPIConfig = field(default_factory = SPIConfig)
+    transition: float = 0.5
+    # processes rendering segments alongside the render thread, 0 for none
+    workers: int = 0
+    # file the config was loaded from, not saved
+    conf_path: str = field(default = '', metadata = { 'save': False })
+
+    def __post_init__(self) -> None:
+        from lux.leds.drivers import DRIVERS
+        _check(self.fps > 0, f'fps {self.fps} must be positive')
+        _check(self.transition >= 0, 'transition must not be negative')
+        _check(self.workers >= 0, 'workers must not be negative')
+        _check(self.leds in ('', 'sim', 'ddp') or self.leds.upper() in DRIVERS,
+                f'unknown leds {self.leds!r}, one of sim, ddp, ' + ', '.join(DRIVERS))
+
+
+def _convert(tp: Any, value: Any, path: str) -> Any:
+    """
+    Check `value` against the type `tp` and build it
+
+    Raises
+    ------
+    ConfigError naming `path` if it does not match
+    """
+    if dataclasses.is_dataclass(tp):
+        return _build(tp, value, path)
+
+    origin = get_origin(tp)
+    if origin is Union:
+        for option in get_args(tp):
+            try:
+                return _convert(option, value, path)
+            except ConfigError:
+                pass
+        raise ConfigError(f'{path}: {value!r} is none of {tp}')
+    if origin is list:
+        _check(isinstance(value, list), f'{path}: expected a list, got {value!r}')
+        item = get_args(tp)[0]
+        return [ _convert(item, v, f'{path}[{i}]') for i, v in enumerate(value) ]
+
+    # bools are ints in python, but not in the config
+    if tp is float:
+        _check(isinstance(value, (int, float)) and not isinstance(value, bool),
+                f'{path}: expected a number, got {value!r}')
+        return value
+    _check(isinstance(value, tp) and (tp is bool or not isinstance(value, bool)),
+            f'{path}: expected {tp.__name__}, got {value!r}')
+    return value
+
+
+def _build(cls: type, data: Any, path: str) -> Any:
+    """
+    Build the dataclass `cls` from the dict `data`
+    """
+    _check(isinstance(data, dict), f'{path or "config"}: expected a mapping, got {data!r}')
+    hints = get_type_hints(cls)
+    names = { f.name for f in dataclasses.fields(cls) }
+    for key in data:
+        _check(key in names, f'{path}{"." if path else ""}{key}: unknown key')
+
+    values = { k: _convert(hints[k], v, f'{path}{"." if path else ""}{k}') for k, v in data.items() }
+    try:
+        return cls(**values)
+    except ConfigError as e:
+        raise ConfigError(f'{path or "config"}: {e}') from None
+
+
+def load(data: Dict) -> Config:
+    """
+    Validate a config as read from YAML
+
+    Raises
+    ------
+    ConfigError naming the first key that does not match the schema
+    """
+    return _build(Config, data, '')
+
+
+def load_file(path: str) -> Config:
+    """
+    Read and validate the YAML config at `path`
+    """
+    import yaml
+    with open(path, 'r') as fh:
+        config = load(yaml.safe_load(fh) or {})
+    config.conf_path = path
+    return config
+
+
+def dump(config: Any) -> Any:
+    """
+    Returns
+    ------
+    a config or any of its sections as plain dicts and lists, to be written
+    as YAML
+    """
+    if dataclasses.is_dataclass(config):
+        return { f.name: dump(getattr(config, f.name)) for f in dataclasses.fields(config)
+                if f.metadata.get('save', True) }
+    if isinstance(config, list):
+        return [ dump(v) for v in config ]
+    return config
+
+
+@dataclass(frozen = True, slots = True)
+class SegmentParams():
+    start: int
+    stop: int
+    reverse: bool
+    # lower case name in `effects.EFFECTS`
+    effect: str
+
+    @property
+    def count(self) -> int:
+        return self.stop - self.start
+
+
+@dataclass(frozen = True, slots = True)
+class RenderParams():
+    """
+    The parameters of the render loop, precomputed from a config
+    """
+    fps: float
+    transition: float
+    # the solid colour, in RGB
+    col: Tuple[int, int, int]
+    # LEDs in the strip, enough to hold every segment
+    length: int
+    segments: Tuple[SegmentParams, ...]
+    # the three channel correction LUTs side by side, see `PostProcessor`
+    lut: np.ndarray
+    attack: float
+    release: float
+    max_current: float
+    ma_per_channel: float
+
+    def layout(self) -> Tuple[Tuple[int, int, bool], ...]:
+        """
+        Returns
+        ------
+        the range and direction of every segment, which can only change on
+        restart
+        """
+        return tuple((s.start, s.stop, s.reverse) for s in self.segments)
+
+
+def compile(config: Config) -> RenderParams:
+    """
+    Precompute the render parameters of `config`. Without a `segments` list
+    the single `segment` is shown in solid colour
+    """
+    from lux.leds.postprocess import correction_lut
+    from lux.tools.colour import hsv_to_rgb
+    from lux.tools.config import unwrap_hsv
+
+    segments = config.segments or [ SegmentConfig('solid', config.segment.range,
+            config.segment.reverse) ]
+    compiled = tuple(SegmentParams(s.range.min, s.range.max, s.reverse, s.effect.lower())
+            for s in segments)
+    c = config.correction
+    lut = correction_lut(c.gamma, tuple(c.white), c.brightness).reshape(-1)
+    lut.flags.writeable = False
+    return RenderParams(
+        fps            = config.fps,
+        transition     = config.transition,
+        col            = hsv_to_rgb(unwrap_hsv(config.segment.effect.solid)),
+        length         = max(s.stop for s in compiled),
+        segments       = compiled,
+        lut            = lut,
+        attack         = c.attack,
+        release        = c.release,
+        max_current    = c.max_current,
+        ma_per_channel = c.ma_per_channel,
+    )
@@ -0,0 +1,82 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from typing import List, Tuple
+
+# set in the environment of a child process that should exit as soon as
+# startup is complete, used to profile imports
+EXIT_AFTER_STARTUP = 'LUX_EXIT_AFTER_STARTUP'
+
+
+class StartupTimer():
+    """
+    Record how long each phase of startup took, and how many modules had been
+    imported by then
+    """
+
+    def __init__(self) -> None:
+        self.begin = time.perf_counter()
+        self.marks: List[Tuple[str, float, int]] = []
+
+
+    def mark(self, phase: str) -> None:
+        """
+        Record that `phase` has just completed
+        """
+        self.marks.append((phase, time.perf_counter() - self.begin, len(sys.modules)))
+
+
+    def report(self) -> str:
+        """
+        Returns
+        ------
+        table of phases with the time each completed at, in ms since this
+        module was imported, and the number of modules loaded by then
+        """
+        lines = [ f"{'phase':<32} {'ms':>8} {'modules':>8}" ]
+        for phase, t, modules in self.marks:
+            lines.append(f"{phase:<32} {1000 * t:>8.1f} {modules:>8}")
+        return '\n'.join(lines)
+
+
+# timer of this process, started by whichever entry point imports it first
+startup = StartupTimer()
+
+
+def importtime_report(argv: List[str], top: int = 20) -> str:
+    """
+    Run the entry point again under `python -X importtime`, exiting as soon
+    as startup is complete, and summarise the slowest imports
+
+    Params
+    ------
+    argv
+        arguments to `python -m` for the entry point
+    top
+        number of imports to list
+
+    Returns
+    ------
+    table of the `top` imports by cumulative time, and the total
+    """
+    env = dict(os.environ, **{ EXIT_AFTER_STARTUP: '1' })
+    proc = subprocess.run([ sys.executable, '-X', 'importtime', '-m', *argv ],
+            env = env, stderr = subprocess.PIPE, stdout = subprocess.DEVNULL, text = True)
+
+    pattern = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+    imports = []
+    for line in proc.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            imports.append((int(cumulative), int(own), len(indent), name))
+
+    # top level imports add up to the total import time
+    total = sum(c for c, _, depth, _ in imports if depth == 1)
+    lines = [ f"{'import':<40} {'self ms':>8} {'cumul ms':>9}" ]
+    for cumulative, own, _, name in sorted(imports, reverse = True)[:top]:
+        lines.append(f"{name:<40} {own / 1000:>8.1f} {cumulative / 1000:>9.1f}")
+    lines.append(f"{'total':<40} {'':>8} {total / 1000:>9.1f}")
+    return '\n'.join(lines)
@@ -0,0 +1,138 @@
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import cv2
+import numpy as np
+
+
+@lru_cache(maxsize = 16)
+def border_rects(
+        width: int, height: int, count: int, depth: float, sides: Tuple[str, ...]
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Map each of `count` LEDs to a rectangle along the border of a frame. LEDs
+    are spread over `sides` in order, in proportion to the length of each
+    side, and run clockwise: left to right along the top, top to bottom down
+    the right, right to left along the bottom and bottom to top up the left.
+    The mapping is cached per resolution and layout.
+
+    Params
+    ------
+    width, height
+        size of the (downscaled) frame
+    count
+        number of LEDs
+    depth
+        how far into the frame each rectangle reaches, as a fraction of the
+        width for the sides and of the height for the top and bottom
+    sides
+        sides the LEDs run along, any of 'top', 'right', 'bottom', 'left'
+
+    Returns
+    ------
+    arrays y0, y1, x0, x1 of rectangle bounds per LED, upper bounds excluded
+    """
+    dx = max(1, int(round(width * depth)))
+    dy = max(1, int(round(height * depth)))
+    lengths = [ width if s in ('top', 'bottom') else height for s in sides ]
+
+    # LEDs per side, with rounding errors absorbed by the last side
+    split = np.round(np.cumsum([0] + lengths) / sum(lengths) * count).astype(int)
+
+    y0, y1, x0, x1 = [ np.zeros(count, dtype = np.intp) for _ in range(4) ]
+    for side, length, first, last in zip(sides, lengths, split[:-1], split[1:]):
+        n = last - first
+        if n == 0:
+            continue
+        edges = np.linspace(0, length, n + 1).astype(np.intp)
+        lo, hi = edges[:-1], np.maximum(edges[1:], edges[:-1] + 1)
+        leds = slice(first, last)
+        if side == 'top':
+            y0[leds], y1[leds], x0[leds], x1[leds] = 0, dy, lo, hi
+        elif side == 'right':
+            y0[leds], y1[leds], x0[leds], x1[leds] = lo, hi, width - dx, width
+        elif side == 'bottom':
+            y0[leds], y1[leds] = height - dy, height
+            x0[leds], x1[leds] = width - hi, width - lo
+        elif side == 'left':
+            y0[leds], y1[leds] = height - hi, height - lo
+            x0[leds], x1[leds] = 0, dx
+        else:
+            raise ValueError(f'No such side: {side}')
+
+    return y0, y1, x0, x1
+
+
+class AmbilightSampler():
+    """
+    Sample LED colours from the border of camera frames. Each frame is
+    downscaled once, and an integral image of the small frame gives the mean
+    colour of every LED's rectangle in one vectorised lookup.
+    """
+
+    def __init__(self,
+            width: int = 64, height: int = 48, depth: float = 0.15,
+            sides: Tuple[str, ...] = ('left', 'top', 'right')
+        ) -> None:
+        """
+        Params
+        ------
+        width, height
+            size frames are downscaled to before sampling
+        depth
+            how far into the frame LED rectangles reach, see `border_rects`
+        sides
+            sides of the frame the LEDs run along, see `border_rects`
+        """
+        self.width = width
+        self.height = height
+        self.depth = depth
+        self.sides = tuple(sides)
+
+        self.small = np.zeros((height, width, 3), dtype = np.uint8)
+        self.rows = np.zeros((height, width, 3), dtype = np.int32)
+        self.integral = np.zeros((height + 1, width + 1, 3), dtype = np.int32)
+        self.frames = 0
+
+
+    def update(self, frame: np.ndarray) -> None:
+        """
+        Downscale a BGR camera frame and rebuild the integral image
+
+        Params
+        ------
+        frame
+            (H, W, 3) uint8 BGR frame as read from OpenCV
+        """
+        cv2.resize(frame, (self.width, self.height), dst = self.small,
+                interpolation = cv2.INTER_AREA)
+        np.cumsum(self.small, axis = 0, out = self.rows)
+        np.cumsum(self.rows, axis = 1, out = self.integral[1:, 1:])
+        self.frames += 1
+
+
+    def colours(self, count: int, out: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Mean colour of each LED's border rectangle in the latest frame
+
+        Params
+        ------
+        count
+            number of LEDs
+        out
+            (count, 3) uint8 array the RGB colours are written to
+
+        Returns
+        ------
+        `out`, or None if no frame has been sampled yet
+        """
+        if not self.frames:
+            return None
+
+        y0, y1, x0, x1 = border_rects(self.width, self.height, count, self.depth, self.sides)
+        s = self.integral
+        sums = s[y1, x1] - s[y0, x1] - s[y1, x0] + s[y0, x0]
+        sums //= ((y1 - y0) * (x1 - x0))[:, None]
+        # frames are BGR, LEDs are RGB
+        np.copyto(out, sums[:, ::-1], casting = 'unsafe')
+        return out
@@ -0,0 +1,240 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import re
+
+from lux.leds.effects import effect_names
+from lux.web.handler  import LEDHandler
+from lux.tools.colour import hsv_to_hex
+from lux.tools.config import unparse, unwrap_hsv
+from lux.tools.metrics import registry
+from lux.tools.scheduler import FrameScheduler
+from lux.tools.startup import startup
+from lux.web.pixels import preview_fps
+
+log = logging.getLogger(__name__)
+
+"""
+The web UI served by aiohttp on a single event loop, as an alternative to
+the threaded Flask server in `lux.web.server`.
+
+The render loop, every /video_feed client and the /ws control channel are
+coroutines on the same loop, so clients cost a socket rather than an OS
+thread each. Blocking or CPU-heavy work, such as rendering a frame, JPEG
+encoding and opening the camera, runs on a few worker
+threads; the FFT already runs in the audio thread.
+"""
+
+# worker threads for blocking calls, however many clients are connected
+EXECUTOR_THREADS = 4
+
+# colours the web UI sends, as #rrggbb
+HEX_COLOUR = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+def create_app(server_type, conf, conf_path, camera_stream=None):
+    log.info('Creating %s asyncio server with config:\n%s', server_type, conf)
+    conf.conf_path = conf_path
+
+    # the LEDs are lit while the handler is created, so aiohttp is only
+    # imported once they are on
+    proc = LEDHandler(conf, camera_stream)
+
+    import jinja2
+    from aiohttp import web, WSMsgType
+
+    templates = jinja2.Environment(autoescape = True,
+        loader = jinja2.FileSystemLoader(os.path.join(os.path.dirname(__file__), 'templates')))
+    templates.globals['url_for'] = lambda name: '/' if name == 'index' else f'/{name}'
+
+    def render_template(name, **context):
+        return web.Response(text = templates.get_template(name).render(**context),
+            content_type = 'text/html')
+
+    def options():
+        opts = unparse(proc.config)
+        # color picker expects hex colours
+        opts['segment']['effect']['solid'] = hsv_to_hex(unwrap_hsv(proc.config.segment.effect.solid))
+        return opts
+
+    def is_running():
+        if proc.running:
+            return "Main thread is running, lights should be dancing."
+        else:
+            return "Main thread not running."
+
+    def blocking(fn, *args):
+        return asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    routes = web.RouteTableDef()
+    # open /ws connections, closed on shutdown
+    sockets = set()
+
+
+    @routes.get("/")
+    async def index(request):
+        return render_template("index.html", opts = options(), running_text = is_running(),
+            pixels_url = "/ws")
+
+    @routes.get("/start")
+    async def start(request):
+        if not proc.running:
+            # opening the camera and audio can take a while
+            await blocking(proc.start)
+        raise web.HTTPFound("/")
+
+    @routes.get("/stop")
+    async def stop(request):
+        if proc.running:
+            await blocking(proc.stop)
+        raise web.HTTPFound("/")
+
+    @routes.get("/settings")
+    async def settings(request):
+        return render_template("settings.html", conf_path = proc.config.conf_path,
+            save_file = False, opts = options(), effects = effect_names)
+
+    @routes.post("/settings")
+    async def update_settings(request):
+        form = await request.post()
+        # effects are switched on the render loop, so these return straight
+        # away
+        if form['effect'] == 'solid':
+            proc.update_effect('solid', form['solid'])
+        else:
+            proc.update_effect(form['effect'])
+
+        # written on the handler's writer thread
+        if 'save_file' in form:
+            proc.save_config(form['conf_path'])
+        raise web.HTTPFound("/settings")
+
+
+    @routes.get("/video_feed")
+    async def video_feed(request):
+        """
+        Stream the JPEG-encoded frames shared by every client
+        """
+        response = web.StreamResponse(headers = {
+            'Content-Type': 'multipart/x-mixed-replace; boundary=frame' })
+        await response.prepare(request)
+        stream = proc.agenerate_frame()
+        try:
+            async for payload in stream:
+                await response.write(payload)
+        except ConnectionResetError:
+            pass
+        finally:
+            await stream.aclose()
+        return response
+
+
+    @routes.get("/ws")
+    async def websocket(request):
+        """
+        Live control and pixel preview. Clients send JSON messages, any of
+        `{"effect": name}`, `{"solid": "#rrggbb"}` and `{"running": bool}`,
+        and are answered with the running state. The committed pixels are
+        pushed as binary key frames and deltas, see `lux.web.pixels`, at
+        most `fps` times a second as given in the query string
+        """
+        ws = web.WebSocketResponse(heartbeat = 10)
+        await ws.prepare(request)
+        sockets.add(ws)
+        client = proc.pixels.client(preview_fps(request.query.get('fps'), conf.fps))
+
+        async def preview():
+            async for _ in FrameScheduler(client.fps).aticks(lambda: not ws.closed):
+                message = client.next()
+                if message is not None:
+                    await ws.send_bytes(message)
+
+        sender = asyncio.get_running_loop().create_task(preview())
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    command = msg.json()
+                except ValueError:
+                    command = None
+                if not isinstance(command, dict):
+                    log.warning('Ignoring malformed message from %s: %.80r', request.remote,
+                            msg.data)
+                    continue
+                effect, solid = command.get('effect'), command.get('solid')
+                if not (effect is None or isinstance(effect, str)) or \
+                        not (solid is None or isinstance(solid, str) and HEX_COLOUR.fullmatch(solid)):
+                    log.warning('Ignoring message with bad values from %s: %.80r', request.remote,
+                            msg.data)
+                    continue
+                try:
+                    if effect is not None:
+                        proc.update_effect(effect, solid)
+                    elif solid is not None:
+                        proc.update_solid(solid)
+                except ValueError as e:
+                    # ConfigErrors are ValueErrors too
+                    log.warning('Ignoring message from %s: %s', request.remote, e)
+                    continue
+                if 'running' in command and command['running'] != proc.running:
+                    await blocking(proc.start if command['running'] else proc.stop)
+                await ws.send_json({ 'running': proc.running })
+        finally:
+            sender.cancel()
+            # collect the sender's outcome, it may have failed on its own
+            try:
+                await sender
+            except asyncio.CancelledError:
+                pass
+            except Exception as e:
+                log.info('Preview to %s stopped: %s', request.remote, e)
+            client.close()
+            sockets.discard(ws)
+        return ws
+
+
+    @routes.get("/metrics")
+    async def metrics(request):
+        """
+        Timings, frame rate, video clients and thread liveness in the
+        Prometheus text format
+        """
+        return web.Response(body = registry.prometheus().encode(),
+            headers = { 'Content-Type': 'text/plain; version=0.0.4' })
+
+    @routes.get("/stats")
+    async def stats(request):
+        """
+        Frame rate, frame time percentiles, dropped frames, video clients and
+        thread liveness as JSON
+        """
+        return web.json_response(proc.stats())
+
+
+    tasks = {}
+
+    async def on_startup(app):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(EXECUTOR_THREADS, 'executor'))
+        tasks['render'] = loop.create_task(proc.runner.arun())
+
+    async def on_shutdown(app):
+        # end the client streams, which the server waits for before cleanup
+        proc.stop()
+        for ws in list(sockets):
+            await ws.close()
+
+    async def on_cleanup(app):
+        proc.runner.stop()
+        await tasks['render']
+
+    app = web.Application()
+    app.add_routes(routes)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
+
+    startup.mark('web app created')
+    return app
@@ -0,0 +1,258 @@
+import asyncio
+import itertools
+import logging
+import threading
+import time
+from types import SimpleNamespace
+from typing import AsyncGenerator, Dict, Generator, Optional
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+from lux.tools.metrics import registry
+from lux.tools.scheduler import FrameScheduler
+
+log = logging.getLogger(__name__)
+
+
+class MJPEGBroadcaster():
+    """
+    Encode frames to JPEG once and share the bytes with every MJPEG client.
+
+    Producers hand over frames with `publish`, which only swaps a reference.
+    One encoder thread, paced by a frame scheduler, encodes each new frame
+    exactly once and stamps it with a sequence number. Clients wait on a
+    condition for a sequence number newer than the last they sent, so a slow
+    client simply skips to the newest frame instead of queueing old ones.
+
+    Under an asyncio server, `arun` and `astream` do the same on the event
+    loop: frames are encoded on the loop's executor, and clients are
+    coroutines awaiting an event set on every new payload, so no client
+    holds a thread.
+    """
+
+    def __init__(self, fps: float, quality: int = 80) -> None:
+        """
+        Params
+        ------
+        fps
+            maximum rate frames are encoded at
+        quality
+            JPEG quality, 0-100
+        """
+        self.scheduler = FrameScheduler(fps)
+        self.quality = quality
+
+        self.frame: Optional[np.ndarray] = None
+        self.published = 0
+        self.published_at = 0.0
+        self.payload = b''
+        # monotonic time the frame in the payload was published at
+        self.payload_at = 0.0
+        self.seq = 0
+        self.cond = threading.Condition()
+
+        self.clients: Dict[int, SimpleNamespace] = {}
+        self.client_ids = itertools.count()
+        self.total_bytes = 0
+        self.encoded = 0
+        self.encode_time = registry.histogram('lux_encode_seconds',
+                'Time to JPEG encode a frame of the video feed')
+        self.latency = registry.histogram('lux_video_latency_seconds',
+                'Time from a frame being published to it being sent to a client')
+
+        self.running = False
+        self.thread = threading.Thread(target = self.run, daemon = True)
+        # set when encoding on an event loop, replaced by a new one on every
+        # payload so that waiting clients wake once
+        self.task: Optional[asyncio.Task] = None
+        self.updated: Optional[asyncio.Event] = None
+
+
+    def publish(self, frame: np.ndarray) -> None:
+        """
+        Make `frame` the next frame to encode. The broadcaster keeps a
+        reference, so the caller must not modify the frame afterwards
+        """
+        self.frame = frame
+        self.published_at = time.monotonic()
+        self.published += 1
+
+
+    def run(self) -> None:
+        """
+        Encode every new frame once, at most at the scheduler's frame rate
+        """
+        last = 0
+        for _ in self.scheduler.ticks(lambda: self.running):
+            frame, published, published_at = self.frame, self.published, self.published_at
+            if frame is None or published == last:
+                continue
+            last = published
+            self.set_payload(self.encode(frame), published_at)
+
+        # wake up clients so they see we stopped
+        with self.cond:
+            self.cond.notify_all()
+
+
+    async def arun(self) -> None:
+        """
+        Like `run`, on the running event loop, encoding on its executor
+        """
+        loop = asyncio.get_running_loop()
+        last = 0
+        async for _ in self.scheduler.aticks(lambda: self.running):
+            frame, published, published_at = self.frame, self.published, self.published_at
+            if frame is None or published == last:
+                continue
+            last = published
+            self.set_payload(await loop.run_in_executor(None, self.encode, frame), published_at)
+
+        self.updated.set()
+
+
+    def encode(self, frame: np.ndarray) -> Optional[bytes]:
+        """
+        Returns
+        ------
+        `frame` JPEG encoded and wrapped as a multipart part, or None if it
+        could not be encoded
+        """
+        # OpenCV is only loaded once there is a video feed to encode
+        import cv2
+        begin = time.monotonic_ns()
+        (flag, encoded_frame) = cv2.imencode(".jpg", frame,
+                [ int(cv2.IMWRITE_JPEG_QUALITY), self.quality ])
+        self.encode_time.observe(time.monotonic_ns() - begin)
+        if not flag:
+            return None
+        return (b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' +
+            encoded_frame.tobytes() + b'\r\n')
+
+
+    def set_payload(self, payload: Optional[bytes], published_at: float) -> None:
+        """
+        Hand a newly encoded `payload` to every client
+        """
+        if payload is None:
+            return
+        with self.cond:
+            self.payload = payload
+            self.payload_at = published_at
+            self.seq += 1
+            self.encoded += 1
+            self.cond.notify_all()
+        if self.updated is not None:
+            updated, self.updated = self.updated, asyncio.Event()
+            updated.set()
+
+
+    def stream(self) -> Generator[bytes, None, None]:
+        """
+        Produce the multipart MJPEG stream for one client
+
+        Returns
+        ------
+        a generator of encoded frames wrapped as multipart parts, ending
+        when the broadcaster stops
+        """
+        client = SimpleNamespace(id = next(self.client_ids), frames = 0, bytes = 0, skipped = 0)
+        self.clients[client.id] = client
+        log.info('Video client %d connected, %d watching', client.id, len(self.clients))
+
+        last = self.seq
+        try:
+            while self.running:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.seq > last or not self.running, timeout = 1)
+                    if self.seq == last:
+                        continue
+                    client.skipped += self.seq - last - 1
+                    payload, last = self.payload, self.seq
+                    payload_at = self.payload_at
+
+                self.latency.observe(int((time.monotonic() - payload_at) * 1e9))
+                yield payload
+                client.frames += 1
+                client.bytes += len(payload)
+                self.total_bytes += len(payload)
+        finally:
+            del self.clients[client.id]
+            log.info('Video client %d disconnected after %d frames', client.id, client.frames)
+
+
+    async def astream(self) -> AsyncGenerator[bytes, None]:
+        """
+        Like `stream`, for a client served on the event loop
+        """
+        client = SimpleNamespace(id = next(self.client_ids), frames = 0, bytes = 0, skipped = 0)
+        self.clients[client.id] = client
+        log.info('Video client %d connected, %d watching', client.id, len(self.clients))
+
+        last = self.seq
+        try:
+            while self.running:
+                if self.seq == last:
+                    try:
+                        await asyncio.wait_for(self.updated.wait(), timeout = 1)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                client.skipped += self.seq - last - 1
+                payload, last = self.payload, self.seq
+
+                self.latency.observe(int((time.monotonic() - self.payload_at) * 1e9))
+                yield payload
+                client.frames += 1
+                client.bytes += len(payload)
+                self.total_bytes += len(payload)
+        finally:
+            del self.clients[client.id]
+            log.info('Video client %d disconnected after %d frames', client.id, client.frames)
+
+
+    def stats(self) -> Dict:
+        """
+        Returns
+        ------
+        dict with the number of frames encoded, bytes sent in total and the
+        frames, bytes and skipped frames of each connected client
+        """
+        return {
+            'encoded':     self.encoded,
+            'total_bytes': self.total_bytes,
+            'clients':     { i: vars(c).copy() for i, c in list(self.clients.items()) },
+        }
+
+
+    def start(self) -> None:
+        """
+        Start the encoder thread, unless it is already running
+        """
+        if not self.thread.is_alive():
+            self.thread = threading.Thread(target = self.run, daemon = True)
+            self.running = True
+            self.thread.start()
+
+
+    def astart(self) -> None:
+        """
+        Start encoding on the running event loop, unless already started
+        """
+        if self.task is None or self.task.done():
+            self.updated = asyncio.Event()
+            self.running = True
+            self.task = asyncio.get_running_loop().create_task(self.arun())
+            # encoding runs on the event loop's thread, which `start` and
+            # the thread gauge see as the encoder thread
+            self.thread = threading.current_thread()
+
+
+    def stop(self) -> None:
+        """
+        Stop the encoder thread, which also ends every client stream
+        """
+        self.running = False
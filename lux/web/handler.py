@@ -1,26 +1,41 @@
-import cv2
 from collections import OrderedDict
+from copy import deepcopy
 import datetime
-from imutils.video import FileVideoStream, VideoStream
 import logging
 import numpy as np
 import os
 import threading
 import time
 from types import SimpleNamespace
-from typing import Any, Dict, List, Tuple, Generator
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple, Generator
 
 # initialise logging to file
 import lux.tools.logger
 
 # import relevant project libs
 from lux.leds import effects
+from lux.leds.compositor import Compositor
+from lux.leds.drivers import DRIVERS, open_driver
+from lux.leds.postprocess import PostProcessor
+from lux.leds.runner import EffectRunner
 from lux.leds.segment import Segment
-from lux.tools.colour  import hex_to_rgb, hex_to_hsv, hsv_to_hex
-from lux.tools.config  import parse, unwrap_hsv, unwrap_resolution
+from lux.leds.spi_segment import SPISegment
+from lux.tools.colour  import hex_to_hsv
+from lux.tools.config  import unwrap_resolution
+from lux.tools.metrics import registry
+from lux.tools.reload  import ConfigWatcher, ConfigWriter
+from lux.tools.schema  import Config, ConfigError, HSVConfig, SegmentConfig, compile
+from lux.tools.startup import startup
+from lux.web.broadcaster import MJPEGBroadcaster
+from lux.web.pixels import PixelStream
+
+log = logging.getLogger(__name__)
+
+# config sections the handler sets up once, which only apply on restart
+RESTART_SECTIONS = ('ambilight', 'audio', 'camera', 'fps', 'leds', 'net', 'server', 'sim', 'spi',
+        'workers')
 
 
-# NOTE: possibly useful for fetching a video stream in the ambilight mode
 class Camera():
     def __init__(self, cam_type: Any, config: SimpleNamespace, camera_stream = None) -> None:
         """
@@ -47,7 +62,7 @@ class Camera():
         self.camera_stream = camera_stream
 
 
-    def start(self) -> VideoStream:
+    def start(self) -> 'VideoStream':
         """
         Initialise the video stream according to prameters, set image resolution
         and framerate, as well as camera parameters if PiCamera is used, then
@@ -61,6 +76,8 @@ class Camera():
         ------
         video stream containing the frames fetched from the camera or video
         """
+        from imutils.video import FileVideoStream, VideoStream
+
         if self.cam_type == 'pi':
             resolution = unwrap_resolution(self.config.resolution)
             self.video_stream_obj = VideoStream(usePiCamera = 1,
@@ -73,6 +90,8 @@ class Camera():
 
             time.sleep(2)
         elif type(self.cam_type) is int:
+            if self.camera_stream is None:
+                self.camera_stream = VideoStream(self.cam_type, framerate = self.config.framerate)
             self.video_stream = self.camera_stream
             self.video_stream.start()
         else:
@@ -99,7 +118,7 @@ class LEDHandler():
     a macroscopic feature of the system.
     """
 
-    def __init__(self, config: SimpleNamespace, camera_stream = None):
+    def __init__(self, config: Config, camera_stream = None):
         """
         Initialise system behaviour and paths using the server configuration in
         config, and videostream, tracker and detector objects
@@ -110,8 +129,9 @@ class LEDHandler():
         Params
         ------
         config
-            namespace (dot-addressible dict) including config as specified in
-            .//config/default.yml
+            validated config as specified in .//config/default.yml, see
+            `lux.tools.schema`. If it has a `conf_path`, changes to that file
+            are applied while running, see `apply_config`
 
             config.server
                 used in the initialisation of the Flask app and the VideoProcessor,
@@ -123,58 +143,224 @@ class LEDHandler():
                 (resolution and framerate)
         """
         self.config = config
+        # segment slices, colour and LUTs precomputed from the config
+        self.params = compile(config)
         self.running = False
 
-        # setup LED array
-        # TODO: multiple segments
-        s = config.segment
-        if config.leds == "WS2801":
-            from lux.leds.ws2801_segment import WS2801_Segment
-            self.segments = [ WS2801Segment((s.range.min, s.range.max), s.reverse) ]
+        # levels of the root logger and each subsystem
+        lux.tools.logger.configure(config.logging)
+
+        col = self.params.col
+
+        # setup LED array: one output over the whole strip, and every
+        # configured segment composed into it
+        segments = self.params.segments
+        length = self.params.length
+        needed = [ effects.EFFECT_SOURCES.get(s.effect) for s in segments ]
+
+        # frames for the video feed are encoded once and shared between all
+        # browsers/tabs viewing the stream
+        self.broadcaster = MJPEGBroadcaster(config.camera.framerate)
+
+        if config.leds.upper() in DRIVERS:
+            self.output = open_driver(config.leds, length, config.spi)
+        elif config.leds == "ddp":
+            # this node is the operator, rendering for the strips of others
+            from lux.leds.net_segment import NetSegment
+            n = config.net
+            self.output = NetSegment((0, length), False, n.receivers, n.port, n.delay)
+        elif config.leds == "sim":
+            # the video feed previews the simulated strip, unless it shows
+            # the camera for the ambilight
+            from lux.leds.sim_segment import SimSegment
+            preview = self.broadcaster.publish if 'ambilight' not in needed else None
+            self.output = SimSegment((0, length), False, preview,
+                    config.sim.record or None, config.fps, config.sim.led_size)
         else:
-            self.segments = [ Segment((s.range.min, s.range.max), s.reverse) ]
-
-        # TODO: enable effect in config
-        # TODO: proper colour conversions
-        hsv = unwrap_hsv(config.segment.effect.solid)
-        col = hsv_to_hex(hsv)
-        col = hex_to_rgb(col)
-        effects.solid(self.segments[0], col)
-
+            self.output = Segment((0, length), False)
+
+        # colour correction, smoothing and power limiting of the whole strip
+        p = self.params
+        self.postprocess = PostProcessor(length)
+        self.postprocess.set_params(p.lut, p.attack, p.release, p.max_current, p.ma_per_channel)
+
+        # light the strip in the configured colour straight away, before the
+        # slower input sources are loaded
+        self.output.fill(col)
+        self.postprocess.process(self.output.frame)
+        self.output.commit_pixels()
+        startup.mark('leds lit')
+
+        # audio is analysed in its own thread, and camera frames sampled in
+        # the render thread, only if any segment needs them, so numpy's FFT,
+        # sounddevice and OpenCV are only loaded then
+        self.audio = None
+        if 'audio' in needed:
+            self.audio = self.open_audio(config.audio)
+        self.ambilight = None
+        if 'ambilight' in needed:
+            from lux.video.ambilight import AmbilightSampler
+            a = config.ambilight
+            self.ambilight = AmbilightSampler(a.width, a.height, a.depth, a.sides)
+
+        # the render thread keeps the LEDs on their effects at config.fps,
+        # web requests only post commands to it. Large installations render
+        # their segments in worker processes too
+        if config.workers:
+            from lux.leds.parallel import ParallelCompositor
+            self.compositor = ParallelCompositor(self.output, config.fps, self.postprocess,
+                    config.workers, audio = self.audio, ambilight = self.ambilight)
+        else:
+            self.compositor = Compositor(self.output, config.fps, self.postprocess)
+        self.compositor.add_from_config(segments, col,
+                audio = self.audio, ambilight = self.ambilight)
+        self.segments = self.compositor.segments
+        self.scheduler = self.compositor.scheduler
+        # the web UI previews the committed pixels
+        self.pixels = PixelStream(length)
+        self.compositor.preview = self.pixels.publish
+        self.compositor.render(0)
+        # while stopped, changes render until their transition is over
+        self.runner = EffectRunner(self.compositor, self.sample, config.transition + 1.0)
+        self.runner.start()
 
         # if any streaming is done the below are used
         self.camera_stream  = camera_stream
 
-        # initialize the output frame and a lock used to ensure thread-safe
-        # exchanges of the output frames (useful when multiple browsers/tabs
-        # are viewing the stream)
-        self.output_frame = None
-
         self.video_stream = None
+        self.last_frame = None
+
+        # edits of the config file are applied live, and saving from the
+        # web UI never blocks a request
+        self.config_lock = threading.Lock()
+        self.watcher = None
+        if config.conf_path:
+            self.watcher = ConfigWatcher(config.conf_path, self.apply_config)
+            self.watcher.start()
+        self.writer = ConfigWriter(self.saved)
+
+        self.register_metrics()
+
+
+    def register_metrics(self) -> None:
+        """
+        Register gauges reading the frame rate, dropped frames, video clients
+        and thread liveness of this handler
+        """
+        scheduler = self.scheduler
+        registry.gauge('lux_fps_target', 'Target frames per second', lambda: scheduler.fps)
+        registry.gauge('lux_fps', 'Achieved frames per second', lambda: scheduler.achieved_fps)
+        registry.gauge('lux_jitter_seconds', 'Mean lateness of frames', lambda: scheduler.jitter)
+        registry.gauge('lux_frames', 'Frames rendered', lambda: scheduler.frames)
+        registry.gauge('lux_frames_dropped', 'Frames dropped to catch up', lambda: scheduler.dropped)
+        registry.gauge('lux_video_clients', 'Connected video feed clients',
+                lambda: len(self.broadcaster.clients))
+        registry.gauge('lux_video_encoded', 'Frames encoded for the video feed',
+                lambda: self.broadcaster.encoded)
+        registry.gauge('lux_pixel_clients', 'Connected pixel preview clients',
+                lambda: len(self.pixels.clients))
+        if self.watcher is not None:
+            registry.gauge('lux_config_reloads', 'Changes of the config file applied',
+                    lambda: self.watcher.reloads)
+        if isinstance(self.output, SPISegment):
+            registry.gauge('lux_commits_skipped', 'Unchanged frames not sent to the strip',
+                    lambda: self.output.skipped)
+
+        threads = {
+            'render':  lambda: self.runner.thread,
+            'encoder': lambda: self.broadcaster.thread,
+            'audio':   lambda: self.audio.thread if self.audio is not None else None,
+        }
+        for name, thread in threads.items():
+            registry.gauge('lux_thread_alive', 'Whether a thread is running',
+                    lambda thread = thread: int(thread() is not None and thread().is_alive()),
+                    thread = name)
+
+
+    def stats(self) -> Dict:
+        """
+        Returns
+        ------
+        dict with the frame rate and dropped frames of the render loop,
+        frame time percentiles, the video feed, the pixel preview and their
+        clients, the liveness of each thread, and every timing histogram
+        """
+        snapshot = registry.snapshot()
+        return {
+            'running':    self.running,
+            'scheduler':  self.scheduler.stats(),
+            'frame_time': self.runner.frame_time.summary(),
+            'video':      self.broadcaster.stats(),
+            'pixels':     self.pixels.stats(),
+            'threads':    snapshot['gauges']['lux_thread_alive'],
+            'timings':    snapshot['histograms'],
+        }
+
+
+    def open_audio(self, config: SimpleNamespace):
+        """
+        Open the audio source and analysis pipeline described by config.audio
 
-        self.tracking_thread = threading.Thread(target = self.stream)
-        self.lock = threading.Lock()
+        Returns
+        ------
+        the pipeline, or None if the source could not be opened
+        """
+        from lux.audio.pipeline import AudioPipeline
+        from lux.audio.source import open_source
+
+        try:
+            source = open_source(config.source, config.samplerate, config.blocksize)
+        except Exception as e:
+            log.warning('Could not open audio source %r: %s', config.source, e)
+            return None
+        return AudioPipeline(source, config.bands)
 
 
-    def update_solid(self, col: SimpleNamespace) -> None:
+    def update_solid(self, col: str) -> None:
         """
-        TODO:
-        Following a form submission in the front-end, reinitialise config
-        generic update_effect which uses effect name and manipulates config
-        to call a function from effects onto segment(s)
+        Following a form submission in the front-end, change the solid colour
+        in the config and crossfade every segment showing it to the new
+        colour. Returns straight away, the render thread applies the change
+        before its next frame
 
         Params
         ------
-        TODO:
+        col
+            7-digit hex string of the form #ffffff
+        """
+        config = deepcopy(self.config)
+        config.segment.effect.solid = HSVConfig(**{ k: int(v) for k, v in hex_to_hsv(col).items() })
+        self.apply_config(config)
 
-        Side-effects
+
+    def update_effect(self, name: str, col: Optional[str] = None) -> None:
+        """
+        Following a form submission in the front-end, set the effect of
+        every segment in the config to `name`, and crossfade the segments to
+        it. Returns straight away, the render thread switches before its
+        next frame
+
+        Params
         ------
-        TODO:
+        name
+            effect from `effects.EFFECTS`, segments fall back to solid if it
+            is not available
+        col
+            if given, 7-digit hex string of the form #ffffff to set the solid
+            colour to as well
         """
-        hsv = parse(hex_to_hsv(col))
-        self.config.segment.effect.solid = hsv
-        rgb = hex_to_rgb(col)
-        effects.solid(self.segments[0], rgb)
+        config = deepcopy(self.config)
+        # without a segments list the single segment is shown in solid
+        current = config.segments or [ SegmentConfig('solid', config.segment.range,
+                config.segment.reverse) ]
+        try:
+            config.segments = [ SegmentConfig(name, s.range, s.reverse) for s in current ]
+        except ConfigError as e:
+            log.warning('Not switching effect: %s', e)
+            return
+        if col is not None:
+            config.segment.effect.solid = HSVConfig(**{ k: int(v) for k, v in hex_to_hsv(col).items() })
+        self.apply_config(config)
 
 
     def update_picamera(self,
@@ -202,16 +388,17 @@ class LEDHandler():
 
         self.camera.update_settings(self.config)
 
-        logging.info(f"Updated PiCamera settings from Web UI:")
-        logging.info(f"  iso           : {iso          } ")
-        logging.info(f"  shutter_speed : {shutter_speed} ")
-        logging.info(f"  saturation    : {saturation   } ")
-        logging.info(f"  awb_mode      : {awb_mode     } ")
+        log.info('Updated PiCamera settings from Web UI:')
+        log.info('  iso           : %s', iso)
+        log.info('  shutter_speed : %s', shutter_speed)
+        log.info('  saturation    : %s', saturation)
+        log.info('  awb_mode      : %s', awb_mode)
 
 
-    def stream(self) -> None:
+    def sample(self) -> None:
         """
-        Stream a video from the object's video_stream.
+        Sample the object's video_stream before each frame the runner
+        renders, and stream it to the video feed.
 
         Params
         ------
@@ -223,40 +410,26 @@ class LEDHandler():
 
         Side-effects
         ------
-            - produce a stream in output_frame
-            - may acquire or release lock
+            - publishes frames to the broadcaster
             - consumes the video stream
         """
-        # read the first frame and detect objects
-        #with self.lock:
-        #    frame = self.video_stream.read()
-
-        #if frame is None:
-        #    logging.info('Error reading first frame. Exiting.')
-        #    exit(0)
-
-        ## acquire the lock, set the output frame, and release the lock
-        #with self.lock:
-        #    self.output_frame = frame.copy()
+        video_stream = self.video_stream
+        if video_stream is not None:
+            frame = video_stream.read()
 
-        ## loop over frames from the video stream and track
-        #while self.running:
-        #    with self.lock:
-        #        frame = self.video_stream.read()
+            # the camera runs slower than the LEDs, so only sample frames
+            # that have not been seen yet. Frames are never modified in
+            # place, so they are shared with the encoder without copying
+            if frame is not None and frame is not self.last_frame:
+                self.last_frame = frame
+                self.ambilight.update(frame)
 
-        #        if frame is not None:
-        #            # TODO: fetch colours from frame
-        #            pass
-
-        #        # acquire the lock, set the output frame, and release the lock
-        #        with self.lock:
-        #            self.output_frame = frame.copy()
-        time.sleep(0.1)
+                self.broadcaster.publish(frame)
 
 
     def generate_frame(self) -> Generator[bytes, None, None]:
         """
-        Encode the current output frame as a bytearray of a JPEG image
+        Stream the JPEG-encoded output frames shared by the broadcaster
 
         Params
         ------
@@ -267,52 +440,118 @@ class LEDHandler():
             a generator that produces a stream of bytes with the frame wrapped
             in a HTML response
         """
-        framerate = 12.0
-        frametime = 1.0/framerate
-        while self.running:
-            # wait until the lock is acquired
-            begin = time.time()
-            with self.lock:
-                # check if the output frame is available, otherwise skip
-                # the iteration of the loop
-                if self.output_frame is None:
-                    continue
-                # encode the frame in JPEG format
-                (flag, encoded_frame) = cv2.imencode(".jpg", self.output_frame)
-                # ensure the frame was successfully encoded
-                if not flag:
-                    continue
-            # yield the output frame in the byte format
-            yield(b'--frame\r\n' b'Content-Type: image/jpeg\r\n\r\n' +
-                bytearray(encoded_frame) + b'\r\n')
-            end = time.time()
-            diff = end - begin
-            if diff > frametime:
-                continue
-            else:
-                time.sleep(frametime - diff)
+        # the encoder only starts once someone watches
+        if self.running:
+            self.broadcaster.start()
+        return self.broadcaster.stream()
+
+
+    def agenerate_frame(self) -> AsyncGenerator[bytes, None]:
+        """
+        Like `generate_frame`, for a client served on an event loop
+        """
+        if self.running:
+            self.broadcaster.astart()
+        return self.broadcaster.astream()
+
+
+    def apply_config(self, config: Config) -> None:
+        """
+        Make `config` the running config, e.g. when the config file changed.
+        Returns straight away: effect states are built here, and the render
+        thread swaps in the new colour correction and effects together
+        between two frames, so no frame mixes the old and new config.
+
+        The colour correction, smoothing and power limit, the solid colour,
+        the effect of each segment, the transition and the log levels apply
+        live. The outputs, inputs and segment ranges are set up at start, so
+        changes to those are kept in the config but only apply on restart
+
+        Params
+        ------
+        config
+            validated config, see `lux.tools.schema`
+        """
+        with self.config_lock:
+            old, before = self.config, self.params
+            params = compile(config)
+
+            restart = [ name for name in RESTART_SECTIONS
+                    if getattr(old, name) != getattr(config, name) ]
+            if params.layout() != before.layout():
+                restart.append('segments')
+            if restart:
+                log.warning('Changes to %s apply on restart', ', '.join(restart))
+
+            # build the state of every segment whose effect changed, and of
+            # those showing the solid colour when it changed
+            renderers = self.compositor.renderers
+            switches = []
+            if 'segments' not in restart:
+                for i, (s, prev) in enumerate(zip(params.segments, before.segments)):
+                    if s.effect != prev.effect:
+                        name = s.effect
+                    elif params.col != before.col and renderers[i].effect is effects.solid_frame:
+                        name = 'solid'
+                    else:
+                        continue
+                    effect, state = self.compositor.make(name, s.count, params.col,
+                            audio = self.audio, ambilight = self.ambilight)
+                    switches.append((i, effect, state))
+
+            postprocess, runner = self.postprocess, self.runner
+            def command(c: Compositor) -> None:
+                postprocess.set_params(params.lut, params.attack, params.release,
+                        params.max_current, params.ma_per_channel)
+                for i, effect, state in switches:
+                    c.renderers[i].switch(effect, state, runner.t, params.transition)
+            runner.post(command)
+
+            runner.settle = params.transition + 1.0
+            lux.tools.logger.configure(config.logging)
+            config.conf_path = old.conf_path
+            self.config, self.params = config, params
+            log.info('Applied config, %d segments switched', len(switches))
+
+
+    def save_config(self, conf_path: str) -> None:
+        """
+        Queue the current config to be written to the YAML file `conf_path`,
+        returning straight away
+        """
+        self.writer.save(self.config, conf_path)
+
+
+    def saved(self, conf_path: str) -> None:
+        """
+        Called once a config is written, so the watcher does not reload it
+        """
+        if self.watcher is not None and os.path.abspath(conf_path) == os.path.abspath(self.watcher.path):
+            self.watcher.refresh()
 
 
     def start(self) -> None:
         """
-        Initialises camera stream, tasks and runs tracking process in a thread.
-        Ensures only one tracking thread is running at a time.
+        Initialises camera stream and inputs, and plays the effects on the
+        render thread. Does nothing if already running.
         """
-        # prevent starting tracking thread if one is already running
-        if not self.tracking_thread.is_alive():
+        if not self.running:
 
-            # reinitialise tracking_thread in case previous run crashed
-            self.tracking_thread = threading.Thread(target = self.stream)
+            # restart the render thread in case a previous run crashed
+            self.runner.start()
 
-            #self.camera = Camera(self.config.server.CAMERA, self.config.camera, self.camera_stream)
-            #self.video_stream = self.camera.start()
+            # the camera only runs if a segment samples colours from it
+            if self.ambilight is not None and self.video_stream is None:
+                self.camera = Camera(self.config.server.CAMERA, self.config.camera, self.camera_stream)
+                self.video_stream = self.camera.start()
 
-            logging.info("Initialised Handler with params:")
-            logging.info(f"camera type: {self.config.server.CAMERA}")
+            log.info('Initialised Handler with params:')
+            log.info('camera type: %s', self.config.server.CAMERA)
 
             self.running = True
-            self.tracking_thread.start()
-            self.lock = threading.Lock()
+            if self.audio is not None:
+                self.audio.start()
+            self.runner.play()
 
 
     def stop(self) -> None:
@@ -327,10 +566,17 @@ class LEDHandler():
         ------
             None
         """
-        logging.info('Stopping tracking thread...')
+        log.info('Pausing render thread...')
         self.running = False
+        self.runner.pause()
+
+        if self.audio is not None:
+            self.audio.stop()
+        self.broadcaster.stop()
 
-        #if self.video_stream:
-        #    logging.info('Closing video streamer...')
-        #    self.video_stream.stop()
+        if self.video_stream:
+            log.info('Closing video streamer...')
+            self.video_stream.stop()
+            self.video_stream = None
+            self.camera_stream = None
 
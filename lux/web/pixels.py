@@ -0,0 +1,199 @@
+import itertools
+import logging
+import struct
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+# initialise logging to file
+import lux.tools.logger
+
+log = logging.getLogger(__name__)
+
+"""
+Live preview of the strip for the web UI, sent as the committed pixels
+rather than video.
+
+Each client is sent binary messages of two kinds, little-endian:
+
+    key frame   0x00, u16 LED count, count x 3 RGB bytes
+    delta       0x01, then for each run of changed LEDs: u16 first LED,
+                u16 number of LEDs, their RGB bytes
+
+The first message to a client is a key frame, later ones are deltas against
+the last frame that client was sent, or key frames when those are smaller.
+Unchanged frames are not sent at all, so a static scene costs nothing, and
+a client asking for a lower frame rate is simply sent fewer, larger deltas.
+"""
+
+KEY   = 0
+DELTA = 1
+RUN = struct.Struct('<HH')
+# frames per second sent to a client, unless it asks otherwise
+PREVIEW_FPS = 15
+# runs closer than this many LEDs are merged, as a run header costs more
+# than sending the unchanged LEDs between them
+MERGE_GAP = 2
+
+
+def preview_fps(requested: Optional[str], fps: float) -> float:
+    """
+    Returns
+    ------
+    the frame rate a client asked for in a query string, defaulting to
+    PREVIEW_FPS; clients may ask for fewer frames than are rendered at
+    `fps`, not more
+    """
+    try:
+        return min(max(float(requested), 1.0), fps)
+    except (TypeError, ValueError):
+        return min(PREVIEW_FPS, fps)
+
+
+def key_frame(frame: np.ndarray) -> bytes:
+    """
+    Returns
+    ------
+    the key frame message of an (N, 3) frame
+    """
+    return struct.pack('<BH', KEY, len(frame)) + frame.tobytes()
+
+
+def delta(frame: np.ndarray, prev: np.ndarray, changed: np.ndarray) -> Optional[bytes]:
+    """
+    Encode the changes from `prev` to `frame`
+
+    Params
+    ------
+    changed
+        (N,) bool buffer the changed LEDs are found in
+
+    Returns
+    ------
+    the smaller of the delta and key frame messages, or None if nothing
+    changed
+    """
+    np.any(frame != prev, axis = 1, out = changed)
+    # boundaries of runs of changed LEDs, starts and ends interleaved
+    edges = np.flatnonzero(np.diff(changed, prepend = False, append = False))
+    if not len(edges):
+        return None
+    starts, ends = edges[0::2], edges[1::2]
+    if len(starts) > 1:
+        keep = np.concatenate(([ True ], starts[1:] - ends[:-1] > MERGE_GAP))
+        starts, ends = starts[keep], np.concatenate((ends[:-1][keep[1:]], ends[-1:]))
+
+    size = 1 + RUN.size * len(starts) + 3 * int((ends - starts).sum())
+    if size >= 3 + frame.nbytes:
+        return key_frame(frame)
+    parts = [ bytes((DELTA,)) ]
+    for s, e in zip(starts.tolist(), ends.tolist()):
+        parts.append(RUN.pack(s, e - s))
+        parts.append(frame[s:e].tobytes())
+    return b''.join(parts)
+
+
+class PixelStream():
+    """
+    Share the frames committed to the strip with preview clients. The
+    render thread publishes a copy of each frame, clients take the latest
+    at their own rate
+    """
+
+    def __init__(self, count: int) -> None:
+        self.frame = np.zeros((count, 3), dtype = np.uint8)
+        self.seq = 0
+        self.lock = threading.Lock()
+        self.clients: Dict[int, 'PixelClient'] = {}
+        self.client_ids = itertools.count()
+
+
+    def publish(self, frame: np.ndarray) -> None:
+        """
+        Make `frame`, (N, 3) RGB, the latest frame; it is copied
+        """
+        with self.lock:
+            np.copyto(self.frame, frame)
+            self.seq += 1
+
+
+    def client(self, fps: float) -> 'PixelClient':
+        """
+        Returns
+        ------
+        a new client, to be sent frames at most `fps` times a second
+        """
+        client = PixelClient(self, next(self.client_ids), fps)
+        self.clients[client.id] = client
+        log.info('Pixel client %d connected at %g fps, %d watching', client.id, fps,
+                len(self.clients))
+        return client
+
+
+    def stats(self) -> Dict:
+        """
+        Returns
+        ------
+        dict with the frames published, and the messages and bytes sent to
+        each connected client
+        """
+        return {
+            'published': self.seq,
+            'clients':   { i: { 'fps': c.fps, 'messages': c.messages, 'bytes': c.bytes }
+                    for i, c in list(self.clients.items()) },
+        }
+
+
+class PixelClient():
+    """
+    The frames one preview client was sent, to encode the next against
+    """
+
+    def __init__(self, stream: PixelStream, id: int, fps: float) -> None:
+        self.stream = stream
+        self.id = id
+        self.fps = fps
+        self.interval = 1.0 / fps
+        self.seq = -1
+        self.next_at = 0.0
+        self.keyed = False
+        self.current = np.zeros_like(stream.frame)
+        self.prev = np.zeros_like(stream.frame)
+        self.changed = np.zeros(len(stream.frame), dtype = bool)
+        self.messages = 0
+        self.bytes = 0
+
+
+    def next(self) -> Optional[bytes]:
+        """
+        Returns
+        ------
+        the message to send this client now, or None if it is not due one
+        yet or nothing changed since the last
+        """
+        now = time.monotonic()
+        # a little early is on time, for callers paced at the same rate
+        if now < self.next_at - self.interval / 4 or self.stream.seq == self.seq:
+            return None
+        with self.stream.lock:
+            np.copyto(self.current, self.stream.frame)
+            self.seq = self.stream.seq
+        self.next_at = max(self.next_at + self.interval, now)
+
+        if self.keyed:
+            message = delta(self.current, self.prev, self.changed)
+        else:
+            message = key_frame(self.current)
+            self.keyed = True
+        self.prev, self.current = self.current, self.prev
+        if message is not None:
+            self.messages += 1
+            self.bytes += len(message)
+        return message
+
+
+    def close(self) -> None:
+        self.stream.clients.pop(self.id, None)
+        log.info('Pixel client %d disconnected after %d messages', self.id, self.messages)
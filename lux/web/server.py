@@ -1,27 +1,35 @@
+# start timing before anything else is imported
+from lux.tools.startup import startup, importtime_report, EXIT_AFTER_STARTUP
+
+import argparse
+import base64
 import sys, os
-from flask import Flask, jsonify, render_template, redirect, request, url_for
-from flask.wrappers import Response
-from imutils.video import VideoStream
+import time
 import signal
 import logging
-import yaml
-from types import SimpleNamespace
-from copy import deepcopy
 
 from lux.leds.effects import effect_names
 from lux.web.handler  import LEDHandler
-from lux.tools.config import parse, unparse, unwrap_hsv
+from lux.tools.config import unparse, unwrap_hsv
 from lux.tools.colour import hsv_to_hex
+from lux.tools.metrics import registry
+from lux.web.pixels import preview_fps
 
 
 def create_app(server_type, conf, conf_path, camera_stream=None):
-    app = Flask(__name__)
-    app.debug = True
+    logging.info(f"Creating {server_type} server with config:\n{conf}")
     conf.conf_path = conf_path
 
-    logging.info(f"Creating {server_type} server with config:\n{conf}")
+    # the LEDs are lit while the handler is created, so Flask is only
+    # imported once they are on
     proc = LEDHandler(conf, camera_stream)
 
+    from flask import Flask, jsonify, render_template, redirect, request, url_for
+    from flask.wrappers import Response
+
+    app = Flask(__name__)
+    app.debug = True
+
     def handler(signum, frame):
         res = input("Do you want to exit? Press y.")
         if res == 'y':
@@ -40,8 +48,9 @@ def create_app(server_type, conf, conf_path, camera_stream=None):
     @app.route("/")
     def index():
         opts = unparse(proc.config)
-        opts['segment']['effect']['solid'] = hsv_to_hex(vars(proc.config.segment.effect.solid))
-        return render_template("index.html", opts = opts, running_text=is_running())
+        opts['segment']['effect']['solid'] = hsv_to_hex(unwrap_hsv(proc.config.segment.effect.solid))
+        return render_template("index.html", opts = opts, running_text=is_running(),
+            pixels_url = url_for("pixels"))
 
     @app.route("/start")
     def start():
@@ -62,7 +71,7 @@ def create_app(server_type, conf, conf_path, camera_stream=None):
         if request.method == 'GET':
             opts = unparse(proc.config)
             # color picker expects hex colours
-            opts['segment']['effect']['solid'] = hsv_to_hex(vars(proc.config.segment.effect.solid))
+            opts['segment']['effect']['solid'] = hsv_to_hex(unwrap_hsv(proc.config.segment.effect.solid))
 
             return render_template("settings.html", #use_picamera = use_picamera,
                 conf_path = proc.config.conf_path, save_file = False,
@@ -71,17 +80,16 @@ def create_app(server_type, conf, conf_path, camera_stream=None):
             #if use_picamera:
             #    proc.update_picamera(request.form['iso'], request.form['shutter_speed'],
             #        request.form['saturation'], request.form['awb_mode'])
-            # TODO: implement effect switch
+            # effects are switched on the render thread, so these return
+            # straight away
             if request.form['effect'] == 'solid':
-                proc.update_solid(request.form['solid'])
+                proc.update_effect('solid', request.form['solid'])
+            else:
+                proc.update_effect(request.form['effect'])
 
+            # written on the handler's writer thread
             if 'save_file' in request.form:
-                conf_path = request.form['conf_path']
-                file = open(conf_path, 'w')
-                conf_to_save = deepcopy(proc.config)
-                conf_to_save.segment.effect.solid = parse(unwrap_hsv(conf_to_save.segment.effect.solid))
-                delattr(conf_to_save, 'conf_path')
-                yaml.dump(unparse(conf_to_save), file)
+                proc.save_config(request.form['conf_path'])
 
             return redirect(url_for("settings"))
 
@@ -98,13 +106,71 @@ def create_app(server_type, conf, conf_path, camera_stream=None):
         return Response(proc.generate_frame(),
             mimetype = "multipart/x-mixed-replace; boundary=frame")
 
+    @app.route("/pixels")
+    def pixels():
+        """
+        Pixel preview as server-sent events, each the base64 of a key frame
+        or delta message, see `lux.web.pixels`
+
+        Returns
+        ------
+            HTTP response streaming the events
+        """
+        client = proc.pixels.client(preview_fps(request.args.get('fps'), proc.config.fps))
+
+        def events():
+            try:
+                while True:
+                    time.sleep(max(client.next_at - time.monotonic(), 0.001))
+                    message = client.next()
+                    if message is not None:
+                        yield b'data: ' + base64.b64encode(message) + b'\n\n'
+            finally:
+                client.close()
+
+        return Response(events(), mimetype = "text/event-stream")
+
+    @app.route("/metrics")
+    def metrics():
+        """
+        Timings, frame rate, video clients and thread liveness in the
+        Prometheus text format
+        """
+        return Response(registry.prometheus(), mimetype = "text/plain; version=0.0.4")
+
+
+    @app.route("/stats")
+    def stats():
+        """
+        Frame rate, frame time percentiles, dropped frames, video clients and
+        thread liveness as JSON
+        """
+        return jsonify(proc.stats())
+
+    startup.mark('web app created')
     return app
 
 
 if __name__ == '__main__':
-    server_type='observer'
-    if len(sys.argv) > 1:
-        server_type = sys.argv[1]
+    parser = argparse.ArgumentParser(description = 'Run the LED server')
+    parser.add_argument('server_type', nargs = '?', default = 'observer')
+    parser.add_argument('--headless', action = 'store_true',
+        help = 'run the LEDs without loading the web UI')
+    parser.add_argument('--asyncio', action = 'store_true',
+        help = 'serve the web UI from one asyncio event loop instead of Flask threads')
+    parser.add_argument('--startup-report', action = 'store_true',
+        help = 'print how long each phase of startup took')
+    parser.add_argument('--importtime', action = 'store_true',
+        help = 'profile startup under python -X importtime and print the slowest imports')
+    args = parser.parse_args()
+
+    if args.importtime:
+        print(importtime_report([ 'lux.web.server', args.server_type ] +
+            ([ '--headless' ] if args.headless else []) +
+            ([ '--asyncio' ] if args.asyncio else [])))
+        sys.exit(0)
+
+    server_type = args.server_type
 
     host = os.environ.get('HOST', default = '0.0.0.0')
     port = int(os.environ.get('PORT', default = '8888'))
@@ -113,22 +179,49 @@ if __name__ == '__main__':
 
     logging.info(f"Starting server, listening on {host} at port {port}, using config at {conf_path}")
 
-    with open(conf_path, 'r') as fh:
-        yaml_dict = yaml.safe_load(fh)
-        config = parse(yaml_dict)
-
-        # NOTE: to use /dev/video* devices, you must launch in the main process
-        #       so we create the camera stream here
-        # NOTE: camera stream may be useful in the ambilight mode
-        #camera_number = config.server.CAMERA
-        #camera_stream = None
-        #if camera_number != None and type(camera_number) == int:
-        #    logging.info(f"Opening Camera {camera_number}")
-        #    camera_stream = VideoStream(int(camera_number), framerate = config.camera.framerate)
-        #create_app(server_type, config, conf_path, camera_stream=camera_stream).run(
-        #        host = host, port = port, debug = True,
-        #        threaded = True, use_reloader = False)
-
-        create_app(server_type, config, conf_path).run(
-                host = host, port = port, debug = True,
+    # the config is validated before anything is lit
+    from lux.tools.schema import load_file
+    config = load_file(conf_path)
+    startup.mark('config loaded')
+
+    # NOTE: to use /dev/video* devices, you must launch in the main process
+    #       so we create the camera stream here
+    # NOTE: camera stream may be useful in the ambilight mode
+    #camera_number = config.server.CAMERA
+    #camera_stream = None
+    #if camera_number != None and type(camera_number) == int:
+    #    from imutils.video import VideoStream
+    #    logging.info(f"Opening Camera {camera_number}")
+    #    camera_stream = VideoStream(int(camera_number), framerate = config.camera.framerate)
+
+    if args.headless:
+        config.conf_path = conf_path
+        proc = LEDHandler(config)
+        proc.start()
+        startup.mark('rendering')
+    elif args.asyncio:
+        from lux.web.async_server import create_app as create_async_app
+        app = create_async_app(server_type, config, conf_path)
+    else:
+        app = create_app(server_type, config, conf_path)
+
+    if args.startup_report:
+        print(startup.report())
+    logging.info(f"Startup:\n{startup.report()}")
+
+    if os.environ.get(EXIT_AFTER_STARTUP):
+        if args.headless:
+            proc.stop()
+        sys.exit(0)
+
+    if args.headless:
+        try:
+            proc.runner.thread.join()
+        except KeyboardInterrupt:
+            proc.stop()
+    elif args.asyncio:
+        from aiohttp import web
+        web.run_app(app, host = host, port = port)
+    else:
+        app.run(host = host, port = port, debug = True,
                 threaded = True, use_reloader = False)
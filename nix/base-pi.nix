@@ -23,6 +23,8 @@
     enable = true;
     openFirewall = true;
   };
+  # frames streamed from the operator node, see lux/leds/receiver_segment.py
+  networking.firewall.allowedUDPPorts = [ 4048 ];
 
   boot = {
     #kernelPackages = pkgs.linuxPackages_rpi4;
@@ -0,0 +1,40 @@
+import asyncio
+import os
+
+import pytest
+
+pytest.importorskip('aiohttp')
+from aiohttp import WSMsgType
+from aiohttp.test_utils import TestClient, TestServer
+
+from lux.tools.schema import load_file
+from lux.web.async_server import create_app
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'config', 'default.yml')
+
+
+async def answer(ws) -> dict:
+    """
+    The next JSON message, skipping the binary pixel preview
+    """
+    while True:
+        msg = await asyncio.wait_for(ws.receive(), 5)
+        if msg.type == WSMsgType.TEXT:
+            return msg.json()
+        assert msg.type == WSMsgType.BINARY, f'socket closed: {msg}'
+
+
+def test_ws_ignores_bad_messages():
+    async def session():
+        app = create_app('sim', load_file(CONFIG), None)
+        async with TestClient(TestServer(app)) as client:
+            ws = await client.ws_connect('/ws')
+            for bad in ('{not json', '[1, 2]', '{"solid": "zz"}', '{"solid": 5}',
+                    '{"effect": 5}', '{"effect": "nope"}', '{"effect": "solid", "solid": "#12"}'):
+                await ws.send_str(bad)
+            await ws.send_json({ 'effect': 'rainbow', 'solid': '#00ff00' })
+            reply = await answer(ws)
+            await ws.close()
+        return reply
+
+    assert asyncio.run(session()) == { 'running': False }
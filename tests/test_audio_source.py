@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from lux.audio.source import AudioSource, WavSource
+
+
+def test_source_without_read_fails_when_created():
+    class Incomplete(AudioSource):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete(44100, 512)
+
+
+def test_wav_source_reads_mono_blocks(tmp_path):
+    import wave
+    path = str(tmp_path / 'tone.wav')
+    pcm = (np.sin(np.arange(2048) / 10) * 16000).astype('<i2')
+    with wave.open(path, 'wb') as fh:
+        fh.setnchannels(1)
+        fh.setsampwidth(2)
+        fh.setframerate(44100)
+        fh.writeframes(pcm.tobytes())
+
+    source = WavSource(path, 512, realtime = False)
+    blocks = []
+    while (block := source.read()) is not None:
+        blocks.append(block)
+    source.close()
+    assert len(blocks) == 4
+    assert np.allclose(np.concatenate(blocks), pcm / 32768)
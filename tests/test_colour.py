@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from lux.tools.colour import hex_to_hsv, hsv_to_rgb, hsv_to_rgb_array, rgb_to_hsv_array
+
+
+def every(n: int) -> np.ndarray:
+    """
+    Every triple of values 0 to `n - 1`, 0-255, as an (N, 3) uint8 array
+    """
+    a, b, c = np.meshgrid(np.arange(n), np.arange(256), np.arange(256), indexing = 'ij')
+    return np.stack([ a, b, c ], axis = -1).reshape(-1, 3).astype(np.uint8)
+
+
+def test_scalar_conversions():
+    assert hex_to_hsv('#f5c011') == { 'hue': 23, 'saturation': 237, 'value': 245 }
+    assert hsv_to_rgb({ 'hue': 23, 'saturation': 237, 'value': 245 }) == (245, 192, 17)
+    assert hsv_to_rgb({ 'hue': 0, 'saturation': 0, 'value': 0 }) == (0, 0, 0)
+
+
+def test_match_opencv():
+    cv2 = pytest.importorskip('cv2')
+    hsv = every(256)
+    expected = cv2.cvtColor(hsv[:, None], cv2.COLOR_HSV2RGB)[:, 0]
+    assert np.array_equal(hsv_to_rgb_array(hsv), expected)
+
+    rgb = every(256)
+    expected = cv2.cvtColor(rgb[:, None], cv2.COLOR_RGB2HSV)[:, 0]
+    assert np.array_equal(rgb_to_hsv_array(rgb), expected)
@@ -0,0 +1,25 @@
+import numpy as np
+
+from lux.leds import effects
+from lux.leds.compositor import Compositor
+from lux.leds.postprocess import PostProcessor, correction_lut
+from lux.leds.segment import Segment
+
+COLOUR = (200, 100, 50)
+
+
+def test_correction_leaves_the_canvas_uncorrected():
+    compositor = Compositor(Segment((0, 10), False), 30, PostProcessor(10, gamma = 2.2))
+    compositor.add((0, 5), False, effects.solid_frame, effects.make_state(5, col = COLOUR))
+    # LEDs no segment covers, drawn once
+    compositor.canvas.frame[5:] = COLOUR
+    previews = []
+    compositor.preview = lambda frame: previews.append(frame.copy())
+
+    lut = correction_lut(2.2)
+    corrected = [ lut[c, v] for c, v in enumerate(COLOUR) ]
+    for t in range(3):
+        compositor.render(t / 30)
+        # corrected once, not once more every frame
+        assert (compositor.output.frame == corrected).all()
+        assert (previews[-1] == COLOUR).all()
@@ -0,0 +1,96 @@
+import numpy as np
+
+from lux.leds.apa102_segment import APA102Segment
+from lux.leds.spi import CaptureSPI
+from lux.leds.ws2801_segment import WS2801Segment
+from lux.leds.ws2812_segment import WS2812Segment
+
+FRAME = np.array([
+    [ 0x01, 0x02, 0x03 ],
+    [ 0x80, 0x40, 0x20 ],
+    [ 0xFF, 0x00, 0x0F ],
+], dtype = np.uint8)
+
+
+def commit(segment, frame = FRAME):
+    segment.frame[:] = frame
+    segment.commit_pixels()
+    return segment.spi.captured[-1]
+
+
+def ws2812_byte(value: int) -> bytes:
+    """
+    A colour byte as its 3 bit WS2812 pulses, 110 for a 1 and 100 for a 0
+    """
+    bits = ''.join('110' if value >> (7 - i) & 1 else '100' for i in range(8))
+    return int(bits, 2).to_bytes(3, 'big')
+
+
+def test_ws2801_sends_the_frame():
+    assert commit(WS2801Segment((0, 3), False, CaptureSPI())) == FRAME.tobytes()
+
+
+def test_ws2801_reorders_and_clocks_out_leds_before_the_segment():
+    segment = WS2801Segment((2, 5), False, CaptureSPI(), order = 'GRB')
+    assert commit(segment) == bytes(6) + FRAME[:, [ 1, 0, 2 ]].tobytes()
+
+
+def test_apa102_frames():
+    segment = APA102Segment((0, 3), False, CaptureSPI(), brightness = 7)
+    leds = b''.join(bytes([ 0xE7, b, g, r ]) for r, g, b in FRAME)
+    # start frame, LED frames, reset frame and a bit per two LEDs
+    assert commit(segment) == bytes(4) + leds + bytes(5)
+
+
+def test_ws2812_pulses():
+    segment = WS2812Segment((0, 3), False, CaptureSPI(speed_hz = 2400000))
+    pulses = b''.join(ws2812_byte(v) for r, g, b in FRAME for v in (g, r, b))
+    # 280 us low at 2.4 MHz
+    assert commit(segment) == pulses + bytes(84)
+
+
+def test_unchanged_frame_skipped_until_keepalive():
+    spi = CaptureSPI()
+    segment = WS2801Segment((0, 3), False, spi, keepalive = 60)
+    commit(segment)
+    commit(segment)
+    assert spi.frames == 1
+    assert segment.skipped == 1
+
+    # the frame sent is older than the keepalive
+    segment.sent_at -= 60
+    assert commit(segment) == FRAME.tobytes()
+    assert spi.frames == 2
+
+
+def test_no_keepalive_sends_every_frame():
+    spi = CaptureSPI()
+    segment = WS2801Segment((0, 3), False, spi, keepalive = 0)
+    commit(segment)
+    commit(segment)
+    assert spi.captured == [ FRAME.tobytes() ] * 2
+    assert segment.skipped == 0
+
+
+def test_ws2801_sends_up_to_the_last_change():
+    segment = WS2801Segment((0, 3), False, CaptureSPI(), keepalive = 60)
+    commit(segment)
+    frame = FRAME.copy()
+    frame[1, 2] = 0x99
+    assert commit(segment, frame) == frame[:2].tobytes()
+    assert segment.partial == 1
+
+    frame[2, 0] = 0x11
+    assert commit(segment, frame) == frame.tobytes()
+    assert segment.partial == 1
+
+
+def test_apa102_sends_whole_frame_on_change():
+    segment = APA102Segment((0, 3), False, CaptureSPI(), keepalive = 60)
+    first = commit(segment)
+    frame = FRAME.copy()
+    frame[0] = 0
+    sent = commit(segment, frame)
+    assert len(sent) == len(first)
+    assert sent[4:8] == bytes([ 0xFF, 0, 0, 0 ])
+    assert segment.partial == 0
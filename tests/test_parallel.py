@@ -0,0 +1,74 @@
+import os
+import signal
+
+import numpy as np
+import pytest
+
+from lux.leds import effects
+from lux.leds.compositor import Compositor
+from lux.leds.parallel import ParallelCompositor
+from lux.leds.segment import Segment
+
+SEGMENTS = 5
+COUNT = 120
+
+
+def build(compositor: Compositor) -> Compositor:
+    """
+    Segments of differing lengths and directions, one of them fading from a
+    rainbow into breathe from the start
+    """
+    start = 0
+    for i in range(SEGMENTS):
+        count = COUNT + 10 * i
+        compositor.add((start, start + count), i % 2 == 1, effects.rainbow_frame,
+                effects.make_state(count, speed = 1 + i))
+        start += count
+    effect, state = compositor.make('breathe', COUNT, (255, 64, 0))
+    compositor.renderers[0].switch(effect, state, 0.0, 2.0)
+    return compositor
+
+
+@pytest.fixture
+def compositors():
+    length = sum(COUNT + 10 * i for i in range(SEGMENTS))
+    serial = build(Compositor(Segment((0, length), False)))
+    parallel = build(ParallelCompositor(Segment((0, length), False), workers = 2))
+    yield serial, parallel
+    parallel.close()
+
+
+def compose(serial: Compositor, parallel: ParallelCompositor, t: float) -> None:
+    serial.compose(t)
+    parallel.compose(t)
+    assert serial.output.frame.tobytes() == parallel.output.frame.tobytes()
+
+
+def test_matches_serial(compositors):
+    serial, parallel = compositors
+    compose(serial, parallel, 0.0)
+    assert parallel.processes
+    for t in np.arange(0.1, 1.0, 0.1):
+        compose(serial, parallel, t)
+
+    for c in compositors:
+        effect, state = c.make('solid', COUNT + 20, (0, 0, 255))
+        c.renderers[2].switch(effect, state, 1.0, 0.5)
+        c.renderers[3].state.speed = 7
+    for t in np.arange(1.0, 2.5, 0.1):
+        compose(serial, parallel, t)
+
+
+def test_killed_worker_falls_back_and_restarts(compositors):
+    serial, parallel = compositors
+    compose(serial, parallel, 0.0)
+    os.kill(parallel.processes[0].pid, signal.SIGKILL)
+    parallel.processes[0].join()
+
+    # rendered in this process, with the workers stopped
+    compose(serial, parallel, 0.5)
+    assert not parallel.processes
+    # restarted mid-transition
+    for t in (1.0, 1.5, 2.5):
+        compose(serial, parallel, t)
+        assert parallel.processes
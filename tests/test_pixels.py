@@ -0,0 +1,128 @@
+import json
+import os
+import shutil
+import struct
+import subprocess
+from typing import List, Optional
+
+import numpy as np
+import pytest
+
+from lux.web.pixels import DELTA, KEY, RUN, PixelStream
+
+COUNT = 300
+TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'lux', 'web', 'templates', 'index.html')
+
+
+def decode(message: bytes, frame: Optional[np.ndarray]) -> np.ndarray:
+    """
+    Apply a message to the frame a client shows, as the canvas in
+    index.html does
+    """
+    if message[0] == KEY:
+        count, = struct.unpack_from('<H', message, 1)
+        return np.frombuffer(message, dtype = np.uint8, count = 3 * count, offset = 3).reshape(-1, 3).copy()
+    assert message[0] == DELTA and frame is not None
+    offset = 1
+    while offset < len(message):
+        first, count = RUN.unpack_from(message, offset)
+        offset += RUN.size
+        frame[first:first + count] = np.frombuffer(message, dtype = np.uint8,
+                count = 3 * count, offset = offset).reshape(-1, 3)
+        offset += 3 * count
+    return frame
+
+
+def frames() -> List[np.ndarray]:
+    """
+    Random frames, frames changing a few runs of LEDs with gaps around the
+    merge distance, and unchanged frames
+    """
+    rng = np.random.default_rng(1)
+    frame = rng.integers(0, 256, (COUNT, 3), dtype = np.uint8)
+    out = [ frame.copy() ]
+    for i in range(40):
+        if i % 10 == 0:
+            frame = rng.integers(0, 256, (COUNT, 3), dtype = np.uint8)
+        elif i % 10 != 5:
+            for start in rng.integers(0, COUNT - 10, 4):
+                # runs of 1-3 LEDs, 1-4 apart
+                for led in range(start, start + rng.integers(1, 4)):
+                    frame[led] = rng.integers(0, 256, 3)
+                frame[start + rng.integers(4, 8), 1] ^= 0xFF
+            # the last LED, ending a run at the end of the strip
+            if i % 3 == 0:
+                frame[-1] += 1
+        out.append(frame.copy())
+    return out
+
+
+def stream(frames: List[np.ndarray], join: int = 0) -> List[List[Optional[bytes]]]:
+    """
+    Publish `frames` and collect the messages of a client connected from
+    the start and of one joining at frame `join`
+    """
+    pixels = PixelStream(COUNT)
+    clients = [ pixels.client(1e9) ]
+    sent: List[List[Optional[bytes]]] = [ [], [] ]
+    for i, frame in enumerate(frames):
+        if i == join:
+            clients.append(pixels.client(1e9))
+        pixels.publish(frame)
+        for c, client in enumerate(clients):
+            sent[c].append(client.next())
+    return sent
+
+
+def test_round_trip():
+    fs = frames()
+    join = 17
+    first, late = stream(fs, join)
+    assert first[0][0] == KEY
+    assert late[0][0] == KEY
+    # random frames are sent whole again
+    assert sum(m is not None and m[0] == KEY for m in first) > 1
+    assert any(m is not None and m[0] == DELTA for m in first)
+    # unchanged frames are not sent
+    assert any(m is None for m in first[1:])
+
+    for messages, expected in ((first, fs), (late, fs[join:])):
+        shown = None
+        for message, frame in zip(messages, expected):
+            if message is not None:
+                shown = decode(message, shown)
+            assert np.array_equal(shown, frame)
+
+
+def test_canvas_decoder_round_trip():
+    node = shutil.which('node')
+    if node is None:
+        pytest.skip('node is not installed')
+    with open(TEMPLATE) as fh:
+        html = fh.read()
+    apply = html[html.index('function apply(buffer)'):html.index('const url')]
+    script = '''
+        const canvas = { width: 1 };
+        const context = {
+            createImageData: (w, h) => ({ data: new Uint8ClampedArray(4 * w * h) }),
+            putImageData: () => {},
+        };
+        let image = null;
+    ''' + apply + '''
+        const out = [];
+        for (const hex of JSON.parse(require('fs').readFileSync(0, 'utf8'))) {
+            if (hex !== null) {
+                apply(new Uint8Array(Buffer.from(hex, 'hex')).buffer);
+            }
+            out.push(Buffer.from(image.data).toString('hex'));
+        }
+        console.log(JSON.stringify(out));
+    '''
+    fs = frames()
+    messages = stream(fs)[0]
+    result = subprocess.run([ node, '-e', script ], capture_output = True, text = True, check = True,
+            input = json.dumps([ m.hex() if m is not None else None for m in messages ]))
+    for shown, frame in zip(json.loads(result.stdout), fs):
+        rgba = np.frombuffer(bytes.fromhex(shown), dtype = np.uint8).reshape(-1, 4)
+        assert np.array_equal(rgba[:, :3], frame)
+        assert (rgba[:, 3] == 255).all()
@@ -0,0 +1,71 @@
+import socket
+import time
+
+import numpy as np
+
+from lux.leds import ddp
+from lux.leds.receiver_segment import ReceiverSegment
+from lux.leds.segment import Segment
+
+# three packets a frame
+COUNT = 1000
+
+
+def send(sock: socket.socket, address, frame: np.ndarray, sequence: int,
+        skip = (), repeat = ()) -> None:
+    """
+    Send `frame` as DDP packets, leaving out the packets numbered in `skip`
+    and sending those in `repeat` twice
+    """
+    pixels = frame.tobytes()
+    code = ddp.timecode(time.time())
+    parts = list(ddp.chunks(len(pixels)))
+    for i, (offset, length) in enumerate(parts):
+        if i in skip:
+            continue
+        packet = bytearray(ddp.HEADER.size + length)
+        ddp.pack_header(packet, sequence, offset, length, code, i == len(parts) - 1)
+        packet[ddp.HEADER.size:] = pixels[offset:offset + length]
+        sock.sendto(packet, address)
+        if i in repeat:
+            sock.sendto(packet, address)
+
+
+def wait_for(condition, timeout: float = 2.0) -> bool:
+    end = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > end:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_complete_frame_is_shown_and_lost_packet_drops_frame():
+    output = Segment((0, COUNT), False)
+    receiver = ReceiverSegment(output, 0, '127.0.0.1')
+    address = receiver.sock.getsockname()
+    receiver.listen()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        first = np.random.default_rng(0).integers(0, 256, (COUNT, 3)).astype(np.uint8)
+        send(sock, address, first, 1)
+        assert wait_for(lambda: receiver.presented == 1)
+        assert np.array_equal(output.frame, first)
+
+        # the push packet arrives, the one before it does not
+        send(sock, address, np.zeros_like(first), 2, skip = (0,))
+        assert wait_for(lambda: receiver.incomplete == 1)
+        time.sleep(0.05)
+        assert receiver.presented == 1
+        assert np.array_equal(output.frame, first)
+
+        # a duplicated packet does not make up for the lost one after it
+        send(sock, address, np.zeros_like(first), 3, skip = (1,), repeat = (0,))
+        assert wait_for(lambda: receiver.incomplete == 2)
+        time.sleep(0.05)
+        assert receiver.presented == 1
+        assert receiver.received == 1
+        assert np.array_equal(output.frame, first)
+    finally:
+        sock.close()
+        receiver.close()
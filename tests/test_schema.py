@@ -0,0 +1,44 @@
+import os
+
+import pytest
+
+from lux.tools.schema import Config, ConfigError, SegmentConfig, compile, dump, load, load_file
+
+CONFIG = os.path.join(os.path.dirname(__file__), '..', 'config', 'default.yml')
+
+
+def test_default_config_loads_and_round_trips():
+    config = load_file(CONFIG)
+    assert config.conf_path == CONFIG
+    config.conf_path = ''
+    assert load(dump(config)) == config
+    assert compile(config).length == 30
+    assert load({}) == Config()
+
+
+@pytest.mark.parametrize('data, message', [
+    ({ 'fps': 'fast' },                                  "fps: expected a number, got 'fast'"),
+    ({ 'fps': True },                                    'fps: expected a number, got True'),
+    ({ 'spi': { 'bits': 3.0 } },                         'spi.bits: expected int, got 3.0'),
+    ({ 'leds': 5 },                                      'leds: expected str, got 5'),
+    ({ 'segments': { 'effect': 'solid' } },              'segments: expected a list'),
+    ({ 'correction': [] },                               'correction: expected a mapping'),
+    ({ 'colour': 1 },                                    'colour: unknown key'),
+    ({ 'net': { 'receivers': [ { 'hots': '' } ] } },     'net.receivers[0].hots: unknown key'),
+    ({ 'spi': { 'brightness': 32 } },                    'spi: brightness 32 not in 0-31'),
+    ({ 'correction': { 'gamma': 0 } },                   'correction: gamma 0 must be positive'),
+    ({ 'segments': [ { 'range': { 'min': 5, 'max': 5 } } ] },
+            'segments[0].range: range 5-5 is empty or negative'),
+    ({ 'segments': [ { 'effect': 5 } ] },                'segments[0].effect: expected str, got 5'),
+    ({ 'segments': [ { 'effect': 'sparkle' } ] },        "segments[0]: unknown effect 'sparkle'"),
+])
+def test_invalid_config_names_the_key(data, message):
+    with pytest.raises(ConfigError) as e:
+        load(data)
+    assert message in str(e.value)
+
+
+def test_segment_effect_must_be_a_name():
+    with pytest.raises(ConfigError, match = 'effect 5 is not a name'):
+        SegmentConfig(5)
+    assert SegmentConfig('Rainbow').effect == 'Rainbow'